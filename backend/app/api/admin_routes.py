@@ -0,0 +1,32 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Response
+from app.core.config import settings
+from app.core.profiling import sampler
+
+router = APIRouter()
+
+def require_admin(token: Optional[str]):
+    # Hide the endpoints entirely until a token is configured
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not hmac.compare_digest(token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.get("/admin/profile")
+async def get_profile(route: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """Collapsed stacks sampled process-wide while profiled requests ran,
+    grouped by their route; ready for flamegraph.pl or speedscope"""
+    require_admin(x_admin_token)
+    return Response(content=sampler.collapsed(route), media_type="text/plain")
+
+@router.get("/admin/profile/stats")
+async def get_profile_stats(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return sampler.get_stats()
+
+@router.delete("/admin/profile")
+async def reset_profile(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    sampler.reset()
+    return {"success": True}
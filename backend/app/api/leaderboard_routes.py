@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException
+from app.services.leaderboard import leaderboard
+from app.core.config import settings
+
+router = APIRouter()
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, settings.LEADERBOARD_MAX_LIMIT))
+
+@router.get("/leaderboard/stats")
+async def get_leaderboard_stats():
+    """Write-behind queue counters"""
+    return leaderboard.get_stats()
+
+@router.get("/leaderboard/{level_id}")
+def get_level_leaderboard(level_id: int, limit: int = 10):
+    """Fewest-moves results for a level"""
+    return {"level_id": level_id, "results": leaderboard.top(level_id, clamp_limit(limit))}
+
+@router.get("/leaderboard/{level_id}/players/{player}")
+def get_player_rank(level_id: int, player: str):
+    """A player's best result on a level and its rank"""
+    result = leaderboard.rank(level_id, player)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No result for this player on this level")
+    return result
+
+@router.get("/matches/{player}")
+def get_player_matches(player: str, limit: int = 20):
+    """A player's most recent multiplayer finishes"""
+    return {"player": player, "matches": leaderboard.matches(player, clamp_limit(limit))}
@@ -1,46 +1,111 @@
-from fastapi import APIRouter, HTTPException, Request, Body
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request, Response, Body, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Any
-from app.multiplayer.game_room import multiplayer_manager
+from app.api.caching import conditional_response
+from app.core.admission import AdmissionRejected, update_admission, update_coalescer
+from app.core.wire import MSGPACK, WireRoute, wants_msgpack
+from app.multiplayer.game_room import multiplayer_manager, MoveRejected, RACE
+from app.multiplayer.broadcast import room_broadcaster
+from app.multiplayer.matchmaking import matchmaker
+from app.multiplayer.lifecycle import room_reaper
 from app.services.game_engine import game_engine
+from app.services.leaderboard import leaderboard
+from app.core.config import settings
+import asyncio
+import json
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=WireRoute)
 
 class JoinRoomRequest(BaseModel):
-    player_name: str
+    player_name: str = Field(max_length=64)
     level_id: int
     room_id: Optional[str] = None
 
+class MatchmakeRequest(BaseModel):
+    player_name: str = Field(max_length=64)
+    level_id: int
+    skill: Optional[int] = None
+    by_band: bool = False
+
+class CreateRaceRequest(BaseModel):
+    player_name: str = Field(max_length=64)
+    level_id: int
+    max_players: int = Field(100, ge=2, le=settings.RACE_MAX_PLAYERS)
+
+class StartRaceRequest(BaseModel):
+    player_id: str
+
+class MoveSubmission(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    
+    room_id: str
+    player_id: str
+    from_bottle: int = Field(alias="from")
+    to_bottle: int = Field(alias="to")
+    seq: int
+
+def room_state_response(room, **fields) -> Response:
+    """``fields`` plus the room's shared snapshot, spliced in without re-encoding"""
+    head = json.dumps(fields, separators=(",", ":"))[:-1].encode()
+    return Response(content=head + b',"room_state":' + multiplayer_manager.snapshot(room) + b"}",
+                    media_type="application/json")
+
+def start_if_ready(room, bottles) -> bool:
+    """Start the room once it is full; True if it started now"""
+    if room.started or not room.can_start():
+        return False
+    room.start_game(bottles)
+    return True
+
+async def announce_join(room, player_id: str, started: bool):
+    await multiplayer_manager.publish(room.room_id, {
+        "type": "player_joined",
+        "version": room.version,
+        "player": room.get_player(player_id).to_dict()
+    })
+    if started:
+        await multiplayer_manager.publish(room.room_id, {
+            "type": "game_started",
+            "version": room.version,
+            "level_id": room.level_id,
+            "bottles": room.get_bottles()
+        })
+
+async def seat_in_open_room(level_id: int, player_id: str, name: str, bottles):
+    async with multiplayer_manager.level_lock(level_id):
+        async with multiplayer_manager.join_open_room(level_id, player_id, name) as room:
+            started = start_if_ready(room, bottles)
+        await announce_join(room, player_id, started)
+    return room
+
 @router.post("/multiplayer/join")
 async def join_multiplayer(request: JoinRoomRequest):
     """Join or create a multiplayer room"""
     
-    # Get level data (returns dict now)
-    level = game_engine.generate_level(request.level_id)
+    # Get level data (returns dict now); new levels are generated off the loop
+    level = await asyncio.to_thread(game_engine.generate_level, request.level_id)
     bottles = level['bottles']  # Access dict, not object attribute!
     
-    if request.room_id:
-        room = multiplayer_manager.get_room(request.room_id)
-        if not room:
-            raise HTTPException(status_code=404, detail="Room not found")
-    else:
-        room = multiplayer_manager.find_available_room(request.level_id)
-        if not room:
-            room_id = multiplayer_manager.create_room(request.level_id)
-            room = multiplayer_manager.get_room(room_id)
-    
     import uuid
     player_id = str(uuid.uuid4())
     
-    if not room.add_player(player_id, request.player_name):
-        raise HTTPException(status_code=400, detail="Room is full")
-    
-    if room.can_start():
-        room.start_game(bottles)
+    if request.room_id:
+        async with multiplayer_manager.room_lock(request.room_id):
+            async with multiplayer_manager.update_room(request.room_id) as room:
+                if not room:
+                    raise HTTPException(status_code=404, detail="Room not found")
+                if room.started and room.mode == RACE:
+                    raise HTTPException(status_code=409, detail="Race already started")
+                if not room.add_player(player_id, request.player_name):
+                    raise HTTPException(status_code=400, detail="Room is full")
+                started = start_if_ready(room, bottles)
+            await announce_join(room, player_id, started)
+    else:
+        room = await seat_in_open_room(request.level_id, player_id, request.player_name, bottles)
     
     current_bottles = room.get_bottles() if room.started else bottles
     
@@ -52,44 +117,193 @@ async def join_multiplayer(request: JoinRoomRequest):
         "room_state": room.get_state()
     }
 
+@router.post("/multiplayer/matchmake")
+async def matchmake(request: MatchmakeRequest):
+    """Wait for an opponent on the same level (or level/skill band).
+    
+    Falls back to a regular join when nobody turns up within the timeout.
+    """
+    room, player_id = await matchmaker.match(
+        request.player_name, request.level_id, request.skill, request.by_band
+    )
+    
+    level = await asyncio.to_thread(game_engine.generate_level, room.level_id if room else request.level_id)
+    bottles = level['bottles']
+    if room is None:
+        room = await seat_in_open_room(request.level_id, player_id, request.player_name, bottles)
+    
+    return {
+        "room_id": room.room_id,
+        "player_id": player_id,
+        "matched": room.started,
+        "bottles": room.get_bottles() if room.started else bottles,
+        "level_id": room.level_id,
+        "room_state": room.get_state()
+    }
+
+@router.get("/multiplayer/matchmaking/stats")
+async def matchmaking_stats():
+    return matchmaker.get_stats()
+
+@router.get("/multiplayer/stats")
+async def multiplayer_stats():
+    """Live and evicted room counts, approximate memory use, the room log
+    and admission control"""
+    log = multiplayer_manager.log
+    return {
+        **room_reaper.get_stats(),
+        "log": log.get_stats() if log is not None else None,
+        "admission": {**update_admission.get_stats(), "updates": update_coalescer.get_stats()}
+    }
+
+@router.post("/multiplayer/race")
+async def create_race(request: CreateRaceRequest):
+    """Open a race room for many players; others join it by room_id and
+    the creator (host) starts it"""
+    level = await asyncio.to_thread(game_engine.generate_level, request.level_id)
+    if not level['bottles']:
+        raise HTTPException(status_code=404, detail="Level not found")
+    
+    import uuid
+    player_id = str(uuid.uuid4())
+    room_id = await multiplayer_manager.create_room(request.level_id, ((player_id, request.player_name),),
+                                                    request.max_players, RACE)
+    return room_state_response(multiplayer_manager.get_room(room_id), room_id=room_id, player_id=player_id,
+                               level_id=request.level_id, bottles=level['bottles'])
+
+@router.post("/multiplayer/race/{room_id}/start")
+async def start_race(room_id: str, request: StartRaceRequest):
+    """Start a race with whoever has joined so far (host only)"""
+    async with multiplayer_manager.room_lock(room_id):
+        room = multiplayer_manager.get_room(room_id)
+        if not room:
+            raise HTTPException(status_code=404, detail="Room not found")
+        level = await asyncio.to_thread(game_engine.generate_level, room.level_id)
+        
+        async with multiplayer_manager.update_room(room_id) as room:
+            if not room:
+                raise HTTPException(status_code=404, detail="Room not found")
+            if room.mode != RACE or room.host != request.player_id:
+                raise HTTPException(status_code=403, detail="Only the race host can start it")
+            if room.started:
+                raise HTTPException(status_code=409, detail="Race already started")
+            room.start_game(level['bottles'])
+        
+        await multiplayer_manager.publish(room_id, {
+            "type": "game_started",
+            "version": room.version,
+            "level_id": room.level_id,
+            "bottles": room.get_bottles()
+        })
+    
+    return room_state_response(room, success=True)
+
 @router.get("/multiplayer/room/{room_id}")
-async def get_room_state(room_id: str):
-    """Get current room state including bottles"""
+async def get_room_state(room_id: str, request: Request):
+    """Get current room state including bottles; pollers send If-None-Match
+    with the last ETag and get 304 until the room version moves on"""
+    room = multiplayer_manager.get_room(room_id)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    
+    if wants_msgpack(request):
+        return conditional_response(request, multiplayer_manager.snapshot(room, packed=True), room.packed_etag,
+                                    media_type=MSGPACK, vary="Accept")
+    return conditional_response(request, multiplayer_manager.snapshot(room), room.etag, vary="Accept")
+
+@router.get("/multiplayer/room/{room_id}/standings")
+async def get_room_standings(room_id: str, limit: int = 10):
+    """The leading players, without the rest of the room"""
     room = multiplayer_manager.get_room(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    return room.get_state()
+    limit = max(1, min(limit, settings.STANDINGS_MAX_LIMIT))
+    return {
+        "room_id": room_id,
+        "version": room.version,
+        "players": len(room.players),
+        "finished": room.finishers,
+        "standings": room.ranked_players(limit)
+    }
+
+async def apply_progress(room_id: str, player_id: str, progress: dict):
+    async with multiplayer_manager.room_lock(room_id):
+        events = []
+        async with multiplayer_manager.update_room(room_id) as room:
+            if not room:
+                raise HTTPException(status_code=404, detail="Room not found")
+            
+            # Once the room has started the server counts every player's
+            # moves from /multiplayer/move, so reported counts are ignored
+            player = room.get_player(player_id)
+            if player and not room.started and player.moves != progress["moves"]:
+                room.update_player_move(player_id, progress["moves"])
+                events.append({
+                    "type": "moves",
+                    "version": room.version,
+                    "player_id": player_id,
+                    "moves": progress["moves"]
+                })
+        
+        for event in events:
+            await multiplayer_manager.publish(room_id, event)
+    return room
+
+def merge_progress(earlier: dict, later: dict) -> dict:
+    return later
+
+def admit_player(request: Request, room_id: str, player_id: str):
+    """Admission for a player's writes to a room: 404 unless they are in
+    it, 429 (with Retry-After) past the rate limits or while shedding.
+    
+    Only members of the room spend its tokens and their own, and those are
+    keyed on the caller too, so nobody can use up another player's limit or
+    a room's by sending requests under their ids.
+    """
+    room = multiplayer_manager.get_room(room_id)
+    member = room is not None and room.get_player(player_id) is not None
+    client = request.client.host if request.client else None
+    try:
+        update_admission.admit(ip=client,
+                               player=(player_id, client) if member else None,
+                               room=room_id if member else None)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": e.retry_after_header})
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if not member:
+        raise HTTPException(status_code=404, detail="Player not in room")
 
 @router.post("/multiplayer/update")
-async def update_player_progress(body: Any = Body(...)):
-    """Update player progress - accepts any JSON"""
+async def update_player_progress(request: Request, body: Any = Body(...)):
+    """Update player progress - accepts any JSON.
+    
+    Boards are no longer accepted here; pours go through /multiplayer/move,
+    which is also the only way to complete a level: ``completed`` is
+    ignored, as are ``moves`` once the room has started.
+    Updates for a room the player is not in are rejected (404). Rate
+    limited per client, player and room (429 with Retry-After), shed
+    while the server is overloaded, and bursts from one player are applied
+    as a single update.
+    """
     try:
         room_id = body.get("room_id") if isinstance(body, dict) else None
         player_id = body.get("player_id") if isinstance(body, dict) else None
         moves = body.get("moves") if isinstance(body, dict) else None
-        bottles = body.get("bottles") if isinstance(body, dict) else None
-        completed = body.get("completed", False) if isinstance(body, dict) else False
         
         if not room_id or not player_id or moves is None:
             raise HTTPException(status_code=400, detail=f"Missing fields")
+        if type(moves) is not int or not 0 <= moves <= settings.PROGRESS_MAX_MOVES:
+            raise HTTPException(status_code=400, detail="moves must be an integer "
+                                                        f"from 0 to {settings.PROGRESS_MAX_MOVES}")
         
-        room = multiplayer_manager.get_room(room_id)
-        if not room:
-            raise HTTPException(status_code=404, detail="Room not found")
-        
-        if bottles:
-            room.update_bottles(bottles)
-        
-        room.update_player_move(player_id, moves)
-        
-        if completed:
-            room.mark_player_complete(player_id)
-        
-        return {
-            "success": True,
-            "room_state": room.get_state()
-        }
+        admit_player(request, room_id, player_id)
+        room = await update_coalescer.submit(
+            (room_id, player_id), {"moves": moves},
+            lambda progress: apply_progress(room_id, player_id, progress), merge_progress
+        )
+        return room_state_response(room, success=True)
         
     except HTTPException:
         raise
@@ -97,34 +311,87 @@ async def update_player_progress(body: Any = Body(...)):
         logger.error(f"ERROR: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/multiplayer/move")
+async def submit_move(request: Request, move: MoveSubmission):
+    """Apply one pour to the player's server-side board.
+    
+    Admitted like /multiplayer/update, sharing its rate limits and shedding.
+    """
+    admit_player(request, move.room_id, move.player_id)
+    async with multiplayer_manager.room_lock(move.room_id):
+        async with multiplayer_manager.update_room(move.room_id) as room:
+            if not room:
+                raise HTTPException(status_code=404, detail="Room not found")
+            
+            try:
+                changed = room.apply_move(move.player_id, move.from_bottle, move.to_bottle, move.seq)
+            except MoveRejected as e:
+                player = room.get_player(move.player_id)
+                raise HTTPException(status_code=e.status_code, detail={
+                    "message": e.detail,
+                    "seq": player.seq if player else None
+                })
+        
+        player = room.get_player(move.player_id)
+        changed = {str(index): bottle for index, bottle in changed.items()}
+        await multiplayer_manager.publish(room.room_id, {
+            "type": "pour",
+            "version": room.version,
+            "player_id": player.id,
+            "seq": player.seq,
+            "changed": changed
+        })
+        if player.completed:
+            leaderboard.record_level_result(room.level_id, player.name, player.moves)
+            leaderboard.record_match_result(room.room_id, room.level_id, room.mode, player.name,
+                                            player.finish_order, player.moves)
+            await multiplayer_manager.publish(room.room_id, {
+                "type": "completed",
+                "version": room.version,
+                "player_id": player.id,
+                "winner": room.winner
+            })
+    
+    return {
+        "success": True,
+        "seq": player.seq,
+        "changed": changed,
+        "completed": player.completed,
+        "winner": room.winner
+    }
+
 @router.post("/multiplayer/next-level/{room_id}")
 async def load_next_level(room_id: str):
     """Load next level for the entire room"""
     try:
-        room = multiplayer_manager.get_room(room_id)
-        if not room:
-            raise HTTPException(status_code=404, detail="Room not found")
-        
-        next_level_id = room.level_id + 1
-        
-        if next_level_id > 50:
-            raise HTTPException(status_code=400, detail="No more levels!")
-        
-        # Generate new level (returns dict)
-        level = game_engine.generate_level(next_level_id)
-        
-        # Reset room
-        room.level_id = next_level_id
-        room.winner = None
-        room.started = True
-        
-        # Reset players
-        for player in room.players:
-            player.moves = 0
-            player.completed = False
-        
-        # Set new bottles
-        room.start_game(level['bottles'])  # Use dict access!
+        async with multiplayer_manager.room_lock(room_id):
+            room = multiplayer_manager.get_room(room_id)
+            if not room:
+                raise HTTPException(status_code=404, detail="Room not found")
+            
+            next_level_id = room.level_id + 1
+            
+            if next_level_id > settings.MAX_LEVEL_ID:
+                raise HTTPException(status_code=400, detail="No more levels!")
+            
+            # Generate new level (returns dict) outside the store transaction
+            level = await asyncio.to_thread(game_engine.generate_level, next_level_id)
+            
+            async with multiplayer_manager.update_room(room_id) as room:
+                if not room:
+                    raise HTTPException(status_code=404, detail="Room not found")
+                if room.level_id != next_level_id - 1:
+                    raise HTTPException(status_code=409, detail="Room already changed level")
+                
+                # Reset room and players onto the new bottles
+                room.load_level(next_level_id, level['bottles'])  # Use dict access!
+            
+            await multiplayer_manager.publish(room_id, {
+                "type": "level_changed",
+                "version": room.version,
+                "level_id": next_level_id,
+                "bottles": level['bottles']
+            })
         
         logger.info(f"Room {room_id} advanced to level {next_level_id}")
         
@@ -140,3 +407,34 @@ async def load_next_level(room_id: str):
     except Exception as e:
         logger.error(f"ERROR loading next level: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.websocket("/multiplayer/ws/{room_id}")
+async def room_updates(websocket: WebSocket, room_id: str):
+    """Push room events instead of polling: one snapshot, then deltas.
+    
+    Every delta sent is newer than the snapshot; clients that reconnect
+    should still drop events whose ``version`` is at or below the room state
+    they hold.
+    """
+    room = multiplayer_manager.get_room(room_id)
+    if not room:
+        await websocket.close(code=4404, reason="Room not found")
+        return
+    
+    await websocket.accept()
+    # Subscribe before the snapshot so events published while it is being
+    # sent are queued rather than lost
+    room = multiplayer_manager.get_room(room_id) or room
+    room_broadcaster.subscribe(room_id, websocket, hold=True)
+    snapshot = multiplayer_manager.snapshot(room)
+    try:
+        await websocket.send_text((b'{"type":"snapshot","room_state":' + snapshot + b"}").decode())
+        await room_broadcaster.release(websocket, room.version)
+        while True:
+            message = await websocket.receive_text()
+            if message == "ping":
+                await websocket.send_text("pong")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        room_broadcaster.unsubscribe(room_id, websocket)
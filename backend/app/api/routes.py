@@ -1,49 +1,297 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional, Tuple, Union
+from app.api.caching import conditional_response
+from app.core.wire import MSGPACK, WireRoute, msgpack_response, wants_msgpack
 from app.services.game_engine import game_engine
+from app.services.level_generator import level_generator
+from app.services.solver import solver
+from app.services.hints import hint_service
+from app.services.replay import count_replays, replay_verifier, verify_level
+from app.core.config import settings
+import asyncio
+import hashlib
+import json
+import logging
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Any JSON body may also be sent as msgpack (see app.core.wire)
+router = APIRouter(route_class=WireRoute)
 
 class MakeMoveRequest(BaseModel):
-    bottles: List[List[str]]
+    # Colour lists, or packed rows when ``palette`` is given
+    bottles: Union[List[List[str]], List[bytes]]
+    palette: Optional[List[str]] = None
     from_bottle: int
     to_bottle: int
+    max_capacity: int = 4
+    # One unit per move unless asked to pour the whole run, as /make-move always has
+    pour_all: bool = False
+
+class SolveRequest(BaseModel):
+    bottles: List[List[str]]
+    max_capacity: int = 4
+    max_nodes: Optional[int] = None
+
+class HintRequest(BaseModel):
+    bottles: List[List[str]]
+    max_capacity: int = 4
+
+class MovesRequest(BaseModel):
+    bottles: List[List[str]]
+    max_capacity: int = 4
+    check_dead_end: bool = True
+    # Legal moves returned for the previous board and the move applied
+    # since, so only the two touched bottles are re-checked
+    previous_moves: Optional[List[Tuple[int, int]]] = None
+    last_move: Optional[Tuple[int, int]] = None
+
+class VerifyRequest(BaseModel):
+    moves: List[Tuple[int, int]]
+    pour_all: bool = True
+
+class Submission(VerifyRequest):
+    level_id: int
+
+class BulkVerifyRequest(BaseModel):
+    submissions: List[Submission]
+
+LEVEL_NOT_FOUND = (f"Level not found. Levels 1-{settings.MAX_LEVEL_ID} available, generated in order "
+                   f"up to {settings.LEVEL_GENERATE_AHEAD} past the highest so far.")
+
+LEVEL_CACHE_CONTROL = f"public, max-age={settings.LEVEL_MAX_AGE}"
+
+def parse_level_ids(spec: str, limit: int) -> List[int]:
+    """Level ids from "1-120" style ranges and comma lists, in order, without repeats"""
+    ids = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        start = int(first)
+        end = int(last) if sep else start
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid level range: {part}")
+        if len(ids) + end - start + 1 > limit:
+            raise ValueError(f"At most {limit} levels per request")
+        for level_id in range(start, end + 1):
+            ids[level_id] = None
+    if not ids:
+        raise ValueError("No level ids given")
+    return list(ids)
+
+@router.get("/levels")
+def get_levels(ids: str, request: Request):
+    """Several levels in one response, e.g. ?ids=1-120 or ?ids=1,5,10-12.
+
+    Only stored and already generated levels are included; the rest are
+    listed under "missing" and can be fetched one by one.
+    """
+    try:
+        level_ids = parse_level_ids(ids, settings.LEVELS_BULK_MAX)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    payloads = []
+    etags = []
+    missing = []
+    for level_id in level_ids:
+        record = level_generator.lookup(level_id)
+        if record is None:
+            missing.append(level_id)
+        else:
+            payloads.append(record.payload)
+            etags.append(record.etag)
+    etag = '"' + hashlib.sha256(",".join(etags + [str(i) for i in missing]).encode()).hexdigest()[:32] + '"'
+    # Level payloads are already encoded; splice them in as they are
+    content = b'{"levels":[' + b",".join(payloads) + b'],"missing":' + json.dumps(missing).encode() + b"}"
+    return conditional_response(request, content, etag, LEVEL_CACHE_CONTROL)
 
 @router.get("/levels/{level_id}")
-async def get_level(level_id: int):
-    """Get a specific level - now supports 120 levels!"""
-    if level_id < 1 or level_id > 120:
-        raise HTTPException(status_code=404, detail="Level not found. Levels 1-120 available.")
+def get_level(level_id: int, request: Request):
+    """Get a specific level, generating levels past levels.json on first use"""
+    try:
+        record = level_generator.get(level_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if record is None:
+        raise HTTPException(status_code=404, detail=LEVEL_NOT_FOUND)
     
-    level_data = game_engine.generate_level(level_id)
-    return level_data
+    if wants_msgpack(request):
+        return conditional_response(request, record.packed_payload, record.packed_etag, LEVEL_CACHE_CONTROL,
+                                    MSGPACK, vary="Accept")
+    return conditional_response(request, record.payload, record.etag, LEVEL_CACHE_CONTROL, vary="Accept")
+
+def request_board(bottles, colors: Optional[List[str]]):
+    """The palette and packed board for colour lists, or for packed rows and their palette"""
+    if colors is not None:
+        return game_engine.load_packed(colors, bottles)
+    if any(isinstance(bottle, bytes) for bottle in bottles):
+        raise ValueError("Packed bottles need a palette")
+    return game_engine.pack(bottles)
 
 @router.post("/make-move")
-async def make_move(request: MakeMoveRequest):
+async def make_move(request: MakeMoveRequest, http_request: Request):
     """Validate and make a move"""
+    if request.max_capacity < 1 or any(len(bottle) > request.max_capacity for bottle in request.bottles):
+        raise HTTPException(status_code=400, detail="Bottle exceeds max_capacity")
+    
+    try:
+        palette, state = request_board(request.bottles, request.palette)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
-        success, new_bottles = game_engine.validate_move(
-            request.bottles,
-            request.from_bottle,
-            request.to_bottle
-        )
+        new_state = game_engine.play_move(state, request.from_bottle, request.to_bottle, "singleplayer",
+                                          request.max_capacity, request.pour_all)
+        
+        if wants_msgpack(http_request):
+            # Packed rows back; a client that sent its own palette keeps its IDs
+            board = state if new_state is None else new_state
+            result = {"success": new_state is not None}
+            if request.palette is None:
+                palette, board = palette.compact(board)
+                result["palette"] = palette.colors
+            result["bottles"] = list(board)
+            if new_state is None:
+                result["message"] = "Invalid move"
+            else:
+                result["is_completed"] = game_engine.is_completed(new_state, request.max_capacity)
+            return msgpack_response(result)
         
-        if not success:
+        if new_state is None:
             return {
                 "success": False,
                 "message": "Invalid move",
-                "bottles": request.bottles
+                "bottles": request.bottles if request.palette is None else palette.unpack(state)
             }
         
-        is_completed = game_engine.check_completion(new_bottles)
-        
         return {
             "success": True,
-            "bottles": new_bottles,
-            "is_completed": is_completed
+            "bottles": palette.unpack(new_state),
+            "is_completed": game_engine.is_completed(new_state, request.max_capacity)
         }
         
     except Exception as e:
-        print(f"ERROR in make_move: {e}")
+        logger.error(f"ERROR in make_move: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/levels/{level_id}/solution")
+def get_level_solution(level_id: int):
+    """Solve a stored or generated level (cached after the first request)"""
+    record = level_generator.lookup(level_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=LEVEL_NOT_FOUND)
+    
+    result = solver.solve_level(record)
+    
+    return {"level_id": level_id, **result.to_dict()}
+
+@router.post("/solve")
+def solve_board(request: SolveRequest):
+    """Solve an arbitrary board within the solver budget"""
+    if request.max_capacity < 1 or any(len(bottle) > request.max_capacity for bottle in request.bottles):
+        raise HTTPException(status_code=400, detail="Bottle exceeds max_capacity")
+    
+    try:
+        _, state = game_engine.pack(request.bottles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    max_nodes = request.max_nodes
+    if max_nodes is not None:
+        max_nodes = max(1, min(max_nodes, settings.SOLVER_MAX_NODES))
+    return solver.solve(state, request.max_capacity, max_nodes).to_dict()
+
+@router.post("/hint")
+def get_hint(request: HintRequest):
+    """Next pour on the best known path for an arbitrary board"""
+    if request.max_capacity < 1 or any(len(bottle) > request.max_capacity for bottle in request.bottles):
+        raise HTTPException(status_code=400, detail="Bottle exceeds max_capacity")
+    
+    try:
+        _, state = game_engine.pack(request.bottles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    move = hint_service.hint(state, request.max_capacity)
+    return {
+        "move": list(move) if move else None,
+        "from_bottle": move[0] if move else None,
+        "to_bottle": move[1] if move else None,
+        "is_completed": move is None and game_engine.is_completed(state, request.max_capacity)
+    }
+
+@router.get("/hint/stats")
+async def hint_stats():
+    """Hint cache size and hit rate"""
+    return hint_service.get_stats()
+
+def describe_moves(state, capacity: int, check_dead_end: bool, moves=None) -> dict:
+    if moves is None:
+        moves = game_engine.legal_moves(state, capacity)
+    dead, reason = game_engine.dead_end(state, capacity, moves) if check_dead_end else (None, None)
+    return {
+        "moves": [list(move) for move in moves],
+        "count": len(moves),
+        "is_completed": game_engine.is_completed(state, capacity),
+        "dead_end": dead,
+        "dead_end_reason": reason
+    }
+
+@router.get("/moves")
+def get_level_moves(level_id: int, check_dead_end: bool = False):
+    """Legal moves from a level's starting board"""
+    record = level_generator.lookup(level_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=LEVEL_NOT_FOUND)
+    
+    _, state = game_engine.pack(record.bottles)
+    return {"level_id": level_id, **describe_moves(state, record.max_capacity, check_dead_end)}
+
+@router.post("/moves")
+def get_board_moves(request: MovesRequest):
+    """Legal moves for a board, and whether it can still be solved"""
+    if request.max_capacity < 1 or any(len(bottle) > request.max_capacity for bottle in request.bottles):
+        raise HTTPException(status_code=400, detail="Bottle exceeds max_capacity")
+    
+    try:
+        _, state = game_engine.pack(request.bottles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    moves = None
+    if request.previous_moves is not None and request.last_move is not None:
+        touched = list(request.last_move) + [index for move in request.previous_moves for index in move]
+        if any(not 0 <= index < len(state) for index in touched):
+            raise HTTPException(status_code=400, detail="Move index out of range")
+        moves = game_engine.update_legal_moves(state, request.previous_moves, request.last_move,
+                                               request.max_capacity)
+    
+    return describe_moves(state, request.max_capacity, request.check_dead_end, moves)
+
+@router.post("/levels/{level_id}/verify")
+async def verify_replay(level_id: int, request: VerifyRequest):
+    """Replay a full move sequence against a stored level in one pass"""
+    if level_generator.lookup(level_id) is None:
+        raise HTTPException(status_code=404, detail=LEVEL_NOT_FOUND)
+    
+    result = await asyncio.to_thread(verify_level, level_id, request.moves, request.pour_all, include_final=True)
+    count_replays([result])
+    return result
+
+@router.post("/verify")
+async def verify_replays(request: BulkVerifyRequest):
+    """Verify many submissions at once (large batches use a process pool)"""
+    if len(request.submissions) > settings.VERIFY_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {settings.VERIFY_MAX_BATCH} submissions per request")
+    
+    results = await replay_verifier.verify_bulk([
+        (submission.level_id, submission.moves, submission.pour_all)
+        for submission in request.submissions
+    ])
+    return {
+        "results": results,
+        "valid": sum(1 for result in results if result["valid"])
+    }
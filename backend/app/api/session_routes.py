@@ -0,0 +1,72 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional
+from app.services.level_generator import level_generator
+from app.services.sessions import GameSession, session_store
+from app.api.routes import LEVEL_NOT_FOUND
+
+router = APIRouter()
+
+class CreateSessionRequest(BaseModel):
+    level_id: int
+    pour_all: bool = True
+    # Completed runs go on the level's leaderboard under this name, with
+    # pour_all only (the rules multiplayer plays by)
+    player_name: Optional[str] = Field(None, min_length=1, max_length=64)
+
+class SessionMove(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    from_bottle: int = Field(alias="from")
+    to_bottle: int = Field(alias="to")
+
+def get_session(session_id: str) -> GameSession:
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+@router.post("/sessions")
+def create_session(request: CreateSessionRequest):
+    """Start a level with the board kept server-side; moves then only send {from, to}"""
+    try:
+        record = level_generator.get(request.level_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if record is None:
+        raise HTTPException(status_code=404, detail=LEVEL_NOT_FOUND)
+
+    return session_store.create(record, request.pour_all, request.player_name).get_state()
+
+@router.get("/sessions/stats")
+async def get_session_stats():
+    return session_store.get_stats()
+
+@router.get("/sessions/{session_id}")
+async def get_session_state(session_id: str):
+    return get_session(session_id).get_state()
+
+@router.delete("/sessions/{session_id}")
+async def end_session(session_id: str):
+    if not session_store.remove(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"success": True}
+
+@router.post("/sessions/{session_id}/moves")
+async def make_session_move(session_id: str, move: SessionMove):
+    """Pour on the session board; invalid moves leave it unchanged"""
+    session = get_session(session_id)
+    success = session.move(move.from_bottle, move.to_bottle)
+    return {"success": success, **session.get_state()}
+
+@router.post("/sessions/{session_id}/undo")
+async def undo_session_move(session_id: str):
+    session = get_session(session_id)
+    success = session.undo()
+    return {"success": success, **session.get_state()}
+
+@router.post("/sessions/{session_id}/redo")
+async def redo_session_move(session_id: str):
+    session = get_session(session_id)
+    success = session.redo()
+    return {"success": success, **session.get_state()}
@@ -0,0 +1,230 @@
+import asyncio
+import math
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class AdmissionRejected(Exception):
+    """A request turned away before any work; retry after ``retry_after`` seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Too many requests ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        # Retry-After takes whole seconds
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBuckets:
+    """A token bucket per key: ``burst`` requests at once, refilled at
+    ``rate`` per second.
+
+    Buckets live in memory, least recently used first. A bucket left alone
+    for ``burst / rate`` seconds is full again, the same as no bucket, so it
+    is dropped from the front as time slides past it; at most ``max_keys``
+    are kept either way.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.refill_time = burst / rate
+        # key -> [tokens, time of last update]
+        self.buckets: "OrderedDict[Hashable, list]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+    def _expire(self, now: float):
+        buckets = self.buckets
+        while buckets:
+            _, updated = next(iter(buckets.values()))
+            if now - updated < self.refill_time and len(buckets) <= self.max_keys:
+                break
+            buckets.popitem(last=False)
+
+    def tokens(self, key: Hashable, now: float) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return self.burst
+        return min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+
+    def take(self, key: Hashable, now: float):
+        tokens = self.tokens(key, now)
+        self.buckets[key] = [tokens - 1, now]
+        self.buckets.move_to_end(key)
+        self._expire(now)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that sleeps
+    ``interval`` seconds. Lag means callbacks are queueing up behind work on
+    the loop, and every request's latency grows with it."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - started - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.lag = 0.0
+
+
+class _Batch:
+    def __init__(self, values: Any):
+        self.values = values
+        self.task: Optional[asyncio.Task] = None
+
+
+class Coalescer:
+    """Collapses bursts of updates per key.
+
+    The first update for a key is applied straight away. Updates arriving
+    within ``window`` seconds of the last apply are merged into one batch
+    that is applied once the window ends, and every request in the batch
+    gets its result, so a client firing updates back to back costs at most
+    one apply per window. The batch runs as its own task, so a caller
+    disconnecting does not cancel the others' update.
+    """
+
+    def __init__(self, window: float, max_keys: int):
+        self.window = window
+        self.max_keys = max_keys
+        # key -> [time the next apply may start, open batch or None]
+        self.keys: "OrderedDict[Hashable, list]" = OrderedDict()
+        self.applied = 0
+        self.coalesced = 0
+
+    def _expire(self, now: float):
+        keys = self.keys
+        while keys:
+            ready_at, batch = next(iter(keys.values()))
+            if batch is not None or (ready_at > now and len(keys) <= self.max_keys):
+                break
+            keys.popitem(last=False)
+
+    async def submit(self, key: Hashable, values: Any, apply: Callable[[Any], Awaitable[Any]],
+                     merge: Callable[[Any, Any], Any]) -> Any:
+        """``apply(values)``, or one apply of ``values`` merged with the
+        other updates for ``key`` in the same window"""
+        now = time.monotonic()
+        entry = self.keys.get(key)
+        if entry is not None and entry[1] is not None:
+            batch = entry[1]
+            batch.values = merge(batch.values, values)
+            self.coalesced += 1
+            return await asyncio.shield(batch.task)
+        if entry is None:
+            entry = self.keys[key] = [now, None]
+        self.keys.move_to_end(key)
+        batch = entry[1] = _Batch(values)
+        batch.task = asyncio.create_task(self._run(entry, batch, max(0.0, entry[0] - now), apply))
+        self._expire(now)
+        return await asyncio.shield(batch.task)
+
+    async def _run(self, entry: list, batch: _Batch, delay: float, apply: Callable[[Any], Awaitable[Any]]) -> Any:
+        if delay:
+            await asyncio.sleep(delay)
+        # Close the batch: later updates wait for the next window
+        entry[1] = None
+        entry[0] = time.monotonic() + self.window
+        self.applied += 1
+        return await apply(batch.values)
+
+    def get_stats(self) -> dict:
+        return {"applied": self.applied, "coalesced": self.coalesced, "tracked_keys": len(self.keys)}
+
+
+class AdmissionControl:
+    """Token-bucket limits per key type (e.g. player, room, client IP) plus
+    load shedding while the event loop lags more than ``shed_lag`` seconds.
+
+    A request is admitted only if every one of its buckets has a token, and
+    only then are tokens taken, so a rejected request costs nothing. While
+    the loop lags, requests also need every bucket at least half full: the
+    clients sending the most are shed first, and players sending at a
+    steady pace carry on as before.
+    """
+
+    def __init__(self, limits: Dict[str, TokenBuckets], lag_monitor: LoopLagMonitor, shed_lag: float):
+        self.limits = limits
+        self.lag_monitor = lag_monitor
+        self.shed_lag = shed_lag
+        self.admitted = 0
+        self.rejected: Counter = Counter()
+
+    def admit(self, **keys: Hashable):
+        """Raise AdmissionRejected unless the request may go ahead (keys
+        given as None are not limited)"""
+        now = time.monotonic()
+        overloaded = bool(self.shed_lag) and self.lag_monitor.lag > self.shed_lag
+        keys = {kind: key for kind, key in keys.items() if key is not None}
+        for kind, key in keys.items():
+            buckets = self.limits[kind]
+            tokens = buckets.tokens(key, now)
+            if tokens < 1:
+                self.rejected[kind] += 1
+                raise AdmissionRejected(f"{kind} rate limit", (1 - tokens) / buckets.rate)
+            if overloaded and tokens < buckets.burst / 2:
+                self.rejected["shed"] += 1
+                raise AdmissionRejected("server busy", (buckets.burst / 2 - tokens) / buckets.rate)
+        for kind, key in keys.items():
+            self.limits[kind].take(key, now)
+        self.admitted += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "loop_lag_ms": round(self.lag_monitor.lag * 1000, 2),
+            "max_loop_lag_ms": round(self.lag_monitor.max_lag * 1000, 2),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "tracked_keys": {kind: len(buckets) for kind, buckets in self.limits.items()},
+        }
+
+
+loop_lag = LoopLagMonitor(settings.LOOP_LAG_INTERVAL)
+
+update_admission = AdmissionControl({
+    "player": TokenBuckets(settings.UPDATE_RATE_PLAYER, settings.UPDATE_BURST_PLAYER, settings.RATE_LIMIT_MAX_KEYS),
+    "room": TokenBuckets(settings.UPDATE_RATE_ROOM, settings.UPDATE_BURST_ROOM, settings.RATE_LIMIT_MAX_KEYS),
+    "ip": TokenBuckets(settings.UPDATE_RATE_IP, settings.UPDATE_BURST_IP, settings.RATE_LIMIT_MAX_KEYS),
+}, loop_lag, settings.LOOP_LAG_SHED)
+
+update_coalescer = Coalescer(settings.UPDATE_COALESCE_WINDOW, settings.RATE_LIMIT_MAX_KEYS)
+
+metrics.gauge("watersort_event_loop_lag_seconds", "How late the event loop last woke a sleeping task",
+              lambda: loop_lag.lag)
+metrics.collected_counter("watersort_admission_rejected_total", "Requests turned away by admission control",
+                          lambda: {(reason,): count for reason, count in update_admission.rejected.items()},
+                          ("reason",))
+metrics.collected_counter("watersort_updates_total", "Progress updates applied or merged into another",
+                          lambda: {("applied",): update_coalescer.applied, ("coalesced",): update_coalescer.coalesced},
+                          ("outcome",))
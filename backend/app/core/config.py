@@ -13,6 +13,124 @@ class Settings(BaseSettings):
     
     # Allow all origins for now
     BACKEND_CORS_ORIGINS: List[str] = ["*"]
+    
+    # Solver budget: exact A* first, weighted A* when that runs out
+    SOLVER_MAX_NODES: int = 20000
+    SOLVER_TIME_LIMIT: float = 2.0
+    SOLVER_FALLBACK_WEIGHT: float = 2.0
+    SOLVER_FALLBACK_NODE_FACTOR: int = 5
+    # Solved levels kept in memory per process
+    SOLVER_LEVEL_CACHE_SIZE: int = 1000
+    
+    # Matchmaking: seconds to wait for an opponent, and band widths
+    MATCHMAKING_TIMEOUT: float = 30.0
+    MATCHMAKING_LEVEL_BAND: int = 10
+    MATCHMAKING_SKILL_BAND: int = 100
+    
+    # Room lifecycle (seconds): waiting rooms expire from creation, started
+    # rooms when idle, finished rooms shortly after the last activity
+    MAX_ROOMS: int = 10000
+    ROOM_WAITING_TTL: float = 600.0
+    ROOM_IDLE_TTL: float = 1800.0
+    ROOM_FINISHED_TTL: float = 300.0
+    ROOM_REAP_INTERVAL: float = 30.0
+    
+    # Race rooms: up to RACE_MAX_PLAYERS on one level, started by the host
+    RACE_MAX_PLAYERS: int = 500
+    # Largest move count a player may report through /multiplayer/update
+    PROGRESS_MAX_MOVES: int = 1000000
+    STANDINGS_MAX_LIMIT: int = 100
+    
+    # Admission control for /multiplayer/update and /multiplayer/move, which
+    # share token buckets per client IP and, for players in the room, per
+    # player and IP and per room (RATE per second, up to BURST at once; a
+    # room allows RACE_MAX_PLAYERS at the player rate); updates from one
+    # player within UPDATE_COALESCE_WINDOW seconds are applied as one, and,
+    # while the event loop lags more than LOOP_LAG_SHED seconds, the clients
+    # that have sent the most get 429s (0 never sheds)
+    UPDATE_RATE_PLAYER: float = 10.0
+    UPDATE_BURST_PLAYER: float = 20.0
+    UPDATE_RATE_ROOM: float = 5000.0
+    UPDATE_BURST_ROOM: float = 10000.0
+    UPDATE_RATE_IP: float = 200.0
+    UPDATE_BURST_IP: float = 400.0
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    UPDATE_COALESCE_WINDOW: float = 0.05
+    LOOP_LAG_INTERVAL: float = 0.05
+    LOOP_LAG_SHED: float = 0.05
+    
+    # Room state backend: "memory" (single worker) or "sqlite" (shared by
+    # every worker on the host through ROOM_STORE_PATH)
+    ROOM_STORE: str = "memory"
+    ROOM_STORE_PATH: str = "rooms.db"
+    
+    # Event log of in-memory rooms for crash recovery ("" to disable):
+    # events are fsynced every ROOM_LOG_FLUSH_INTERVAL seconds and the rooms
+    # snapshotted every ROOM_LOG_SNAPSHOT_INTERVAL seconds, pickling
+    # ROOM_LOG_SNAPSHOT_CHUNK rooms per turn of the event loop
+    ROOM_LOG_DIR: str = "room_log"
+    ROOM_LOG_FLUSH_INTERVAL: float = 0.05
+    ROOM_LOG_SNAPSHOT_INTERVAL: float = 60.0
+    ROOM_LOG_SNAPSHOT_CHUNK: int = 200
+    
+    # Replay verification runs off the event loop: bulk batches from this
+    # size go to a process pool, smaller ones to a thread
+    # (0 workers = one per CPU)
+    VERIFY_POOL_WORKERS: int = 0
+    VERIFY_POOL_MIN_BATCH: int = 256
+    VERIFY_MAX_BATCH: int = 10000
+    
+    # Procedural levels past levels.json: generated on first request up to
+    # MAX_LEVEL_ID and appended to LEVEL_CACHE_PATH so each is solved once.
+    # Requests generate at most LEVEL_GENERATE_AHEAD past the highest level
+    # known so far; further ones are pre-generated offline (level_generator)
+    MAX_LEVEL_ID: int = 100000
+    LEVEL_GENERATE_AHEAD: int = 50
+    LEVEL_CACHE_PATH: str = "generated_levels.bin"
+    LEVEL_GENERATOR_SEED: int = 0
+    LEVEL_GENERATOR_MAX_ATTEMPTS: int = 20
+    
+    # Hints: LRU of canonical board -> next move on the best known path
+    HINT_CACHE_SIZE: int = 200000
+    
+    # Dead-end detection: bounded greedy search after the cheap checks (any
+    # solution will do, and running out of states proves a dead end)
+    DEAD_END_MAX_NODES: int = 5000
+    DEAD_END_TIME_LIMIT: float = 0.5
+    DEAD_END_WEIGHT: float = 3.0
+    
+    # Admin endpoints are disabled while ADMIN_TOKEN is empty
+    ADMIN_TOKEN: str = ""
+    
+    # Request profiling: while a fraction of requests, plus any request sent
+    # with "X-Profile: <ADMIN_TOKEN>", are in flight, the process's stacks
+    # are sampled every PROFILE_INTERVAL seconds
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL: float = 0.001
+    PROFILE_MAX_STACKS: int = 5000
+    
+    # Singleplayer sessions: board, history and undo kept server-side,
+    # dropped after SESSION_TTL idle seconds or least recently used first;
+    # undo reaches back SESSION_MAX_HISTORY moves
+    SESSION_MAX: int = 100000
+    SESSION_TTL: float = 1800.0
+    SESSION_MAX_HISTORY: int = 500
+    
+    # Leaderboards: best result per player and level plus multiplayer
+    # finishes, queued in memory and written to LEADERBOARD_PATH in batches
+    LEADERBOARD_PATH: str = "leaderboard.db"
+    LEADERBOARD_FLUSH_INTERVAL: float = 0.5
+    LEADERBOARD_BATCH_SIZE: int = 5000
+    LEADERBOARD_MAX_PENDING: int = 100000
+    LEADERBOARD_MAX_LIMIT: int = 100
+    
+    # HTTP caching and compression: level responses carry content-hash
+    # ETags and may be cached for LEVEL_MAX_AGE seconds; room state is
+    # always revalidated against its version. Bodies from GZIP_MIN_SIZE
+    # bytes are gzipped for clients that accept it
+    LEVEL_MAX_AGE: int = 3600
+    LEVELS_BULK_MAX: int = 500
+    GZIP_MIN_SIZE: int = 1024
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,184 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import route_template
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRUNCATED = "[truncated]"
+MAX_DEPTH = 128
+
+
+def frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(APP_DIR):
+        filename = "app" + filename[len(APP_DIR):]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> List[str]:
+    """Root-first frame labels for one thread's stack"""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class StackSampler:
+    """Samples thread stacks while a profiled request is in flight.
+
+    Only one request is profiled at a time, but the profile is process-wide:
+    the event loop and worker threads run other requests and background
+    tasks meanwhile, and their stacks are counted under the profiled
+    request's route too. Read a route's flame graph as "what the process
+    was doing while that route ran", which is representative when profiled
+    requests are sampled across normal traffic.
+
+    The event loop thread is sampled unless it is idle in select(); worker
+    threads only when they are running app code (requests served from the
+    threadpool, to_thread calls). The sampling thread sleeps on an event
+    while nothing is being profiled.
+    """
+
+    def __init__(self, interval: float, max_stacks: int):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.current: Optional[Counter] = None
+        self.loop_thread: Optional[int] = None
+        # route -> collapsed stack -> samples
+        self.stacks: Dict[str, Counter] = {}
+        self.requests: Counter = Counter()
+        self.distinct = 0
+
+    def begin(self) -> Optional[Counter]:
+        """Start profiling the calling request, or None if one already is"""
+        with self.lock:
+            if self.current is not None:
+                return None
+            self.current = Counter()
+            self.loop_thread = threading.get_ident()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self.thread.start()
+        self.wake.set()
+        return self.current
+
+    def end(self, samples: Counter, route: str):
+        with self.lock:
+            self.current = None
+            self.wake.clear()
+            self.requests[route] += 1
+            stacks = self.stacks.setdefault(route, Counter())
+            for stack, count in samples.items():
+                if stack not in stacks:
+                    if self.distinct >= self.max_stacks:
+                        stack = TRUNCATED
+                    else:
+                        self.distinct += 1
+                stacks[stack] += count
+
+    def _sample(self):
+        own = threading.get_ident()
+        with self.lock:
+            samples = self.current
+            loop_thread = self.loop_thread
+        if samples is None:
+            return
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            labels = collapse(frame)
+            if ident == loop_thread:
+                # Loop parked in select() is waiting, not working
+                if labels and labels[-1].startswith("select ("):
+                    continue
+            elif not any("(app/" in label for label in labels):
+                continue
+            samples[";".join(labels)] += 1
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            self._sample()
+            time.sleep(self.interval)
+
+    def collapsed(self, route: Optional[str] = None) -> str:
+        """flamegraph.pl / speedscope compatible collapsed stacks, rooted at the route"""
+        with self.lock:
+            lines = [
+                f"{name};{stack} {count}"
+                for name, stacks in sorted(self.stacks.items())
+                if route is None or name == route
+                for stack, count in stacks.most_common()
+            ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "sample_rate": settings.PROFILE_SAMPLE_RATE,
+                "interval": self.interval,
+                "requests": dict(self.requests),
+                "samples": {route: sum(stacks.values()) for route, stacks in self.stacks.items()},
+                "distinct_stacks": self.distinct,
+                "max_stacks": self.max_stacks,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.stacks.clear()
+            self.requests.clear()
+            self.distinct = 0
+
+
+sampler = StackSampler(settings.PROFILE_INTERVAL, settings.PROFILE_MAX_STACKS)
+
+PROFILE_HEADER = b"x-profile"
+
+
+def wants_profile(scope) -> bool:
+    """Per-request opt-in with the admin token, or random sampling"""
+    if settings.ADMIN_TOKEN:
+        token = settings.ADMIN_TOKEN.encode()
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, token)
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+class ProfilingMiddleware:
+    """ASGI middleware feeding selected requests to the stack sampler.
+
+    Unselected requests cost one header scan and a settings read.
+    """
+
+    def __init__(self, app, router=None):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        samples = sampler.begin()
+        if samples is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.end(samples, f"{scope['method']} {route_template(self.router or self.app, scope)}")
@@ -0,0 +1,95 @@
+"""MessagePack as an alternative to JSON on the game and room endpoints.
+
+Clients opt in with ``Accept: application/msgpack`` and may send request
+bodies with the same content type. Boards then travel as packed rows: a
+``palette`` list of colour strings and one binary row per bottle, where
+byte ``k`` is ``palette[k - 1]``, bottom of the bottle first. JSON stays the
+default, and is all anyone gets when msgpack is not installed.
+"""
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:  # optional: without it every client gets JSON
+    msgpack = None
+
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+
+
+def enabled() -> bool:
+    return msgpack is not None
+
+
+def encode(obj: Any) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def decode(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False)
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";", 1)[0].strip().lower() in MSGPACK_TYPES
+
+
+def wants_msgpack(request: Request) -> bool:
+    """True if the Accept header lists msgpack (without q=0)"""
+    accept = request.headers.get("accept")
+    if not accept or msgpack is None or "msgpack" not in accept:
+        return False
+    for entry in accept.split(","):
+        media_type, *params = entry.split(";")
+        if media_type.strip().lower() not in MSGPACK_TYPES:
+            continue
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def msgpack_response(obj: Any, headers: Optional[dict] = None) -> Response:
+    return Response(content=encode(obj), media_type=MSGPACK, headers=headers)
+
+
+class MsgpackRequest(Request):
+    """A request whose msgpack body is handed to FastAPI as if it were JSON"""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            try:
+                self._json = decode(await self.body())
+            except Exception:
+                raise HTTPException(status_code=400, detail="Invalid MessagePack body")
+        return self._json
+
+
+class WireRoute(APIRoute):
+    """Route class accepting msgpack request bodies wherever JSON is accepted.
+
+    FastAPI only parses JSON bodies, so msgpack requests are relabelled as
+    JSON and their ``json()`` decodes msgpack instead; the decoded body goes
+    through the same pydantic validation.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if msgpack is not None and is_msgpack(request.headers.get("content-type")):
+                scope = dict(request.scope)
+                scope["headers"] = [
+                    (name, value) for name, value in request.scope["headers"] if name != b"content-type"
+                ] + [(b"content-type", b"application/json")]
+                request = MsgpackRequest(scope, request.receive)
+            return await handler(request)
+
+        return route_handler
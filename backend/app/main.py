@@ -3,13 +3,38 @@ from pathlib import Path
 if __name__ == "__main__":
     sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from app.core.admission import loop_lag
 from app.core.config import settings
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, metrics
+from app.core.profiling import ProfilingMiddleware
 from app.api.routes import router
 from app.api.multiplayer_routes import router as multiplayer_router
+from app.api.admin_routes import router as admin_router
+from app.api.session_routes import router as session_router
+from app.api.leaderboard_routes import router as leaderboard_router
+from app.multiplayer.game_room import multiplayer_manager
+from app.multiplayer.lifecycle import room_reaper
+from app.services.leaderboard import leaderboard
+from app.services.replay import replay_verifier
 
-app = FastAPI(title=settings.APP_NAME, version=settings.APP_VERSION)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await multiplayer_manager.start()
+    loop_lag.start()
+    room_reaper.start()
+    leaderboard.start()
+    yield
+    await room_reaper.stop()
+    await loop_lag.stop()
+    await leaderboard.stop()
+    await multiplayer_manager.stop()
+    replay_verifier.shutdown()
+
+app = FastAPI(title=settings.APP_NAME, version=settings.APP_VERSION, lifespan=lifespan)
 
 # CRITICAL: Allow ALL origins for CORS
 app.add_middleware(
@@ -21,8 +46,16 @@ app.add_middleware(
     expose_headers=["*"]  # Expose all headers
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MIN_SIZE)
+app.add_middleware(ProfilingMiddleware, router=app.router)
+# Outermost, so latency includes CORS handling and profiling
+app.add_middleware(MetricsMiddleware, router=app.router)
+
 app.include_router(router, prefix=settings.API_V1_PREFIX)
+app.include_router(session_router, prefix=settings.API_V1_PREFIX)
+app.include_router(leaderboard_router, prefix=settings.API_V1_PREFIX)
 app.include_router(multiplayer_router, prefix=settings.API_V1_PREFIX)
+app.include_router(admin_router, prefix=settings.API_V1_PREFIX)
 
 @app.get("/")
 async def root():
@@ -33,6 +66,11 @@ async def root():
         "features": ["singleplayer", "multiplayer"]
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of request, room and move metrics"""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host=settings.SERVICE_HOST, port=settings.SERVICE_PORT, reload=settings.DEBUG)
@@ -1,11 +1,11 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class Level(BaseModel):
     level_id: int
     bottles: List[List[str]]
     max_capacity: int = 4
-    optimal_moves: int = 20
+    optimal_moves: Optional[int] = None
 
 class MoveRequest(BaseModel):
     bottles: List[List[str]]
@@ -1,7 +1,7 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 class Level(BaseModel):
     level_id: int
     bottles: List[List[str]]
-    optimal_moves: int
+    optimal_moves: Optional[int] = None
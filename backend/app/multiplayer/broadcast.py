@@ -0,0 +1,99 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from app.multiplayer.game_room import multiplayer_manager
+
+logger = logging.getLogger(__name__)
+
+
+class RoomBroadcaster:
+    """Fans room events out to every WebSocket subscribed to that room.
+
+    Each event is encoded once and the same text frame is sent to all
+    subscribers concurrently, so a slow socket never holds up the others.
+    Sockets that fail to receive are dropped.
+
+    A socket subscribed with ``hold=True`` queues its events instead, so
+    nothing published while its snapshot is being sent is lost; ``release``
+    then sends the queue, skipping events the snapshot already covers.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[WebSocket]] = {}
+        self.held: Dict[WebSocket, List[Tuple[Optional[int], str]]] = {}
+
+    def subscriber_count(self, room_id: str) -> int:
+        return len(self.subscribers.get(room_id, ()))
+
+    def subscribe(self, room_id: str, websocket: WebSocket, hold: bool = False):
+        if hold:
+            self.held[websocket] = []
+        self.subscribers.setdefault(room_id, set()).add(websocket)
+
+    async def release(self, websocket: WebSocket, version: int):
+        """Send a held socket's queued events newer than ``version`` and
+        start sending it events directly"""
+        queue = self.held.get(websocket)
+        while queue:
+            event_version, message = queue.pop(0)
+            if event_version is None or event_version > version:
+                await websocket.send_text(message)
+        self.held.pop(websocket, None)
+
+    def unsubscribe(self, room_id: str, websocket: WebSocket):
+        self.held.pop(websocket, None)
+        sockets = self.subscribers.get(room_id)
+        if sockets is None:
+            return
+        sockets.discard(websocket)
+        if not sockets:
+            del self.subscribers[room_id]
+
+    def drop_room(self, room_id: str):
+        """Forget a room's subscribers and close their sockets"""
+        sockets = self.subscribers.pop(room_id, None)
+        if not sockets:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        for websocket in sockets:
+            loop.create_task(self._close(websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=4410, reason="Room expired")
+        except Exception:
+            pass
+
+    async def publish(self, room_id: str, event: Dict[str, Any]):
+        sockets = self.subscribers.get(room_id)
+        if not sockets:
+            return
+        message = json.dumps(event, separators=(",", ":"))
+        targets = []
+        for websocket in sockets:
+            queue = self.held.get(websocket)
+            if queue is None:
+                targets.append(websocket)
+            else:
+                queue.append((event.get("version"), message))
+        results = await asyncio.gather(
+            *(websocket.send_text(message) for websocket in targets),
+            return_exceptions=True
+        )
+        for websocket, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.info(f"Dropping subscriber of room {room_id}: {result}")
+                self.unsubscribe(room_id, websocket)
+
+
+room_broadcaster = RoomBroadcaster()
+# Events published on any worker reach this worker's sockets via the store
+multiplayer_manager.store.add_listener(room_broadcaster.publish)
+multiplayer_manager.eviction_listeners.append(lambda room: room_broadcaster.drop_room(room.room_id))
@@ -1,110 +1,536 @@
-from typing import Dict, List, Optional
+import asyncio
+import json
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
+import logging
 import random
 import string
 import time
+from app.core import wire
+from app.core.config import settings
+from app.multiplayer.room_log import (COMPLETE, CREATE, JOIN, LEVEL, MOVE, PROGRESS, REMOVE, START,
+                                      Event, RoomLog, loggable)
+from app.multiplayer.room_store import RoomStore, build_room_store
+from app.services.game_engine import game_engine
+from app.services.packed_state import PackedState
+
+logger = logging.getLogger(__name__)
+
+DUEL = "duel"
+# Many players racing through one level; joined by room id, started by the host
+RACE = "race"
+
+class MoveRejected(Exception):
+    """A submitted move that the room's authoritative state does not allow"""
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
 
 class Player:
-    def __init__(self, player_id: str, name: str):
+    def __init__(self, player_id: str, name: str, join_order: int = 0):
         self.id = player_id
         self.name = name
         self.moves = 0
         self.completed = False
         self.joined_at = datetime.now()
+        self.join_order = join_order
+        self.finish_order = 0
+        # Authoritative packed board and last accepted move number
+        self.board: Optional[PackedState] = None
+        self.seq = 0
+        # This player's entry in the room's standings
+        self.standing: tuple = ()
+    
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'moves': self.moves,
+            'completed': self.completed,
+            'seq': self.seq
+        }
 
 class GameRoom:
-    def __init__(self, room_id: str, level_id: int, max_players: int = 2):
+    def __init__(self, room_id: str, level_id: int, max_players: int = 2, mode: str = DUEL):
         self.room_id = room_id
         self.level_id = level_id
         self.max_players = max_players
-        self.players: List[Player] = []
+        self.mode = mode
+        # By id, in join order
+        self.players: Dict[str, Player] = {}
+        # Sorted (finished first in finishing order, then most moves made)
+        # and kept up to date one player at a time
+        self.standings: List[tuple] = []
+        self.finishers = 0
+        self.host: Optional[str] = None
         self.started = False
         self.winner: Optional[str] = None
         self.created_at = datetime.now()
+        self.last_activity = time.time()
         self.game_state = {}
-        
+        self.palette = game_engine.palette
+        self.capacity = game_engine.capacity
+        # Bumped on every mutation so subscribers can order events
+        self.version = 0
+        # Mutations since the manager last drained them into the room log
+        self.events: List[Event] = [loggable(CREATE, level_id, max_players, mode)]
+    
+    def touch(self) -> int:
+        self.version += 1
+        self.last_activity = time.time()
+        return self.version
+    
+    @property
+    def etag(self) -> str:
+        return f'"{self.room_id}-{self.version}"'
+    
+    @property
+    def packed_etag(self) -> str:
+        return f'"{self.room_id}-{self.version}-msgpack"'
+    
     def add_player(self, player_id: str, name: str) -> bool:
-        if len(self.players) >= self.max_players:
+        if self.started or len(self.players) >= self.max_players:
             return False
-        self.players.append(Player(player_id, name))
+        event = loggable(JOIN, player_id, name)
+        player = Player(player_id, name, len(self.players))
+        self.players[player_id] = player
+        if self.host is None:
+            self.host = player_id
+        self._rank(player)
+        self.events.append(event)
+        self.touch()
         return True
     
+    def get_player(self, player_id: str) -> Optional[Player]:
+        return self.players.get(player_id)
+    
+    def _rank(self, player: Player):
+        """Move a player to its place in the standings after a change"""
+        # The new entry first, so nothing is removed if it can't be built
+        if player.completed:
+            standing = (0, player.finish_order, player.join_order, player.id)
+        else:
+            standing = (1, -player.moves, player.join_order, player.id)
+        if player.standing:
+            index = bisect_left(self.standings, player.standing)
+            if index < len(self.standings) and self.standings[index] == player.standing:
+                del self.standings[index]
+        player.standing = standing
+        insort(self.standings, player.standing)
+    
+    def _finish(self, player: Player):
+        player.completed = True
+        self.finishers += 1
+        player.finish_order = self.finishers
+        if not self.winner:
+            self.winner = player.id
+    
+    def ranked_players(self, limit: Optional[int] = None) -> List[dict]:
+        return [
+            {**self.players[entry[-1]].to_dict(), 'rank': rank}
+            for rank, entry in enumerate(self.standings[:limit], start=1)
+        ]
+    
     def can_start(self) -> bool:
         return len(self.players) == self.max_players
     
+    def is_joinable(self) -> bool:
+        """Open to level-based joins and matchmaking; race rooms are joined by id"""
+        return self.mode == DUEL and len(self.players) < self.max_players and not self.started
+    
     def start_game(self, bottles: List[List[str]]):
+        """Start on ``bottles``, which must be this room's level"""
+        self.events.append(loggable(START, self.level_id))
+        self._start(bottles)
+    
+    def _start(self, bottles: List[List[str]]):
         self.started = True
         self.game_state = {
             'bottles': bottles,
             'started_at': datetime.now().isoformat()
         }
+        self.palette, board = game_engine.pack(bottles)
+        for player in self.players.values():
+            player.board = board
+            player.seq = 0
+        self.touch()
+    
+    def load_level(self, level_id: int, bottles: List[List[str]]):
+        """Reset the room and every player onto a new level"""
+        event = loggable(LEVEL, level_id)
+        self.level_id = level_id
+        self.winner = None
+        self.finishers = 0
+        for player in self.players.values():
+            player.moves = 0
+            player.completed = False
+            player.standing = ()
+        self.standings = []
+        for player in self.players.values():
+            self._rank(player)
+        self.events.append(event)
+        self._start(bottles)
+    
+    def apply_move(self, player_id: str, from_idx: int, to_idx: int, seq: int) -> Dict[int, List[str]]:
+        """Validate a pour against the player's board and apply it.
+        
+        ``seq`` must be exactly one past the last accepted move, so replays
+        and out-of-order submissions are rejected without touching the board.
+        Returns only the bottles that changed, keyed by index.
+        """
+        board = self._play(player_id, from_idx, to_idx, seq, "multiplayer")
+        return {
+            from_idx: self.palette.unpack_bottle(board[from_idx]),
+            to_idx: self.palette.unpack_bottle(board[to_idx])
+        }
     
-    def update_bottles(self, bottles: List[List[str]]):
-        """Update shared bottle state"""
-        if 'bottles' not in self.game_state:
-            self.game_state['bottles'] = []
-        self.game_state['bottles'] = bottles
+    def _play(self, player_id: str, from_idx: int, to_idx: int, seq: int,
+              source: Optional[str]) -> PackedState:
+        """apply_move without unpacking; moves replayed from the log
+        (``source`` None) are not counted again"""
+        player = self.get_player(player_id)
+        if player is None:
+            raise MoveRejected("Player not in room", 404)
+        if not self.started or player.board is None:
+            raise MoveRejected("Game has not started", 409)
+        if player.completed:
+            raise MoveRejected("Player already completed the level", 409)
+        if seq != player.seq + 1:
+            raise MoveRejected(f"Stale move: expected seq {player.seq + 1}", 409)
+        
+        if source is None:
+            board = game_engine.apply_move(player.board, from_idx, to_idx, self.capacity)
+        else:
+            board = game_engine.play_move(player.board, from_idx, to_idx, source, self.capacity)
+        if board is None:
+            raise MoveRejected("Invalid move")
+        event = loggable(MOVE, player_id, from_idx, to_idx, seq)
+        
+        player.board = board
+        player.seq = seq
+        player.moves = seq
+        if game_engine.is_completed(board, self.capacity):
+            self._finish(player)
+        self._rank(player)
+        self.events.append(event)
+        self.touch()
+        return board
     
     def get_bottles(self) -> List[List[str]]:
         """Get current shared bottle state"""
         return self.game_state.get('bottles', [])
     
     def update_player_move(self, player_id: str, moves: int):
-        for player in self.players:
-            if player.id == player_id:
-                player.moves = moves
-                break
+        player = self.players.get(player_id)
+        if player is not None:
+            event = loggable(PROGRESS, player_id, moves)
+            player.moves = moves
+            self._rank(player)
+            self.events.append(event)
+            self.touch()
     
     def mark_player_complete(self, player_id: str):
-        for player in self.players:
-            if player.id == player_id:
-                player.completed = True
-                if not self.winner:
-                    self.winner = player_id
-                break
+        player = self.players.get(player_id)
+        if player is not None and not player.completed:
+            event = loggable(COMPLETE, player_id)
+            self._finish(player)
+            self._rank(player)
+            self.events.append(event)
+            self.touch()
+    
+    def replay(self, kind: int, fields: tuple, level_bottles: Callable[[int], List[List[str]]]):
+        """Re-apply a logged event (CREATE and REMOVE are the manager's)"""
+        if kind == JOIN:
+            self.add_player(*fields)
+        elif kind == START:
+            self.start_game(level_bottles(fields[0]))
+        elif kind == MOVE:
+            self._play(*fields, None)
+        elif kind == PROGRESS:
+            self.update_player_move(*fields)
+        elif kind == COMPLETE:
+            self.mark_player_complete(*fields)
+        elif kind == LEVEL:
+            self.load_level(fields[0], level_bottles(fields[0]))
     
     def get_state(self) -> dict:
+        """Full room state with players in standings order; readers should
+        go through MultiplayerManager.snapshot, which builds it once per version"""
         return {
             'room_id': self.room_id,
             'level_id': self.level_id,
+            'mode': self.mode,
+            'max_players': self.max_players,
+            'host': self.host,
             'started': self.started,
             'winner': self.winner,
+            'version': self.version,
             'bottles': self.get_bottles(),
-            'players': [
-                {
-                    'id': p.id,
-                    'name': p.name,
-                    'moves': p.moves,
-                    'completed': p.completed
-                } for p in self.players
-            ]
+            'players': self.ranked_players()
         }
+    
+    def get_packed_state(self) -> dict:
+        """get_state with the bottles as packed rows over the colours they use"""
+        state = self.get_state()
+        palette, board = self.palette.compact(self.palette.pack(self.get_bottles()))
+        state['palette'] = palette.colors
+        state['bottles'] = list(board)
+        return state
 
-class MultiplayerManager:
+class SnapshotCache:
+    """Encoded room states by room id, one version per room.
+
+    Every reader of a room version shares the same bytes, so polling a
+    room with hundreds of players costs one encode per change rather than
+    one per request. JSON and msgpack are each encoded the first time a
+    version is asked for in them. Bounded, least recently read first.
+    """
+    def __init__(self, max_rooms: int):
+        self.max_rooms = max_rooms
+        # room id -> [version, JSON bytes, msgpack bytes]
+        self.entries: "OrderedDict[str, list]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, room: GameRoom, packed: bool = False) -> bytes:
+        entry = self.entries.get(room.room_id)
+        if entry is None or entry[0] != room.version:
+            entry = self.entries[room.room_id] = [room.version, None, None]
+        self.entries.move_to_end(room.room_id)
+        slot = 2 if packed else 1
+        encoded = entry[slot]
+        if encoded is not None:
+            self.hits += 1
+            return encoded
+        self.misses += 1
+        if packed:
+            encoded = wire.encode(room.get_packed_state())
+        else:
+            encoded = json.dumps(room.get_state(), separators=(",", ":")).encode()
+        entry[slot] = encoded
+        if len(self.entries) > self.max_rooms:
+            self.entries.popitem(last=False)
+        return encoded
+    
+    def discard(self, room_id: str):
+        self.entries.pop(room_id, None)
+
+class RoomLocks:
+    """Per-key asyncio locks, created on demand and dropped once nobody
+    holds or waits on them, so idle rooms cost nothing"""
     def __init__(self):
-        self.rooms: Dict[str, GameRoom] = {}
+        self.locks: Dict[str, list] = {}
+    
+    def __len__(self) -> int:
+        return len(self.locks)
+    
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[key]
+
+class MultiplayerManager:
+    def __init__(self, store: RoomStore, max_rooms: int = 10000, log: Optional[RoomLog] = None):
+        self.store = store
+        self.log = log
+        self.locks = RoomLocks()
+        self.max_rooms = max_rooms
+        self.evicted: Counter = Counter()
+        self.snapshots = SnapshotCache(max_rooms)
+        self.eviction_listeners: List[Callable[[GameRoom], None]] = [
+            lambda room: self.snapshots.discard(room.room_id)
+        ]
     
-    def create_room(self, level_id: int) -> str:
+    def _new_room_id(self) -> str:
         # Generate UNIQUE room ID with timestamp to ensure uniqueness
         timestamp = str(int(time.time() * 1000))[-6:]  # Last 6 digits of timestamp
         random_part = ''.join(random.choices(string.ascii_lowercase + string.digits, k=4))
-        room_id = f"{random_part}{timestamp}"[:8]  # Max 8 chars
+        return f"{random_part}{timestamp}"[:8]  # Max 8 chars
+    
+    async def create_room(self, level_id: int, players: Tuple[Tuple[str, str], ...] = (),
+                          max_players: int = 2, mode: str = DUEL) -> str:
+        """Create a room, optionally seated and started with ``players``
+        (player_id, name) so it is never visible half-filled"""
+        room = GameRoom(self._new_room_id(), level_id, max_players, mode)
+        for player_id, name in players:
+            room.add_player(player_id, name)
+        if players and room.can_start():
+            room.start_game(game_engine.generate_level(level_id)['bottles'])
+        events, room.events = room.events, []
         
         # Ensure it's unique
-        while room_id in self.rooms:
-            random_part = ''.join(random.choices(string.ascii_lowercase + string.digits, k=4))
-            room_id = f"{random_part}{timestamp}"[:8]
+        while not await self.store.insert(room):
+            room.room_id = self._new_room_id()
         
-        self.rooms[room_id] = GameRoom(room_id, level_id)
-        return room_id
+        if self.log is not None:
+            self.log.append(room.room_id, events)
+        await self._enforce_cap()
+        return room.room_id
+    
+    def _record(self, room: GameRoom):
+        """Move a room's pending events to the log"""
+        events, room.events = room.events, []
+        if events and self.log is not None:
+            self.log.append(room.room_id, events)
+    
+    def room_lock(self, room_id: str):
+        """Serialise a room's mutate-then-publish sequences in this worker.
+        
+        Rooms stay fully parallel with each other; atomicity across workers
+        comes from the store transactions.
+        """
+        return self.locks.hold(f"room:{room_id}")
+    
+    def level_lock(self, level_id: int):
+        """Serialise open-room joins for one level"""
+        return self.locks.hold(f"level:{level_id}")
     
     def get_room(self, room_id: str) -> Optional[GameRoom]:
-        return self.rooms.get(room_id)
+        """Read a room; mutate it only inside update_room"""
+        return self.store.get(room_id)
+    
+    def snapshot(self, room: GameRoom, packed: bool = False) -> bytes:
+        """The room's state as JSON (or msgpack), encoded once per version"""
+        return self.snapshots.get(room, packed)
     
-    def find_available_room(self, level_id: int) -> Optional[GameRoom]:
-        for room in self.rooms.values():
-            if room.level_id == level_id and len(room.players) < room.max_players and not room.started:
-                return room
+    @asynccontextmanager
+    async def update_room(self, room_id: str) -> AsyncIterator[Optional[GameRoom]]:
+        """Atomically load, mutate and persist a room"""
+        async with self.store.transaction(room_id) as room:
+            if room is not None and self.log is not None:
+                self.log.before_change(room)
+            yield room
+            if room is not None:
+                self._record(room)
+    
+    @asynccontextmanager
+    async def join_open_room(self, level_id: int, player_id: str, name: str) -> AsyncIterator[GameRoom]:
+        """Atomically seat a player in the oldest joinable room for the
+        level (creating one if none is open) and yield it for further changes"""
+        created = []
+        
+        def factory() -> GameRoom:
+            room = GameRoom(self._new_room_id(), level_id)
+            created.append(room)
+            return room
+        
+        async with self.store.open_transaction(level_id, factory) as room:
+            if self.log is not None:
+                self.log.before_change(room)
+            room.add_player(player_id, name)
+            yield room
+            self._record(room)
+        if created:
+            await self._enforce_cap()
+    
+    async def remove_room(self, room_id: str, reason: str) -> Optional[GameRoom]:
+        room = await self.store.delete(room_id)
+        if room is None:
+            return None
+        self.evicted[reason] += 1
+        if self.log is not None:
+            self.log.append(room_id, [(REMOVE,)])
+        for listener in self.eviction_listeners:
+            listener(room)
+        # Let subscribers on other workers know too
+        await self.publish(room_id, {"type": "room_closed", "reason": reason})
+        return room
+    
+    async def _enforce_cap(self):
+        excess = len(self.store) - self.max_rooms
+        if excess > 0:
+            for room_id in self.store.least_recent(excess):
+                await self.remove_room(room_id, "lru")
+    
+    def open_room_count(self) -> int:
+        return self.store.open_room_count()
+    
+    async def publish(self, room_id: str, event: dict):
+        """Send a room event to subscribers on every worker"""
+        await self.store.publish(room_id, event)
+    
+    async def recover(self) -> int:
+        """Rebuild rooms from the last log snapshot plus the events after it"""
+        if self.log is None:
+            return 0
+        started = time.perf_counter()
+        snapshot, records = self.log.load()
+        rooms = {room.room_id: room for room in snapshot}
+        levels: Dict[int, List[List[str]]] = {}
+        
+        def level_bottles(level_id: int) -> List[List[str]]:
+            if level_id not in levels:
+                levels[level_id] = game_engine.generate_level(level_id)['bottles']
+            return levels[level_id]
+        
+        replayed = 0
+        for at, room_id, kind, fields in records:
+            replayed += 1
+            if kind == CREATE:
+                if room_id in rooms:
+                    # Room ids are unique among live rooms, so a second
+                    # CREATE is corrupt; keep the room we have
+                    logger.warning(f"Skipping duplicate create for room {room_id}")
+                    continue
+                room = rooms[room_id] = GameRoom(room_id, *fields)
+                room.created_at = datetime.fromtimestamp(at)
+            elif kind == REMOVE:
+                rooms.pop(room_id, None)
+                continue
+            else:
+                room = rooms.get(room_id)
+                if room is None:
+                    continue
+                try:
+                    room.replay(kind, fields, level_bottles)
+                except MoveRejected as e:
+                    logger.warning(f"Skipping logged event {kind} for room {room_id}: {e.detail}")
+            room.last_activity = at
+        
+        for room in rooms.values():
+            room.events = []
+            await self.store.insert(room)
+        self.log.recovered_rooms = len(rooms)
+        self.log.recovered_records = replayed
+        self.log.recovery_ms = (time.perf_counter() - started) * 1000
+        if rooms:
+            logger.info(f"Recovered {len(rooms)} rooms from {replayed} logged events "
+                        f"in {self.log.recovery_ms:.0f} ms")
+        return len(rooms)
+    
+    async def start(self):
+        await self.recover()
+        await self.store.start()
+        if self.log is not None:
+            self.log.start(lambda: list(self.store.rooms.values()))
+    
+    async def stop(self):
+        if self.log is not None:
+            await self.log.stop()
+        await self.store.stop()
+
+def build_room_log() -> Optional[RoomLog]:
+    # The SQLite store is already durable; the log protects in-memory rooms
+    if not settings.ROOM_LOG_DIR or settings.ROOM_STORE != "memory":
         return None
+    return RoomLog(settings.ROOM_LOG_DIR, settings.ROOM_LOG_FLUSH_INTERVAL, settings.ROOM_LOG_SNAPSHOT_INTERVAL,
+                   settings.ROOM_LOG_SNAPSHOT_CHUNK)
 
-multiplayer_manager = MultiplayerManager()
+multiplayer_manager = MultiplayerManager(
+    build_room_store(settings.ROOM_STORE, settings.ROOM_STORE_PATH),
+    settings.MAX_ROOMS,
+    build_room_log()
+)
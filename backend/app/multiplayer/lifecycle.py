@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.multiplayer.game_room import MultiplayerManager, multiplayer_manager
+from app.multiplayer.room_store import RoomSummary
+
+logger = logging.getLogger(__name__)
+
+
+def expiry_reason(room: RoomSummary, now: float) -> Optional[str]:
+    """Why a room should be reaped at ``now``, or None to keep it"""
+    idle = now - room.last_activity
+    if room.finished:
+        return "finished" if idle > settings.ROOM_FINISHED_TTL else None
+    if not room.started:
+        return "never_started" if now - room.created_at > settings.ROOM_WAITING_TTL else None
+    return "abandoned" if idle > settings.ROOM_IDLE_TTL else None
+
+
+def process_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, OSError, IndexError, ValueError):
+        return None
+
+
+class RoomReaper:
+    """Background task that expires finished, abandoned and never-started rooms"""
+
+    def __init__(self, manager: MultiplayerManager):
+        self.manager = manager
+        self.runs = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def reap_once(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        expired = [
+            (room.room_id, reason)
+            for room in self.manager.store.summaries()
+            for reason in (expiry_reason(room, now),)
+            if reason is not None
+        ]
+        for room_id, reason in expired:
+            await self.manager.remove_room(room_id, reason)
+        self.runs += 1
+        return len(expired)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.ROOM_REAP_INTERVAL)
+            try:
+                reaped = await self.reap_once()
+                if reaped:
+                    logger.info(f"Reaped {reaped} rooms, {len(self.manager.store)} live")
+            except Exception as e:
+                logger.error(f"ERROR reaping rooms: {e}")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def get_stats(self) -> dict:
+        # Running totals only; walking every room per scrape would block the loop
+        store = self.manager.store
+        return {
+            'live_rooms': len(store),
+            'live_players': store.player_count(),
+            'open_rooms': self.manager.open_room_count(),
+            'max_rooms': self.manager.max_rooms,
+            'store': type(store).__name__,
+            'evicted': dict(self.manager.evicted),
+            'evicted_total': sum(self.manager.evicted.values()),
+            'reaper_runs': self.runs,
+            'approx_room_bytes': store.approx_bytes(),
+            'rss_bytes': process_rss_bytes(),
+        }
+
+
+room_reaper = RoomReaper(multiplayer_manager)
+
+metrics.gauge("watersort_rooms_live", "Rooms currently held by the room store",
+              lambda: len(multiplayer_manager.store))
+metrics.gauge("watersort_rooms_open", "Rooms waiting for players",
+              multiplayer_manager.open_room_count)
+metrics.gauge("watersort_players_live", "Players seated in live rooms",
+              lambda: multiplayer_manager.store.player_count())
+metrics.collected_counter("watersort_rooms_evicted_total", "Rooms removed, by reason",
+                          lambda: {(reason,): count for reason, count in multiplayer_manager.evicted.items()},
+                          ("reason",))
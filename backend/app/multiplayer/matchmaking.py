@@ -0,0 +1,114 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+from app.multiplayer.game_room import GameRoom, MultiplayerManager, multiplayer_manager
+
+
+class Ticket:
+    """A player waiting in a matchmaking queue"""
+
+    def __init__(self, player_name: str, level_id: int):
+        self.player_id = str(uuid.uuid4())
+        self.player_name = player_name
+        self.level_id = level_id
+        self.enqueued_at = time.monotonic()
+        self.room: "asyncio.Future[GameRoom]" = asyncio.get_running_loop().create_future()
+
+
+class Matchmaker:
+    """Pairs waiting players by level, or by level band and skill band.
+
+    Waiting tickets live in per-key FIFO queues, so finding a partner is a
+    single dict lookup however many players or rooms exist. Players that
+    are not matched within the wait timeout fall back to the regular join.
+    Waiting players are held per worker; only the resulting rooms are shared.
+    """
+
+    def __init__(self, manager: MultiplayerManager):
+        self.manager = manager
+        self.queues: Dict[Hashable, "OrderedDict[str, Ticket]"] = {}
+        self.matches = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def queue_key(self, level_id: int, skill: Optional[int], by_band: bool) -> Hashable:
+        if not by_band:
+            return ("level", level_id)
+        skill_band = skill // settings.MATCHMAKING_SKILL_BAND if skill is not None else None
+        return ("band", (level_id - 1) // settings.MATCHMAKING_LEVEL_BAND, skill_band)
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    async def match(self, player_name: str, level_id: int, skill: Optional[int] = None,
+                    by_band: bool = False, timeout: Optional[float] = None) -> Tuple[Optional[GameRoom], str]:
+        """Wait for an opponent; returns (room, player_id) or (None, player_id) on timeout"""
+        key = self.queue_key(level_id, skill, by_band)
+        queue = self.queues.get(key)
+        if queue:
+            _, waiting = queue.popitem(last=False)
+            if not queue:
+                del self.queues[key]
+            ticket = Ticket(player_name, waiting.level_id)
+            try:
+                room = await self._pair(waiting, ticket)
+            except BaseException as e:
+                # The waiting player is no longer queued; don't leave them hanging
+                waiting.room.set_exception(e if isinstance(e, Exception) else RuntimeError("Pairing cancelled"))
+                raise
+            waiting.room.set_result(room)
+            return room, ticket.player_id
+
+        ticket = Ticket(player_name, level_id)
+        self.queues.setdefault(key, OrderedDict())[ticket.player_id] = ticket
+        try:
+            room = await asyncio.wait_for(
+                asyncio.shield(ticket.room),
+                timeout if timeout is not None else settings.MATCHMAKING_TIMEOUT
+            )
+            return room, ticket.player_id
+        except asyncio.TimeoutError:
+            # A partner that took our ticket before we ran again is seating
+            # us in its room, even if the timeout fired first
+            queue = self.queues.get(key)
+            if ticket.room.done() or queue is None or ticket.player_id not in queue:
+                return await ticket.room, ticket.player_id
+            self.timeouts += 1
+            return None, ticket.player_id
+        finally:
+            queue = self.queues.get(key)
+            if queue is not None:
+                queue.pop(ticket.player_id, None)
+                if not queue:
+                    del self.queues[key]
+
+    async def _pair(self, waiting: Ticket, arriving: Ticket) -> GameRoom:
+        room = self.manager.get_room(await self.manager.create_room(waiting.level_id, (
+            (waiting.player_id, waiting.player_name),
+            (arriving.player_id, arriving.player_name),
+        )))
+
+        waited = time.monotonic() - waiting.enqueued_at
+        self.matches += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return room
+
+    def get_stats(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth(),
+            'queues': len(self.queues),
+            'open_rooms': self.manager.open_room_count(),
+            'matches': self.matches,
+            'timeouts': self.timeouts,
+            'avg_time_to_match_ms': round(self.total_wait / self.matches * 1000, 2) if self.matches else None,
+            'max_time_to_match_ms': round(self.max_wait * 1000, 2),
+        }
+
+
+matchmaker = Matchmaker(multiplayer_manager)
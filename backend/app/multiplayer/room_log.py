@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Room events, as recorded by GameRoom and replayed on recovery
+CREATE = 1
+JOIN = 2
+START = 3
+MOVE = 4
+PROGRESS = 5
+COMPLETE = 6
+LEVEL = 7
+REMOVE = 8
+
+# Field codes per event: I u32, H u16, B u8, q i64, s u16-length utf-8
+FIELDS: Dict[int, str] = {
+    CREATE: "IHs",     # level_id, max_players, mode
+    JOIN: "ss",        # player_id, name
+    START: "I",        # level_id (bottles come from the level)
+    MOVE: "sBBq",      # player_id, from, to, seq
+    PROGRESS: "sq",    # player_id, moves
+    COMPLETE: "s",     # player_id
+    LEVEL: "I",        # level_id
+    REMOVE: "",
+}
+INTS = {code: struct.Struct("<" + code) for code in "IHBq"}
+STR_LENGTH = struct.Struct("<H")
+
+# Segment record: length and CRC32 of the rest, event type, unix time,
+# room id, then the event's fields
+RECORD_HEADER = struct.Struct("<IIBd")
+# Snapshot: magic, first generation after it, then a length-prefixed pickle
+# per room (version 1 held one pickle of the whole room list)
+SNAPSHOT_MAGIC = b"WSRS\x02"
+SNAPSHOT_MAGIC_V1 = b"WSRS\x01"
+GENERATION = struct.Struct("<Q")
+ROOM_LENGTH = struct.Struct("<I")
+
+Event = Tuple  # (event type, *fields)
+Record = Tuple[float, str, int, tuple]  # (time, room_id, event type, fields)
+
+
+def encode_fields(codes: str, values: Iterable, body: bytearray):
+    for code, value in zip(codes, values):
+        if code == "s":
+            encoded = value.encode()
+            body.extend(STR_LENGTH.pack(len(encoded)))
+            body.extend(encoded)
+        else:
+            body.extend(INTS[code].pack(value))
+
+
+def encode_record(at: float, room_id: str, kind: int, fields: Iterable) -> bytes:
+    body = bytearray()
+    encode_fields("s" + FIELDS[kind], (room_id, *fields), body)
+    tail = struct.pack("<Bd", kind, at) + body
+    return struct.pack("<II", len(tail), zlib.crc32(tail)) + tail
+
+
+def loggable(kind: int, *fields) -> Event:
+    """The event, or ValueError if its fields don't fit the record format.
+
+    Rooms build their event before changing anything, so a change that
+    could not be logged is never applied.
+    """
+    if len(fields) != len(FIELDS[kind]):
+        raise ValueError(f"Event {kind} takes {len(FIELDS[kind])} fields")
+    try:
+        encode_fields(FIELDS[kind], fields, bytearray())
+    except (AttributeError, struct.error, UnicodeEncodeError) as e:
+        raise ValueError(f"Event {kind} can't be logged: {e}") from None
+    return (kind, *fields)
+
+
+def decode_records(data: bytes) -> Tuple[List[Record], int]:
+    """Records in a segment and the length of its intact prefix; a torn
+    or corrupt record ends the segment"""
+    records = []
+    pos = 0
+    prefix = struct.calcsize("<II")
+    view = memoryview(data)
+    # Room and player ids repeat on every event; decode each once
+    strings: Dict[bytes, str] = {}
+    decoders = {kind: [(code, INTS.get(code)) for code in "s" + fields] for kind, fields in FIELDS.items()}
+    while pos + RECORD_HEADER.size <= len(data):
+        length, crc, kind, at = RECORD_HEADER.unpack_from(data, pos)
+        start = pos + prefix
+        end = start + length
+        if end > len(data) or kind not in decoders or zlib.crc32(view[start:end]) != crc:
+            break
+        values = []
+        cursor = pos + RECORD_HEADER.size
+        for code, number in decoders[kind]:
+            if number is None:
+                (size,) = STR_LENGTH.unpack_from(data, cursor)
+                cursor += STR_LENGTH.size
+                raw = data[cursor:cursor + size]
+                text = strings.get(raw)
+                if text is None:
+                    text = strings[raw] = raw.decode()
+                values.append(text)
+                cursor += size
+            else:
+                values.append(number.unpack_from(data, cursor)[0])
+                cursor += number.size
+        records.append((at, values[0], kind, tuple(values[1:])))
+        pos = end
+    return records, pos
+
+
+class RoomLog:
+    """Append-only log of room events with periodic snapshots.
+
+    Events are buffered in memory and group-committed: every
+    ``flush_interval`` seconds whatever accumulated is written to the
+    current segment with a single write and fsync, off the event loop, so a
+    crash loses at most that window. Every ``snapshot_interval`` seconds the
+    live rooms are pickled into a snapshot and a new segment is started;
+    older segments are deleted once the snapshot is on disk, so recovery
+    only replays events newer than the last snapshot. Rooms are pickled
+    ``snapshot_chunk`` at a time between other work on the loop, so a
+    snapshot never stalls it for longer than one chunk.
+    """
+
+    def __init__(self, directory: str, flush_interval: float, snapshot_interval: float,
+                 snapshot_chunk: int = 200):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_chunk = snapshot_chunk
+        self.generation = 0
+        self.buffer = bytearray()
+        self.file = None
+        self.file_generation = -1
+        # Serialises writes that are still running in a thread after a cancel
+        self.write_lock = threading.Lock()
+        self.task: Optional[asyncio.Task] = None
+        self.rooms: Optional[Callable[[], list]] = None
+        # While a snapshot is being taken: rooms not pickled yet, and the
+        # pickles so far (room id -> pickle)
+        self.unsaved: Optional[Dict[str, object]] = None
+        self.saved: Dict[str, bytes] = {}
+        self.records = 0
+        self.bytes_written = 0
+        self.fsyncs = 0
+        self.snapshots = 0
+        self.recovered_rooms = 0
+        self.recovered_records = 0
+        self.recovery_ms = 0.0
+
+    def segment_path(self, generation: int) -> Path:
+        return self.directory / f"events-{generation:010d}.log"
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.directory / "snapshot.bin"
+
+    def append(self, room_id: str, events: List[Event]):
+        at = time.time()
+        for kind, *fields in events:
+            self.buffer.extend(encode_record(at, room_id, kind, fields))
+        self.records += len(events)
+
+    def load(self) -> Tuple[list, Iterator[Record]]:
+        """Rooms from the last snapshot and the events logged after it.
+
+        Also positions the log after them: torn tails are cut off and new
+        events go to the newest segment.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        rooms = []
+        first = 0
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                data = f.read()
+            if data.startswith(SNAPSHOT_MAGIC):
+                pos = len(SNAPSHOT_MAGIC)
+                (first,) = GENERATION.unpack_from(data, pos)
+                pos += GENERATION.size
+                while pos < len(data):
+                    (length,) = ROOM_LENGTH.unpack_from(data, pos)
+                    pos += ROOM_LENGTH.size
+                    rooms.append(pickle.loads(data[pos:pos + length]))
+                    pos += length
+            elif data.startswith(SNAPSHOT_MAGIC_V1):
+                pos = len(SNAPSHOT_MAGIC_V1)
+                (first,) = GENERATION.unpack_from(data, pos)
+                rooms = pickle.loads(data[pos + GENERATION.size:])
+        except FileNotFoundError:
+            pass
+        generations = sorted(
+            int(path.stem.split("-")[1]) for path in self.directory.glob("events-*.log")
+        )
+        for generation in generations:
+            if generation < first:
+                # Already in the snapshot; left behind by a crash mid-snapshot
+                self.segment_path(generation).unlink()
+        generations = [generation for generation in generations if generation >= first]
+        self.generation = max(generations + [first])
+        return rooms, self._replay(generations)
+
+    def _replay(self, generations: List[int]) -> Iterator[Record]:
+        for generation in generations:
+            path = self.segment_path(generation)
+            with open(path, 'rb') as f:
+                data = f.read()
+            records, intact = decode_records(data)
+            if intact < len(data):
+                logger.warning(f"Truncating {len(data) - intact} torn bytes from {path.name}")
+                with open(path, 'r+b') as f:
+                    f.truncate(intact)
+            yield from records
+
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _write(self, data: bytes, generation: int):
+        with self.write_lock:
+            if self.file_generation != generation or self.file is None:
+                self._close()
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self.file = open(self.segment_path(generation), 'ab')
+                self.file_generation = generation
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.bytes_written += len(data)
+            self.fsyncs += 1
+
+    def _take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+    async def flush(self):
+        if self.buffer:
+            await asyncio.to_thread(self._write, self._take(), self.generation)
+
+    async def snapshot(self):
+        """Snapshot the live rooms and start a new segment"""
+        # The segment switch and the room list are taken together on the
+        # loop, so the snapshot holds exactly the events up to the end of
+        # the closing segment: rooms are saved as they were at the switch,
+        # either here or by before_change if they change first
+        pending = self._take()
+        closing = self.generation
+        self.generation += 1
+        self.unsaved = {room.room_id: room for room in self.rooms()}
+        self.saved = {}
+        try:
+            while self.unsaved:
+                for _ in range(min(self.snapshot_chunk, len(self.unsaved))):
+                    room_id, room = self.unsaved.popitem()
+                    self.saved[room_id] = pickle.dumps(room, pickle.HIGHEST_PROTOCOL)
+                await asyncio.sleep(0)
+            rooms = list(self.saved.values())
+        finally:
+            self.unsaved = None
+            self.saved = {}
+        await asyncio.to_thread(self._write_snapshot, pending, rooms, closing)
+        self.snapshots += 1
+
+    def before_change(self, room):
+        """Called before a room changes: if a snapshot still has to save it,
+        it is saved now, as it was at the segment switch"""
+        if self.unsaved is None:
+            return
+        unsaved = self.unsaved.pop(room.room_id, None)
+        if unsaved is not None:
+            self.saved[room.room_id] = pickle.dumps(unsaved, pickle.HIGHEST_PROTOCOL)
+
+    def _write_snapshot(self, pending: bytes, rooms: List[bytes], closing: int):
+        if pending:
+            self._write(pending, closing)
+        with self.write_lock:
+            if self.file_generation <= closing:
+                self._close()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self.snapshot_path.with_suffix(".tmp")
+            with open(tmp, 'wb') as f:
+                f.write(SNAPSHOT_MAGIC + GENERATION.pack(closing + 1))
+                for room in rooms:
+                    f.write(ROOM_LENGTH.pack(len(room)))
+                    f.write(room)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            for path in self.directory.glob("events-*.log"):
+                if int(path.stem.split("-")[1]) <= closing:
+                    path.unlink()
+
+    async def run(self):
+        last_snapshot = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if time.monotonic() - last_snapshot >= self.snapshot_interval:
+                    last_snapshot = time.monotonic()
+                    await self.snapshot()
+                else:
+                    await self.flush()
+            except Exception as e:
+                logger.error(f"ERROR writing room log: {e}")
+
+    def start(self, rooms: Callable[[], list]):
+        self.rooms = rooms
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop logging, leaving a fresh snapshot so the next start replays nothing"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.rooms is not None:
+            await self.snapshot()
+        with self.write_lock:
+            self._close()
+
+    def get_stats(self) -> dict:
+        return {
+            "generation": self.generation,
+            "buffered_bytes": len(self.buffer),
+            "records": self.records,
+            "bytes_written": self.bytes_written,
+            "fsyncs": self.fsyncs,
+            "snapshots": self.snapshots,
+            "recovered_rooms": self.recovered_rooms,
+            "recovered_records": self.recovered_records,
+            "recovery_ms": round(self.recovery_ms, 2),
+        }
@@ -0,0 +1,504 @@
+import asyncio
+import json
+import logging
+import pickle
+import sqlite3
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import (Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, Iterator, List,
+                    NamedTuple, Optional)
+
+logger = logging.getLogger(__name__)
+
+Listener = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class RoomSummary(NamedTuple):
+    """Lightweight view of a room for the reaper"""
+    room_id: str
+    level_id: int
+    started: bool
+    finished: bool
+    created_at: float
+    last_activity: float
+    players: int
+
+
+def approx_room_bytes(room) -> int:
+    """Shallow size estimate of a room, its players and their boards"""
+    size = sys.getsizeof(room) + sys.getsizeof(room.__dict__) + sys.getsizeof(room.players)
+    for player in room.players.values():
+        size += sys.getsizeof(player) + sys.getsizeof(player.__dict__)
+        if player.board is not None:
+            size += sys.getsizeof(player.board) + sum(sys.getsizeof(row) for row in player.board)
+    return size
+
+
+class RoomStore(ABC):
+    """Where MultiplayerManager keeps rooms.
+
+    Mutations go through ``transaction`` / ``open_transaction`` so a store
+    shared between workers can make read-modify-write atomic, and only they
+    refresh a room's ``last_activity`` (and its place in the LRU order);
+    ``get`` is a plain read. Writes are coroutines so a store that may wait
+    on a lock or the disk can do so off the event loop. ``publish``
+    delivers room events to listeners in every process using the store.
+    """
+
+    def __init__(self):
+        self.listeners: List[Listener] = []
+
+    def add_listener(self, listener: Listener):
+        self.listeners.append(listener)
+
+    async def _deliver(self, room_id: str, event: Dict[str, Any]):
+        for listener in self.listeners:
+            try:
+                await listener(room_id, event)
+            except Exception as e:
+                logger.error(f"ERROR delivering event for room {room_id}: {e}")
+
+    @abstractmethod
+    async def insert(self, room) -> bool:
+        """Add a new room; False if the id is already taken"""
+
+    @abstractmethod
+    def get(self, room_id: str):
+        """The room, or None"""
+
+    @abstractmethod
+    def transaction(self, room_id: str) -> AsyncContextManager[Any]:
+        """Yield the room (or None) and persist it atomically on exit"""
+
+    @abstractmethod
+    def open_transaction(self, level_id: int, factory: Callable[[], Any]) -> AsyncContextManager[Any]:
+        """Yield the oldest joinable room for a level, or a new one from
+        ``factory`` (called again while its id is taken), and persist it
+        atomically on exit"""
+
+    @abstractmethod
+    async def delete(self, room_id: str):
+        """Remove a room and return it, or None"""
+
+    @abstractmethod
+    def least_recent(self, count: int) -> List[str]:
+        """Ids of up to ``count`` rooms, least recently changed first"""
+
+    @abstractmethod
+    def summaries(self) -> Iterator[RoomSummary]:
+        """A summary of every room"""
+
+    @abstractmethod
+    def open_room_count(self) -> int:
+        """Number of joinable rooms"""
+
+    @abstractmethod
+    def player_count(self) -> int:
+        """Players seated across all rooms, from a running total"""
+
+    @abstractmethod
+    def approx_bytes(self) -> int:
+        """Estimated size of all rooms, from a running total"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of rooms"""
+
+    @abstractmethod
+    async def publish(self, room_id: str, event: Dict[str, Any]):
+        """Deliver a room event to the listeners of every process"""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class MemoryRoomStore(RoomStore):
+    """Single-process store: rooms live as objects in an LRU-ordered dict"""
+
+    def __init__(self):
+        super().__init__()
+        # Least recently used first
+        self.rooms: "OrderedDict[str, Any]" = OrderedDict()
+        # level_id -> joinable room ids in creation order (FIFO)
+        self.open_rooms: Dict[int, "OrderedDict[str, None]"] = {}
+        # Running totals for stats; a room's size is re-estimated only when
+        # its players, level or started state change, never on a move
+        self.seated = 0
+        self.size_estimate = 0
+        # room id -> (players, level_id, started, approx bytes) as counted
+        self.counted: Dict[str, tuple] = {}
+
+    def _add(self, room) -> bool:
+        if room.room_id in self.rooms:
+            return False
+        self.rooms[room.room_id] = room
+        self._index(room)
+        self._count(room)
+        return True
+
+    async def insert(self, room) -> bool:
+        return self._add(room)
+
+    def get(self, room_id: str):
+        return self.rooms.get(room_id)
+
+    def _touch(self, room):
+        # Only changes count as activity; polling a room keeps nothing alive
+        self.rooms.move_to_end(room.room_id)
+        room.last_activity = time.time()
+
+    @asynccontextmanager
+    async def transaction(self, room_id: str) -> AsyncIterator[Any]:
+        room = self.rooms.get(room_id)
+        if room is not None:
+            self._touch(room)
+        yield room
+        if room is not None:
+            self._index(room)
+            self._count(room)
+
+    @asynccontextmanager
+    async def open_transaction(self, level_id: int, factory: Callable[[], Any]) -> AsyncIterator[Any]:
+        room = self._oldest_open(level_id)
+        if room is None:
+            room = factory()
+            while not self._add(room):
+                room = factory()
+        else:
+            self._touch(room)
+        yield room
+        self._index(room)
+        self._count(room)
+
+    def _oldest_open(self, level_id: int):
+        queue = self.open_rooms.get(level_id)
+        while queue:
+            room_id = next(iter(queue))
+            room = self.rooms.get(room_id)
+            if room is not None and room.level_id == level_id and room.is_joinable():
+                return room
+            # Stale entry (room filled, started or removed)
+            queue.pop(room_id)
+        if queue is not None:
+            del self.open_rooms[level_id]
+        return None
+
+    def _index(self, room):
+        queue = self.open_rooms.get(room.level_id)
+        if room.is_joinable():
+            if queue is None:
+                queue = self.open_rooms[room.level_id] = OrderedDict()
+            queue.setdefault(room.room_id, None)
+        elif queue is not None:
+            queue.pop(room.room_id, None)
+            if not queue:
+                del self.open_rooms[room.level_id]
+
+    def _count(self, room):
+        shape = (len(room.players), room.level_id, room.started)
+        counted = self.counted.get(room.room_id)
+        if counted is not None and counted[:3] == shape:
+            return
+        size = approx_room_bytes(room)
+        self.seated += shape[0] - (counted[0] if counted else 0)
+        self.size_estimate += size - (counted[3] if counted else 0)
+        self.counted[room.room_id] = (*shape, size)
+
+    async def delete(self, room_id: str):
+        room = self.rooms.pop(room_id, None)
+        if room is not None:
+            counted = self.counted.pop(room_id, None)
+            if counted is not None:
+                self.seated -= counted[0]
+                self.size_estimate -= counted[3]
+            queue = self.open_rooms.get(room.level_id)
+            if queue is not None:
+                queue.pop(room_id, None)
+                if not queue:
+                    del self.open_rooms[room.level_id]
+        return room
+
+    def least_recent(self, count: int) -> List[str]:
+        ids = []
+        for room_id in self.rooms:
+            if len(ids) >= count:
+                break
+            ids.append(room_id)
+        return ids
+
+    def summaries(self) -> Iterator[RoomSummary]:
+        for room in list(self.rooms.values()):
+            yield RoomSummary(
+                room.room_id, room.level_id, room.started, room.winner is not None,
+                room.created_at.timestamp(), room.last_activity, len(room.players)
+            )
+
+    def open_room_count(self) -> int:
+        return sum(len(queue) for queue in self.open_rooms.values())
+
+    def player_count(self) -> int:
+        return self.seated
+
+    def approx_bytes(self) -> int:
+        return self.size_estimate
+
+    def __len__(self) -> int:
+        return len(self.rooms)
+
+    async def publish(self, room_id: str, event: Dict[str, Any]):
+        await self._deliver(room_id, event)
+
+
+class SqliteRoomStore(RoomStore):
+    """Store shared by every worker on one host through a SQLite file.
+
+    Rooms are pickled into a row with the columns the index and reaper
+    need. Transactions use BEGIN IMMEDIATE, which takes the database write
+    lock up front, so joins and moves are serialised across processes.
+    Events go into an ``events`` table that each worker tails and hands to
+    its local listeners, which is the cross-worker broadcast channel.
+
+    Only writers wait for that lock (for up to ``busy_timeout``); in WAL
+    mode readers never do. So reads run on the event loop through their own
+    connection, and every write runs in a worker thread on a second
+    connection, one transaction at a time per process. Triggers keep
+    running totals in ``room_totals`` so stats never scan the rooms.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rooms (
+            room_id TEXT PRIMARY KEY,
+            level_id INTEGER NOT NULL,
+            joinable INTEGER NOT NULL,
+            started INTEGER NOT NULL,
+            finished INTEGER NOT NULL,
+            players INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_activity REAL NOT NULL,
+            data BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS rooms_open ON rooms (level_id, joinable, created_at);
+        CREATE INDEX IF NOT EXISTS rooms_activity ON rooms (last_activity);
+        CREATE TABLE IF NOT EXISTS room_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            rooms INTEGER NOT NULL,
+            joinable INTEGER NOT NULL,
+            players INTEGER NOT NULL,
+            bytes INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO room_totals
+            SELECT 0, COUNT(*), COALESCE(SUM(joinable), 0), COALESCE(SUM(players), 0),
+                   COALESCE(SUM(length(data)), 0) FROM rooms;
+        CREATE TRIGGER IF NOT EXISTS rooms_insert_totals AFTER INSERT ON rooms BEGIN
+            UPDATE room_totals SET rooms = rooms + 1, joinable = joinable + NEW.joinable,
+                players = players + NEW.players, bytes = bytes + length(NEW.data);
+        END;
+        CREATE TRIGGER IF NOT EXISTS rooms_update_totals AFTER UPDATE ON rooms BEGIN
+            UPDATE room_totals SET joinable = joinable + NEW.joinable - OLD.joinable,
+                players = players + NEW.players - OLD.players,
+                bytes = bytes + length(NEW.data) - length(OLD.data);
+        END;
+        CREATE TRIGGER IF NOT EXISTS rooms_delete_totals AFTER DELETE ON rooms BEGIN
+            UPDATE room_totals SET rooms = rooms - 1, joinable = joinable - OLD.joinable,
+                players = players - OLD.players, bytes = bytes - length(OLD.data);
+        END;
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            room_id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.05, event_ttl: float = 60.0):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.event_ttl = event_ttl
+        self.db = self._connect()
+        self.writer = self._connect()
+        self.writer.executescript(self.SCHEMA)
+        self.write_lock = asyncio.Lock()
+        self.last_event_id = self.db.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        self.task: Optional[asyncio.Task] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=5000")
+        return db
+
+    async def _run(self, call: Callable[..., Any], *args) -> Any:
+        """``call(*args)`` in a worker thread. A cancelled caller still waits
+        for it, so the writer is never left mid-statement for the next one."""
+        future = asyncio.ensure_future(asyncio.to_thread(call, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait([future])
+            raise
+
+    def _row(self, room) -> tuple:
+        return (room.room_id, room.level_id, int(room.is_joinable()), int(room.started),
+                int(room.winner is not None), len(room.players), room.created_at.timestamp(),
+                room.last_activity, pickle.dumps(room, pickle.HIGHEST_PROTOCOL))
+
+    def _load(self, sql: str, args: tuple):
+        row = self.writer.execute(sql, args).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _exists(self, room_id: str) -> bool:
+        return self.writer.execute("SELECT 1 FROM rooms WHERE room_id = ?", (room_id,)).fetchone() is not None
+
+    def _insert(self, room):
+        self.writer.execute("INSERT INTO rooms VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", self._row(room))
+
+    def _update(self, room):
+        row = self._row(room)
+        self.writer.execute(
+            "UPDATE rooms SET level_id = ?, joinable = ?, started = ?, finished = ?, players = ?, "
+            "created_at = ?, last_activity = ?, data = ? WHERE room_id = ?", row[1:] + row[:1]
+        )
+
+    @asynccontextmanager
+    async def _immediate(self) -> AsyncIterator[None]:
+        async with self.write_lock:
+            try:
+                await self._run(self.writer.execute, "BEGIN IMMEDIATE")
+                yield
+            except BaseException:
+                if self.writer.in_transaction:
+                    await self._run(self.writer.execute, "ROLLBACK")
+                raise
+            await self._run(self.writer.execute, "COMMIT")
+
+    async def insert(self, room) -> bool:
+        async with self.write_lock:
+            try:
+                await self._run(self._insert, room)
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def get(self, room_id: str):
+        row = self.db.execute("SELECT data FROM rooms WHERE room_id = ?", (room_id,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    @asynccontextmanager
+    async def transaction(self, room_id: str) -> AsyncIterator[Any]:
+        async with self._immediate():
+            room = await self._run(self._load, "SELECT data FROM rooms WHERE room_id = ?", (room_id,))
+            if room is not None:
+                room.last_activity = time.time()
+            yield room
+            if room is not None:
+                await self._run(self._update, room)
+
+    @asynccontextmanager
+    async def open_transaction(self, level_id: int, factory: Callable[[], Any]) -> AsyncIterator[Any]:
+        async with self._immediate():
+            room = await self._run(
+                self._load,
+                "SELECT data FROM rooms WHERE level_id = ? AND joinable = 1 ORDER BY created_at LIMIT 1",
+                (level_id,)
+            )
+            created = room is None
+            if created:
+                # The write lock is held, so an id free now is still free at
+                # the INSERT below
+                room = factory()
+                while await self._run(self._exists, room.room_id):
+                    room = factory()
+            room.last_activity = time.time()
+            yield room
+            await self._run(self._insert if created else self._update, room)
+
+    async def delete(self, room_id: str):
+        async with self._immediate():
+            room = await self._run(self._load, "SELECT data FROM rooms WHERE room_id = ?", (room_id,))
+            await self._run(self.writer.execute, "DELETE FROM rooms WHERE room_id = ?", (room_id,))
+        return room
+
+    def least_recent(self, count: int) -> List[str]:
+        rows = self.db.execute("SELECT room_id FROM rooms ORDER BY last_activity LIMIT ?", (count,))
+        return [row[0] for row in rows]
+
+    def summaries(self) -> Iterator[RoomSummary]:
+        rows = self.db.execute(
+            "SELECT room_id, level_id, started, finished, created_at, last_activity, players FROM rooms"
+        ).fetchall()
+        for row in rows:
+            yield RoomSummary(row[0], row[1], bool(row[2]), bool(row[3]), row[4], row[5], row[6])
+
+    def _total(self, column: str) -> int:
+        return self.db.execute(f"SELECT {column} FROM room_totals").fetchone()[0]
+
+    def open_room_count(self) -> int:
+        return self._total("joinable")
+
+    def player_count(self) -> int:
+        return self._total("players")
+
+    def approx_bytes(self) -> int:
+        return self._total("bytes")
+
+    def __len__(self) -> int:
+        return self._total("rooms")
+
+    async def publish(self, room_id: str, event: Dict[str, Any]):
+        async with self.write_lock:
+            await self._run(
+                self.writer.execute, "INSERT INTO events (room_id, payload, created_at) VALUES (?, ?, ?)",
+                (room_id, json.dumps(event, separators=(",", ":")), time.time())
+            )
+
+    def poll_events(self) -> List[tuple]:
+        rows = self.db.execute(
+            "SELECT id, room_id, payload FROM events WHERE id > ? ORDER BY id", (self.last_event_id,)
+        ).fetchall()
+        if rows:
+            self.last_event_id = rows[-1][0]
+        return rows
+
+    async def run(self):
+        last_prune = time.time()
+        while True:
+            try:
+                for _, room_id, payload in self.poll_events():
+                    await self._deliver(room_id, json.loads(payload))
+                if time.time() - last_prune > self.event_ttl:
+                    last_prune = time.time()
+                    async with self.write_lock:
+                        await self._run(self.writer.execute, "DELETE FROM events WHERE created_at < ?",
+                                        (last_prune - self.event_ttl,))
+            except Exception as e:
+                logger.error(f"ERROR polling room events: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+def build_room_store(backend: str, path: str) -> RoomStore:
+    if backend == "memory":
+        return MemoryRoomStore()
+    if backend == "sqlite":
+        return SqliteRoomStore(path)
+    raise ValueError(f"Unknown room store backend: {backend}")
@@ -1,20 +1,40 @@
-import json
-import os
-from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
+from app.services.level_generator import level_generator
+from app.services.level_store import MAX_CAPACITY, level_store
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.packed_state import (
+    ColorPalette, PackedState, can_pour, is_solved, legal_pours, pour, successors, update_legal_pours
+)
+from app.services.solver import solve
+
+Move = Tuple[int, int]
+
+MOVES = metrics.counter("watersort_moves_total", "Player moves checked by the engine",
+                        ("source", "result"))
 
 class GameEngine:
-    def __init__(self):
-        # Load levels from JSON file
-        levels_path = Path(__file__).parent.parent / "levels.json"
-        with open(levels_path, 'r') as f:
-            self.levels_data = json.load(f)
+    """The one set of pour rules behind singleplayer, multiplayer and replay.
+    
+    Every rule takes the bottle ``capacity`` and the pour mode: ``pour_all``
+    moves the whole matching top run (the game's rule), otherwise exactly
+    one unit moves.
+    """
+    
+    def __init__(self, capacity: int = MAX_CAPACITY, pour_all: bool = True):
+        self.levels = level_store
+        self.capacity = capacity
+        self.pour_all = pour_all
+    
+    @property
+    def palette(self) -> ColorPalette:
+        return self.levels.palette
     
     def generate_level(self, level_id: int) -> Dict[str, Any]:
-        """Get level from levels.json (120 perfect levels)"""
-        level_key = str(level_id)
+        """Get a level from levels.json, or a generated one past it"""
+        record = level_generator.get(level_id)
         
-        if level_key not in self.levels_data:
+        if record is None:
             return {
                 "level": level_id,
                 "bottles": [],
@@ -23,44 +43,97 @@ class GameEngine:
         
         return {
             "level": level_id,
-            "bottles": self.levels_data[level_key]["bottles"]
+            "bottles": record.bottles
         }
     
-    def validate_move(self, bottles: List[List[str]], from_idx: int, to_idx: int) -> Tuple[bool, List[List[str]]]:
-        """Validate and execute a pour move"""
-        if from_idx < 0 or from_idx >= len(bottles) or to_idx < 0 or to_idx >= len(bottles):
-            return False, bottles
-        
-        if from_idx == to_idx:
-            return False, bottles
-        
-        from_bottle = bottles[from_idx]
-        to_bottle = bottles[to_idx]
-        
-        if len(from_bottle) == 0:
-            return False, bottles
-        
-        if len(to_bottle) >= 4:
-            return False, bottles
+    def pack(self, bottles: List[List[str]]) -> Tuple[ColorPalette, PackedState]:
+        """Pack an API board, returning the palette needed to unpack it"""
+        palette = self.palette.extended(bottles)
+        return palette, palette.pack(bottles)
+    
+    def load_packed(self, colors: List[str], rows: List[bytes]) -> Tuple[ColorPalette, PackedState]:
+        """A board the client packed against its own palette (see app.core.wire)"""
+        palette = ColorPalette(colors)
+        if len(palette) != len(colors):
+            raise ValueError("Palette colours must be unique")
+        return palette, palette.check(tuple(bytes(row) for row in rows))
+    
+    def can_pour(self, state: PackedState, from_idx: int, to_idx: int,
+                 capacity: Optional[int] = None) -> bool:
+        return can_pour(state, from_idx, to_idx, capacity or self.capacity)
+    
+    def apply_move(self, state: PackedState, from_idx: int, to_idx: int,
+                   capacity: Optional[int] = None, pour_all: Optional[bool] = None) -> Optional[PackedState]:
+        """Pour on a packed board, or None if the move is illegal"""
+        return pour(state, from_idx, to_idx, capacity or self.capacity,
+                    self.pour_all if pour_all is None else pour_all)
+    
+    def play_move(self, state: PackedState, from_idx: int, to_idx: int, source: str,
+                  capacity: Optional[int] = None, pour_all: Optional[bool] = None) -> Optional[PackedState]:
+        """apply_move for moves submitted by players, counted per ``source``"""
+        new_state = self.apply_move(state, from_idx, to_idx, capacity, pour_all)
+        MOVES.inc(source, "invalid" if new_state is None else "valid")
+        return new_state
+    
+    def legal_moves(self, state: PackedState, capacity: Optional[int] = None) -> List[Move]:
+        return legal_pours(state, capacity or self.capacity)
+    
+    def successors(self, state: PackedState, capacity: Optional[int] = None,
+                   pour_all: Optional[bool] = None) -> List[Tuple[Move, PackedState]]:
+        """Every legal move from ``state`` with its resulting board, in one pass"""
+        return successors(state, capacity or self.capacity,
+                          self.pour_all if pour_all is None else pour_all)
+    
+    def update_legal_moves(self, state: PackedState, previous: List[Move], move: Move,
+                           capacity: Optional[int] = None) -> List[Move]:
+        """Legal moves after ``move``, re-checking only the two bottles it touched"""
+        return update_legal_pours(state, previous, move, capacity or self.capacity)
+    
+    def dead_end(self, state: PackedState, capacity: Optional[int] = None,
+                 moves: Optional[List[Move]] = None) -> Tuple[Optional[bool], str]:
+        """Whether a board can no longer be solved with whole-run pours.
         
-        if len(to_bottle) > 0 and to_bottle[-1] != from_bottle[-1]:
+        Cheap checks run first: no legal moves, or every move only leads to
+        an unsolved board whose one legal move undoes it. Otherwise a bounded weighted
+        search decides. Returns (dead, reason); dead is None when the search
+        budget ran out before an answer.
+        """
+        capacity = capacity or self.capacity
+        if is_solved(state, capacity):
+            return False, "solved"
+        if moves is None:
+            moves = legal_pours(state, capacity)
+        if not moves:
+            return True, "no_moves"
+        if all(
+            not is_solved(child, capacity)
+            and legal_pours(child, capacity) == [(to_idx, from_idx)]
+            and pour(child, to_idx, from_idx, capacity) == state
+            for (from_idx, to_idx), child in successors(state, capacity)
+        ):
+            return True, "only_reversible_moves"
+        result = solve(state, capacity, settings.DEAD_END_MAX_NODES, settings.DEAD_END_TIME_LIMIT,
+                       weight=settings.DEAD_END_WEIGHT)
+        if result.solved:
+            return False, "solvable"
+        if result.exhausted:
+            return True, "exhausted"
+        return None, "budget"
+    
+    def is_completed(self, state: PackedState, capacity: Optional[int] = None) -> bool:
+        return is_solved(state, capacity or self.capacity)
+    
+    def validate_move(self, bottles: List[List[str]], from_idx: int, to_idx: int,
+                      capacity: Optional[int] = None, pour_all: Optional[bool] = None) -> Tuple[bool, List[List[str]]]:
+        """Validate and execute a pour move"""
+        palette, state = self.pack(bottles)
+        new_state = self.apply_move(state, from_idx, to_idx, capacity, pour_all)
+        if new_state is None:
             return False, bottles
-        
-        new_bottles = [bottle[:] for bottle in bottles]
-        color = new_bottles[from_idx].pop()
-        new_bottles[to_idx].append(color)
-        
-        return True, new_bottles
+        return True, palette.unpack(new_state)
     
-    def check_completion(self, bottles: List[List[str]]) -> bool:
+    def check_completion(self, bottles: List[List[str]], capacity: Optional[int] = None) -> bool:
         """Check if puzzle is solved"""
-        for bottle in bottles:
-            if len(bottle) == 0:
-                continue
-            if len(bottle) != 4:
-                return False
-            if not all(color == bottle[0] for color in bottle):
-                return False
-        return True
+        return self.is_completed(self.pack(bottles)[1], capacity)
 
 game_engine = GameEngine()
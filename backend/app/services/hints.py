@@ -0,0 +1,148 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+from app.services.game_engine import game_engine
+from app.services.level_store import SOLUTIONS_FILE, level_store
+from app.services.packed_state import PackedState
+from app.services.solver import Move, canonical, solver
+
+# (source row, target row): the contents of the two bottles involved, so a
+# move cached for one bottle order can be replayed on any permutation
+RowMove = Tuple[bytes, bytes]
+HintKey = Tuple[int, PackedState]
+
+# Cached for boards the solver found no solution for within its budget, so
+# asking again does not repeat the search
+NO_HINT = ()
+
+
+def to_row_move(state: PackedState, move: Move) -> RowMove:
+    return state[move[0]], state[move[1]]
+
+
+def from_row_move(state: PackedState, row_move: RowMove) -> Optional[Move]:
+    """Indices of a cached move on this board's bottle order"""
+    source, target = row_move
+    from_idx = next((i for i, row in enumerate(state) if row == source), None)
+    if from_idx is None:
+        return None
+    to_idx = next((j for j, row in enumerate(state) if row == target and j != from_idx), None)
+    if to_idx is None:
+        return None
+    return from_idx, to_idx
+
+
+class HintCache:
+    """Bounded LRU of canonical state -> next move on the best known path.
+
+    Keys are bottle-order independent, so a position reached through a
+    different ordering of the same bottles hits the same entry.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: "OrderedDict[HintKey, RowMove]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: HintKey) -> Optional[RowMove]:
+        with self.lock:
+            row_move = self.entries.get(key)
+            if row_move is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return row_move
+
+    def put(self, key: HintKey, row_move: RowMove):
+        with self.lock:
+            self.entries[key] = row_move
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class HintService:
+    """Next-move hints from cached solution paths, solving on a miss.
+
+    Every state along a solution found for a miss is cached, so following
+    hints through a game costs one search at most; boards with no solution
+    are cached as NO_HINT. The cache is seeded from the solution paths in
+    ``solutions.json`` on first use.
+    """
+
+    def __init__(self, max_size: int):
+        self.cache = HintCache(max_size)
+        self.seeded = 0
+        self.seed_lock = threading.Lock()
+        self._seeded = False
+
+    def remember_path(self, state: PackedState, moves: Iterable[Move], capacity: int) -> int:
+        """Cache the next move for every state on a solution path"""
+        count = 0
+        for move in moves:
+            self.cache.put((capacity, canonical(state)), to_row_move(state, move))
+            state = game_engine.apply_move(state, move[0], move[1], capacity, pour_all=True)
+            count += 1
+        return count
+
+    def seed(self):
+        with self.seed_lock:
+            if self._seeded:
+                return
+            self._seeded = True
+            if not SOLUTIONS_FILE.exists():
+                return
+            with open(SOLUTIONS_FILE, 'r') as f:
+                solutions = json.load(f)
+            for key, solution in solutions.items():
+                record = level_store.get(int(key))
+                if record is None or not solution.get("path"):
+                    continue
+                state = level_store.palette.pack(record.bottles)
+                self.seeded += self.remember_path(state, solution["path"], record.max_capacity)
+
+    def hint(self, state: PackedState, capacity: int = 4) -> Optional[Move]:
+        """Next pour on the best known path, or None if solved or no
+        solution was found within the solver budget"""
+        self.seed()
+        if game_engine.is_completed(state, capacity):
+            return None
+        key = (capacity, canonical(state))
+        row_move = self.cache.get(key)
+        if row_move is NO_HINT:
+            return None
+        if row_move is not None:
+            move = from_row_move(state, row_move)
+            if move is not None:
+                return move
+        result = solver.solve(state, capacity)
+        if not result.solved:
+            self.cache.put(key, NO_HINT)
+            return None
+        self.remember_path(state, result.moves, capacity)
+        return result.moves[0]
+
+    def get_stats(self) -> dict:
+        return {**self.cache.get_stats(), "seeded": self.seeded}
+
+
+hint_service = HintService(settings.HINT_CACHE_SIZE)
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LEVEL_RESULT = "level"
+MATCH_RESULT = "match"
+
+
+class Leaderboard:
+    """Per-level best results and multiplayer finishes in a local SQLite file.
+
+    Results are queued in memory and written behind the request path by a
+    background task, one transaction per batch, so they become visible to
+    queries within about ``flush_interval`` seconds. Each level also keeps
+    how many players hold each move count, so a player's rank is a sum
+    over a few dozen rows however many results the level has.
+
+    Results only come from play the server ran itself (sessions and rooms)
+    under the standard whole-run pours; players are the display names
+    clients chose, not accounts.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS level_results (
+            level_id INTEGER NOT NULL,
+            player TEXT NOT NULL,
+            moves INTEGER NOT NULL,
+            achieved_at REAL NOT NULL,
+            PRIMARY KEY (level_id, player)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS level_results_rank ON level_results (level_id, moves, achieved_at);
+        CREATE TABLE IF NOT EXISTS level_move_counts (
+            level_id INTEGER NOT NULL,
+            moves INTEGER NOT NULL,
+            players INTEGER NOT NULL,
+            PRIMARY KEY (level_id, moves)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS match_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            room_id TEXT NOT NULL,
+            level_id INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            player TEXT NOT NULL,
+            finish_rank INTEGER NOT NULL,
+            moves INTEGER NOT NULL,
+            finished_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS match_results_player ON match_results (player, finished_at);
+    """
+
+    def __init__(self, path: str, flush_interval: float, batch_size: int, max_pending: int):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.pending: Deque[tuple] = deque()
+        self.write_lock = threading.Lock()
+        self.writer: Optional[sqlite3.Connection] = None
+        # Readers run on threadpool threads, one connection each
+        self.readers = threading.local()
+        self.task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=5000")
+        db.executescript(self.SCHEMA)
+        return db
+
+    def _reader(self) -> sqlite3.Connection:
+        db = getattr(self.readers, "db", None)
+        if db is None:
+            db = self.readers.db = self._connect()
+        return db
+
+    def _enqueue(self, item: tuple):
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.pending.append(item)
+
+    def record_level_result(self, level_id: int, player: str, moves: int):
+        """Queue a completed level; only a player's best per level is kept"""
+        self._enqueue((LEVEL_RESULT, level_id, player, moves, time.time()))
+
+    def record_match_result(self, room_id: str, level_id: int, mode: str, player: str,
+                            finish_rank: int, moves: int):
+        """Queue a player finishing a multiplayer level"""
+        self._enqueue((MATCH_RESULT, room_id, level_id, mode, player, finish_rank, moves, time.time()))
+
+    def write(self, batch: List[tuple]):
+        """Write a batch in one transaction (called off the event loop)"""
+        best: Dict[Tuple[int, str], tuple] = {}
+        matches = []
+        for item in batch:
+            if item[0] == LEVEL_RESULT:
+                key = (item[1], item[2])
+                if key not in best or item[3] < best[key][3]:
+                    best[key] = item
+            else:
+                matches.append(item[1:])
+        with self.write_lock:
+            if self.writer is None:
+                self.writer = self._connect()
+            db = self.writer
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for _, level_id, player, moves, achieved_at in best.values():
+                    self._write_best(db, level_id, player, moves, achieved_at)
+                db.executemany(
+                    "INSERT INTO match_results (room_id, level_id, mode, player, finish_rank, moves, finished_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", matches
+                )
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        self.written += len(batch)
+        self.batches += 1
+
+    def _write_best(self, db: sqlite3.Connection, level_id: int, player: str, moves: int, achieved_at: float):
+        row = db.execute("SELECT moves FROM level_results WHERE level_id = ? AND player = ?",
+                         (level_id, player)).fetchone()
+        if row is not None:
+            if row[0] <= moves:
+                return
+            db.execute("UPDATE level_results SET moves = ?, achieved_at = ? WHERE level_id = ? AND player = ?",
+                       (moves, achieved_at, level_id, player))
+            db.execute("UPDATE level_move_counts SET players = players - 1 WHERE level_id = ? AND moves = ?",
+                       (level_id, row[0]))
+        else:
+            db.execute("INSERT INTO level_results VALUES (?, ?, ?, ?)", (level_id, player, moves, achieved_at))
+        db.execute("INSERT INTO level_move_counts VALUES (?, ?, 1) "
+                   "ON CONFLICT (level_id, moves) DO UPDATE SET players = players + 1", (level_id, moves))
+
+    def take_batch(self) -> List[tuple]:
+        count = min(len(self.pending), self.batch_size)
+        return [self.pending.popleft() for _ in range(count)]
+
+    async def flush(self):
+        while self.pending:
+            batch = self.take_batch()
+            try:
+                await asyncio.to_thread(self.write, batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"ERROR writing {len(batch)} leaderboard results: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+    def top(self, level_id: int, limit: int = 10) -> List[dict]:
+        """Best results for a level; equal move counts share a rank"""
+        rows = self._reader().execute(
+            "SELECT player, moves, achieved_at FROM level_results WHERE level_id = ? "
+            "ORDER BY moves, achieved_at LIMIT ?", (level_id, limit)
+        ).fetchall()
+        results = []
+        rank = 0
+        for index, (player, moves, achieved_at) in enumerate(rows):
+            if index == 0 or moves != rows[index - 1][1]:
+                rank = index + 1
+            results.append({"rank": rank, "player": player, "moves": moves, "achieved_at": achieved_at})
+        return results
+
+    def rank(self, level_id: int, player: str) -> Optional[dict]:
+        db = self._reader()
+        row = db.execute("SELECT moves, achieved_at FROM level_results WHERE level_id = ? AND player = ?",
+                         (level_id, player)).fetchone()
+        if row is None:
+            return None
+        moves, achieved_at = row
+        ahead, total = db.execute(
+            "SELECT COALESCE(SUM(CASE WHEN moves < ? THEN players END), 0), COALESCE(SUM(players), 0) "
+            "FROM level_move_counts WHERE level_id = ?", (moves, level_id)
+        ).fetchone()
+        return {"level_id": level_id, "player": player, "moves": moves, "achieved_at": achieved_at,
+                "rank": ahead + 1, "players": total}
+
+    def matches(self, player: str, limit: int = 20) -> List[dict]:
+        """A player's most recent multiplayer finishes"""
+        rows = self._reader().execute(
+            "SELECT room_id, level_id, mode, finish_rank, moves, finished_at FROM match_results "
+            "WHERE player = ? ORDER BY finished_at DESC LIMIT ?", (player, limit)
+        ).fetchall()
+        return [
+            {"room_id": room_id, "level_id": level_id, "mode": mode, "finish_rank": finish_rank,
+             "moves": moves, "finished_at": finished_at}
+            for room_id, level_id, mode, finish_rank, moves, finished_at in rows
+        ]
+
+    def get_stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "max_pending": self.max_pending,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+leaderboard = Leaderboard(
+    settings.LEADERBOARD_PATH,
+    settings.LEADERBOARD_FLUSH_INTERVAL,
+    settings.LEADERBOARD_BATCH_SIZE,
+    settings.LEADERBOARD_MAX_PENDING
+)
+
+metrics.gauge("watersort_leaderboard_pending", "Leaderboard results waiting to be written",
+              lambda: len(leaderboard.pending))
+metrics.collected_counter("watersort_leaderboard_results_total", "Leaderboard results by outcome",
+                          lambda: {("written",): leaderboard.written, ("dropped",): leaderboard.dropped,
+                                   ("failed",): leaderboard.failed},
+                          ("outcome",))
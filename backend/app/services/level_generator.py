@@ -0,0 +1,318 @@
+import logging
+import os
+import random
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.services.level_store import MAX_CAPACITY, LevelRecord, level_store
+from app.services.solver import SolveResult, solver
+
+logger = logging.getLogger(__name__)
+
+# Colours used by generated levels, in cache colour-ID order. Each cache file
+# stores the table it was created with, so records decode the same colours
+# even if this list changes later.
+GENERATOR_COLORS = [
+    "#FF0000", "#00FF00", "#0000FF", "#FFFF00", "#FFA500", "#800080",
+    "#FF00FF", "#00FFFF", "#FFD700", "#000000", "#FFFFFF", "#808080",
+    "#8B4513", "#FF1493", "#32CD32", "#00CED1", "#FFB6C1",
+]
+
+# Colour count ramps through this range over every block of LEVEL_BLOCK ids,
+# matching the spread of the hand-made levels
+MIN_COLORS = 10
+MAX_COLORS = 17
+LEVEL_BLOCK = 100
+
+# (max solution length, label), checked in order; a level whose solution
+# needed the weighted fallback is graded one tier harder
+GRADE_TIERS = [(32, "easy"), (42, "medium"), (52, "hard")]
+GRADES = [label for _, label in GRADE_TIERS] + ["expert"]
+
+CACHE_MAGIC = b"WSLC\x01"
+# level_id, solution length, flags, nodes expanded, bottle count
+RECORD_HEADER = struct.Struct("<IHBIB")
+RECORD_SIZE = struct.Struct("<H")
+FLAG_OPTIMAL = 1
+
+
+def shape_for(level_id: int) -> tuple:
+    """(colours, empty bottles) for a generated level"""
+    colors = MIN_COLORS + (level_id - 1) % LEVEL_BLOCK * (MAX_COLORS - MIN_COLORS + 1) // LEVEL_BLOCK
+    return colors, 2 if colors < 12 else 3
+
+
+def grade(moves: int, optimal: bool) -> str:
+    tier = len(GRADE_TIERS)
+    for index, (max_moves, _) in enumerate(GRADE_TIERS):
+        if moves <= max_moves:
+            tier = index
+            break
+    if not optimal:
+        tier = min(tier + 1, len(GRADES) - 1)
+    return GRADES[tier]
+
+
+class GeneratedLevel:
+    """A verified-solvable generated board with its solver grading"""
+
+    def __init__(self, level_id: int, bottles: List[List[str]], moves: int,
+                 optimal: bool, nodes_expanded: int):
+        self.level_id = level_id
+        self.bottles = bottles
+        self.moves = moves
+        self.optimal = optimal
+        self.nodes_expanded = nodes_expanded
+
+    @property
+    def difficulty(self) -> str:
+        return grade(self.moves, self.optimal)
+
+    def to_record(self) -> LevelRecord:
+        # A weighted A* length only bounds the optimum, so it isn't published
+        return LevelRecord(self.level_id, self.bottles, self.moves if self.optimal else None, self.difficulty)
+
+    def encode(self, color_ids: Dict[str, int]) -> bytes:
+        body = bytearray(RECORD_HEADER.pack(
+            self.level_id, self.moves, FLAG_OPTIMAL if self.optimal else 0,
+            min(self.nodes_expanded, 0xFFFFFFFF), len(self.bottles)
+        ))
+        for bottle in self.bottles:
+            body.append(len(bottle))
+            body.extend(color_ids[color] for color in bottle)
+        return RECORD_SIZE.pack(len(body)) + bytes(body)
+
+    @classmethod
+    def decode(cls, body: bytes, colors: List[str]) -> "GeneratedLevel":
+        level_id, moves, flags, nodes, bottle_count = RECORD_HEADER.unpack_from(body)
+        bottles = []
+        pos = RECORD_HEADER.size
+        for _ in range(bottle_count):
+            size = body[pos]
+            bottles.append([colors[color_id] for color_id in body[pos + 1:pos + 1 + size]])
+            pos += 1 + size
+        return cls(level_id, bottles, moves, bool(flags & FLAG_OPTIMAL), nodes)
+
+
+def _deal(rng: random.Random, colors: int, empties: int) -> List[List[str]]:
+    pieces = [color for color in GENERATOR_COLORS[:colors] for _ in range(MAX_CAPACITY)]
+    rng.shuffle(pieces)
+    bottles = [pieces[i:i + MAX_CAPACITY] for i in range(0, len(pieces), MAX_CAPACITY)]
+    return bottles + [[] for _ in range(empties)]
+
+
+def generate_level(level_id: int, seed: int = 0, max_attempts: int = 20) -> GeneratedLevel:
+    """Deal seeded boards for ``level_id`` until the solver proves one solvable.
+
+    Boards that start with a finished bottle or solve in fewer moves than
+    they have colours are rejected as too easy for their tier. Every attempt
+    has its own seed, so the accepted board depends only on the level id and
+    ``seed``. Process pool entry point for pre-generation.
+    """
+    colors, empties = shape_for(level_id)
+    for attempt in range(max_attempts):
+        rng = random.Random(f"{seed}:{level_id}:{attempt}")
+        bottles = _deal(rng, colors, empties)
+        if any(len(set(bottle)) == 1 and len(bottle) == MAX_CAPACITY for bottle in bottles):
+            continue
+        result: SolveResult = solver.solve(level_store.palette.pack(bottles), MAX_CAPACITY)
+        if not result.solved or len(result.moves) < colors:
+            continue
+        return GeneratedLevel(level_id, bottles, len(result.moves), result.optimal, result.nodes_expanded)
+    raise RuntimeError(f"No solvable board for level {level_id} after {max_attempts} attempts")
+
+
+class LevelCache:
+    """Append-only file of generated levels.
+
+    The file is a colour table header followed by length-prefixed binary
+    records, each written with a single append so several workers can share
+    it. Records appended by other processes are picked up on a cache miss.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.records: Dict[int, bytes] = {}
+        self.colors: List[str] = list(GENERATOR_COLORS)
+        self.offset = 0
+        # Highest level id in the file
+        self.highest = 0
+        self.lock = threading.Lock()
+        self._create()
+        self._refresh(repair=True)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, level_id: int) -> bool:
+        return level_id in self.records
+
+    def _create(self):
+        header = bytearray(CACHE_MAGIC)
+        header.append(len(self.colors))
+        for color in self.colors:
+            encoded = color.encode()
+            header.append(len(encoded))
+            header.extend(encoded)
+        try:
+            with open(self.path, "xb") as f:
+                f.write(header)
+        except FileExistsError:
+            pass
+
+    def _refresh(self, repair: bool = False):
+        with self.lock:
+            self._read(repair)
+
+    def _read(self, repair: bool):
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        pos = 0
+        if self.offset == 0:
+            if not data.startswith(CACHE_MAGIC):
+                raise ValueError(f"{self.path} is not a level cache")
+            pos = len(CACHE_MAGIC)
+            count = data[pos]
+            pos += 1
+            self.colors = []
+            for _ in range(count):
+                size = data[pos]
+                self.colors.append(data[pos + 1:pos + 1 + size].decode())
+                pos += 1 + size
+        while pos + RECORD_SIZE.size <= len(data):
+            (size,) = RECORD_SIZE.unpack_from(data, pos)
+            end = pos + RECORD_SIZE.size + size
+            if end > len(data):
+                break
+            body = data[pos + RECORD_SIZE.size:end]
+            level_id = RECORD_HEADER.unpack_from(body)[0]
+            self.records.setdefault(level_id, body)
+            self.highest = max(self.highest, level_id)
+            pos = end
+        self.offset += pos
+        if repair and pos < len(data):
+            # A torn record from an interrupted write; drop it so later
+            # appends stay readable
+            logger.warning(f"Truncating {len(data) - pos} trailing bytes from {self.path}")
+            os.truncate(self.path, self.offset)
+
+    def get(self, level_id: int) -> Optional[GeneratedLevel]:
+        body = self.records.get(level_id)
+        if body is None:
+            self._refresh()
+            body = self.records.get(level_id)
+            if body is None:
+                return None
+        return GeneratedLevel.decode(body, self.colors)
+
+    def append(self, level: GeneratedLevel):
+        color_ids = {color: color_id for color_id, color in enumerate(self.colors)}
+        record = level.encode(color_ids)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+        self.records.setdefault(level.level_id, record[RECORD_SIZE.size:])
+        self.highest = max(self.highest, level.level_id)
+
+
+class LevelGenerator:
+    """Serves hand-made levels from the level store and generates the rest.
+
+    Generated levels are solved once and appended to the on-disk cache; the
+    cache file is opened on first use. Requests only generate up to
+    ``generate_ahead`` levels past the highest one known, so players moving
+    through the levels never wait on more than one, and nobody can queue up
+    solver work for arbitrary far-off ids.
+    """
+
+    def __init__(self, cache_path: Path, seed: int = 0, max_attempts: int = 20,
+                 max_level_id: int = 100000, generate_ahead: int = 50):
+        self.cache_path = cache_path
+        self.seed = seed
+        self.max_attempts = max_attempts
+        self.max_level_id = max_level_id
+        self.generate_ahead = generate_ahead
+        self._cache: Optional[LevelCache] = None
+        self.generate_lock = threading.Lock()
+
+    @property
+    def cache(self) -> LevelCache:
+        if self._cache is None:
+            self._cache = LevelCache(self.cache_path)
+        return self._cache
+
+    def lookup(self, level_id: int) -> Optional[LevelRecord]:
+        """A stored or already generated level, never generating one"""
+        record = level_store.get(level_id)
+        if record is not None:
+            return record
+        if not 1 <= level_id <= self.max_level_id:
+            return None
+        generated = self.cache.get(level_id)
+        return generated.to_record() if generated else None
+
+    def highest_level(self) -> int:
+        """The highest level id stored or generated so far"""
+        return max(max(level_store.level_ids, default=0), self.cache.highest)
+
+    def get(self, level_id: int) -> Optional[LevelRecord]:
+        """Any level up to ``max_level_id``, generating and caching it on first
+        use if it is within ``generate_ahead`` of the highest known level"""
+        record = self.lookup(level_id)
+        if record is not None or not 1 <= level_id <= self.max_level_id:
+            return record
+        if level_id > self.highest_level() + self.generate_ahead:
+            return None
+        with self.generate_lock:
+            generated = self.cache.get(level_id)
+            if generated is None:
+                generated = generate_level(level_id, self.seed, self.max_attempts)
+                self.cache.append(generated)
+        return generated.to_record()
+
+
+level_generator = LevelGenerator(
+    Path(settings.LEVEL_CACHE_PATH),
+    settings.LEVEL_GENERATOR_SEED,
+    settings.LEVEL_GENERATOR_MAX_ATTEMPTS,
+    settings.MAX_LEVEL_ID,
+    settings.LEVEL_GENERATE_AHEAD
+)
+
+
+if __name__ == "__main__":
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    parser = argparse.ArgumentParser(description="Pre-generate levels into the level cache")
+    parser.add_argument("--start", type=int, default=len(level_store) + 1)
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=0, help="processes (0 = one per CPU)")
+    args = parser.parse_args()
+
+    cache = level_generator.cache
+    pending = [level_id for level_id in range(args.start, args.start + args.count)
+               if level_id not in level_store and level_id not in cache]
+    workers = args.workers or os.cpu_count() or 1
+    grades = {label: 0 for label in GRADES}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        job = partial(generate_level, seed=level_generator.seed, max_attempts=level_generator.max_attempts)
+        for done, level in enumerate(pool.map(job, pending, chunksize=8), 1):
+            cache.append(level)
+            grades[level.difficulty] += 1
+            if done % 1000 == 0:
+                elapsed = time.perf_counter() - started
+                print(f"{done}/{len(pending)} levels, {done / elapsed:.1f} levels/sec")
+    elapsed = time.perf_counter() - started
+    print(f"generated {len(pending)} levels with {workers} workers in {elapsed:.1f}s "
+          f"({len(pending) / elapsed if elapsed else 0:.1f} levels/sec), "
+          f"{len(cache)} cached, grades {grades}")
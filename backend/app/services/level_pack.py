@@ -0,0 +1,170 @@
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Binary pack of levels.json and solutions.json, built once and memory-mapped
+# at startup so levels are decoded one at a time on first access:
+#
+#   magic, source fingerprint, colour table, level count,
+#   index of (level_id, offset, size) sorted by id, level records
+#
+# A record is the optimal move count (NO_MOVES unless the solver proved it
+# optimal), the bottle count and each bottle as a length byte followed by
+# colour IDs.
+PACK_MAGIC = b"WSLP\x02"
+FINGERPRINT = struct.Struct("<QQQQ")
+COUNT = struct.Struct("<I")
+INDEX_ENTRY = struct.Struct("<III")
+RECORD_HEADER = struct.Struct("<HB")
+NO_MOVES = 0xFFFF
+
+
+def fingerprint(*sources: Path) -> Tuple[int, ...]:
+    """Size and mtime of each source file (0, 0 when missing)"""
+    values = []
+    for source in sources:
+        try:
+            stat = os.stat(source)
+            values.extend((stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            values.extend((0, 0))
+    return tuple(values)
+
+
+def normalize_color(color: str) -> str:
+    return color.upper() if color.startswith("#") else color
+
+
+def build_pack(levels_file: Path, solutions_file: Path) -> bytes:
+    with open(levels_file, 'r') as f:
+        raw = json.load(f)
+    solutions = {}
+    if solutions_file.exists():
+        with open(solutions_file, 'r') as f:
+            solutions = json.load(f)
+
+    colors: Dict[str, int] = {}
+    bodies: List[Tuple[int, bytes]] = []
+    for key, value in raw.items():
+        body = bytearray()
+        bottles = value.get("bottles", [])
+        solution = solutions.get(key)
+        # Weighted A* fallback lengths are only upper bounds
+        moves = solution["moves"] if solution and solution.get("optimal") else NO_MOVES
+        body.extend(RECORD_HEADER.pack(moves, len(bottles)))
+        for bottle in bottles:
+            body.append(len(bottle))
+            for color in bottle:
+                body.append(colors.setdefault(normalize_color(color), len(colors) + 1))
+        bodies.append((int(key), bytes(body)))
+    bodies.sort()
+
+    out = bytearray(PACK_MAGIC)
+    out.extend(FINGERPRINT.pack(*fingerprint(levels_file, solutions_file)))
+    out.append(len(colors))
+    for color in colors:
+        encoded = color.encode()
+        out.append(len(encoded))
+        out.extend(encoded)
+    out.extend(COUNT.pack(len(bodies)))
+    offset = len(out) + INDEX_ENTRY.size * len(bodies)
+    for level_id, body in bodies:
+        out.extend(INDEX_ENTRY.pack(level_id, offset, len(body)))
+        offset += len(body)
+    for _, body in bodies:
+        out.extend(body)
+    return bytes(out)
+
+
+class LevelPack:
+    """Read-only view over a level pack; only the index is parsed up front"""
+
+    def __init__(self, data):
+        if data[:len(PACK_MAGIC)] != PACK_MAGIC:
+            raise ValueError("Not a level pack")
+        self.data = data
+        pos = len(PACK_MAGIC)
+        self.fingerprint = FINGERPRINT.unpack_from(data, pos)
+        pos += FINGERPRINT.size
+        count = data[pos]
+        pos += 1
+        self.colors = [""]
+        for _ in range(count):
+            size = data[pos]
+            self.colors.append(bytes(data[pos + 1:pos + 1 + size]).decode())
+            pos += 1 + size
+        (count,) = COUNT.unpack_from(data, pos)
+        pos += COUNT.size
+        self.index: Dict[int, Tuple[int, int]] = {}
+        for level_id, offset, size in INDEX_ENTRY.iter_unpack(data[pos:pos + INDEX_ENTRY.size * count]):
+            self.index[level_id] = (offset, size)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, level_id: int) -> bool:
+        return level_id in self.index
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.index)
+
+    def read(self, level_id: int) -> Optional[Tuple[List[List[str]], Optional[int]]]:
+        """(bottles, optimal moves) for a level, or None"""
+        entry = self.index.get(level_id)
+        if entry is None:
+            return None
+        offset, size = entry
+        body = self.data[offset:offset + size]
+        moves, bottle_count = RECORD_HEADER.unpack_from(body)
+        colors = self.colors
+        bottles = []
+        pos = RECORD_HEADER.size
+        for _ in range(bottle_count):
+            length = body[pos]
+            bottles.append([colors[color_id] for color_id in body[pos + 1:pos + 1 + length]])
+            pos += 1 + length
+        return bottles, None if moves == NO_MOVES else moves
+
+
+def open_pack(pack_file: Path, levels_file: Path, solutions_file: Path) -> LevelPack:
+    """Map the pack, rebuilding it first if the JSON sources changed since.
+
+    When the pack cannot be written (read-only deploys) the freshly built
+    copy is used from memory.
+    """
+    expected = fingerprint(levels_file, solutions_file)
+    try:
+        with open(pack_file, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        mapped = None
+    if mapped is not None:
+        try:
+            pack = LevelPack(mapped)
+            if pack.fingerprint == expected:
+                return pack
+        except ValueError:
+            pass
+        # Stale or not a pack: unmap it before it is rebuilt
+        mapped.close()
+    data = build_pack(levels_file, solutions_file)
+    try:
+        tmp = pack_file.with_suffix(f"{pack_file.suffix}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, pack_file)
+    except OSError:
+        pass
+    return LevelPack(data)
+
+
+if __name__ == "__main__":
+    from app.services.level_store import LEVELS_FILE, PACK_FILE, SOLUTIONS_FILE
+
+    data = build_pack(LEVELS_FILE, SOLUTIONS_FILE)
+    with open(PACK_FILE, 'wb') as f:
+        f.write(data)
+    print(f"wrote {len(LevelPack(data))} levels to {PACK_FILE} ({len(data)} bytes)")
@@ -0,0 +1,166 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from app.core import wire
+from app.services.level_pack import LevelPack, normalize_color, open_pack
+from app.services.packed_state import ColorPalette
+
+LEVELS_FILE = Path(__file__).parent.parent / "levels.json"
+SOLUTIONS_FILE = Path(__file__).parent.parent / "solutions.json"
+PACK_FILE = Path(__file__).parent.parent / "levels.pack"
+
+MAX_CAPACITY = 4
+
+# Color mapping
+HEX_TO_NAME = {
+    "#FF0000": "red",
+    "#00FF00": "green",
+    "#0000FF": "blue",
+    "#FFFF00": "yellow",
+    "#FFA500": "orange",
+    "#800080": "purple",
+    "#FFC0CB": "pink",
+    "#00FFFF": "cyan",
+    "#A52A2A": "brown",
+    "#FFD700": "gold",
+    "#C0C0C0": "silver",
+    "#000000": "black",
+    "#FFFFFF": "white",
+}
+
+# (max colours, label), checked in order
+DIFFICULTY_TIERS = [(10, "easy"), (12, "medium"), (15, "hard")]
+
+
+def difficulty_for(color_count: int) -> str:
+    for max_colors, label in DIFFICULTY_TIERS:
+        if color_count <= max_colors:
+            return label
+    return "expert"
+
+
+class LevelRecord:
+    """A parsed level with its derived metadata; the encoded response is
+    built on first use"""
+
+    def __init__(self, level_id: int, bottles: List[List[str]], optimal_moves: Optional[int],
+                 difficulty: Optional[str] = None):
+        self.level_id = level_id
+        self.bottles = bottles
+        self.max_capacity = MAX_CAPACITY
+        self.bottle_count = len(bottles)
+        self.color_count = len({color for bottle in bottles for color in bottle})
+        self.difficulty = difficulty or difficulty_for(self.color_count)
+        self.optimal_moves = optimal_moves
+        self._named_bottles: Optional[List[List[str]]] = None
+        self._payload: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._packed_payload: Optional[bytes] = None
+        self._packed_etag: Optional[str] = None
+
+    @property
+    def named_bottles(self) -> List[List[str]]:
+        if self._named_bottles is None:
+            self._named_bottles = [[HEX_TO_NAME.get(color, color) for color in bottle] for bottle in self.bottles]
+        return self._named_bottles
+
+    @property
+    def payload(self) -> bytes:
+        if self._payload is None:
+            self._payload = json.dumps({
+                "level": self.level_id,
+                "bottles": self.bottles,
+                "max_capacity": self.max_capacity,
+                "bottle_count": self.bottle_count,
+                "color_count": self.color_count,
+                "difficulty": self.difficulty,
+                "optimal_moves": self.optimal_moves,
+            }, separators=(",", ":")).encode()
+        return self._payload
+
+    @property
+    def etag(self) -> str:
+        if self._etag is None:
+            self._etag = '"' + hashlib.sha256(self.payload).hexdigest()[:32] + '"'
+        return self._etag
+
+    @property
+    def packed_payload(self) -> bytes:
+        """The payload as msgpack, bottles packed over the level's own colours"""
+        if self._packed_payload is None:
+            palette = ColorPalette(color for bottle in self.bottles for color in bottle)
+            self._packed_payload = wire.encode({
+                "level": self.level_id,
+                "palette": palette.colors,
+                "bottles": list(palette.pack(self.bottles)),
+                "max_capacity": self.max_capacity,
+                "bottle_count": self.bottle_count,
+                "color_count": self.color_count,
+                "difficulty": self.difficulty,
+                "optimal_moves": self.optimal_moves,
+            })
+        return self._packed_payload
+
+    @property
+    def packed_etag(self) -> str:
+        if self._packed_etag is None:
+            self._packed_etag = '"' + hashlib.sha256(self.packed_payload).hexdigest()[:32] + '"'
+        return self._packed_etag
+
+
+class LevelStore:
+    """The levels from levels.json, served from a memory-mapped level pack.
+
+    Nothing is read until first use; then only the pack index is parsed and
+    each level is decoded (and kept) the first time it is asked for.
+    """
+
+    def __init__(self, levels_file: Path = LEVELS_FILE, solutions_file: Path = SOLUTIONS_FILE,
+                 pack_file: Path = PACK_FILE):
+        self.levels_file = levels_file
+        self.solutions_file = solutions_file
+        self.pack_file = pack_file
+        self._pack: Optional[LevelPack] = None
+        self._palette: Optional[ColorPalette] = None
+        self.records: Dict[int, LevelRecord] = {}
+
+    @property
+    def pack(self) -> LevelPack:
+        if self._pack is None:
+            self._pack = open_pack(self.pack_file, self.levels_file, self.solutions_file)
+        return self._pack
+
+    @property
+    def palette(self) -> ColorPalette:
+        # Same colour IDs as the pack, so packed rows need no translation
+        if self._palette is None:
+            self._palette = ColorPalette(self.pack.colors[1:])
+        return self._palette
+
+    @property
+    def level_ids(self) -> List[int]:
+        return sorted(self.pack)
+
+    def __len__(self) -> int:
+        return len(self.pack)
+
+    def __contains__(self, level_id: int) -> bool:
+        return level_id in self.pack
+
+    def __iter__(self) -> Iterator[LevelRecord]:
+        for level_id in self.level_ids:
+            yield self.get(level_id)
+
+    def get(self, level_id: int) -> Optional[LevelRecord]:
+        record = self.records.get(level_id)
+        if record is None:
+            level = self.pack.read(level_id)
+            if level is None:
+                return None
+            record = self.records[level_id] = LevelRecord(level_id, *level)
+        return record
+
+
+level_store = LevelStore()
@@ -0,0 +1,204 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# A packed board is a tuple with one ``bytes`` row per bottle. Each byte is a
+# colour ID from a ColorPalette, bottom of the bottle first. Rows are
+# immutable, so a pour only builds the two rows it touches and every other
+# row is shared with the previous state. Tuples of bytes are hashable and can
+# be used directly as cache or solver keys.
+PackedState = Tuple[bytes, ...]
+
+EMPTY = 0
+MAX_COLORS = 255
+
+
+class ColorPalette:
+    """Interns colour strings to small integer IDs (0 is reserved)"""
+
+    def __init__(self, colors: Iterable[str] = ()):
+        self._ids: Dict[str, int] = {}
+        self._colors: List[str] = [""]
+        for color in colors:
+            self.intern(color)
+
+    def __len__(self) -> int:
+        return len(self._colors) - 1
+
+    def __contains__(self, color: str) -> bool:
+        return color in self._ids
+
+    @property
+    def colors(self) -> List[str]:
+        return self._colors[1:]
+
+    def intern(self, color: str) -> int:
+        color_id = self._ids.get(color)
+        if color_id is not None:
+            return color_id
+        if len(self._colors) > MAX_COLORS:
+            raise ValueError(f"Palette is limited to {MAX_COLORS} colors")
+        color_id = len(self._colors)
+        self._ids[color] = color_id
+        self._colors.append(color)
+        return color_id
+
+    def color(self, color_id: int) -> str:
+        return self._colors[color_id]
+
+    def extended(self, bottles: List[List[str]]) -> "ColorPalette":
+        """Return a palette covering every colour in ``bottles``.
+
+        Known boards get the palette itself back. Boards with unknown colours
+        get a private copy, so client input never grows a shared palette.
+        """
+        ids = self._ids
+        if all(color in ids for bottle in bottles for color in bottle):
+            return self
+        palette = ColorPalette(self._colors[1:])
+        for bottle in bottles:
+            for color in bottle:
+                palette.intern(color)
+        return palette
+
+    def pack(self, bottles: List[List[str]]) -> PackedState:
+        ids = self._ids
+        return tuple(bytes([ids[color] for color in bottle]) for bottle in bottles)
+
+    def unpack_bottle(self, row: bytes) -> List[str]:
+        colors = self._colors
+        return [colors[color_id] for color_id in row]
+
+    def unpack(self, state: PackedState) -> List[List[str]]:
+        colors = self._colors
+        return [[colors[color_id] for color_id in row] for row in state]
+
+    def check(self, state: PackedState) -> PackedState:
+        """``state`` if every colour ID in it belongs to this palette"""
+        limit = len(self)
+        for row in state:
+            if row and (EMPTY in row or max(row) > limit):
+                raise ValueError("Colour ID outside the palette")
+        return state
+
+    def compact(self, state: PackedState) -> Tuple["ColorPalette", PackedState]:
+        """The board renumbered onto a palette of only the colours it uses"""
+        used = bytes(sorted(set(b"".join(state))))
+        table = bytes.maketrans(used, bytes(range(1, len(used) + 1)))
+        return (ColorPalette(self._colors[old] for old in used),
+                tuple(row.translate(table) for row in state))
+
+
+def top_run(row: bytes) -> int:
+    """Number of units of the top colour sitting together at the top of a row"""
+    if not row:
+        return 0
+    top = row[-1]
+    run = 1
+    for i in range(len(row) - 2, -1, -1):
+        if row[i] != top:
+            break
+        run += 1
+    return run
+
+
+def can_pour(state: PackedState, from_idx: int, to_idx: int, capacity: int = 4) -> bool:
+    if from_idx == to_idx:
+        return False
+    if not 0 <= from_idx < len(state) or not 0 <= to_idx < len(state):
+        return False
+    source = state[from_idx]
+    target = state[to_idx]
+    if not source or len(target) >= capacity:
+        return False
+    return not target or target[-1] == source[-1]
+
+
+def pour(state: PackedState, from_idx: int, to_idx: int,
+         capacity: int = 4, pour_all: bool = True) -> Optional[PackedState]:
+    """Pour from one bottle into another, returning the new state or None.
+
+    With ``pour_all`` the whole matching top run moves (as far as space
+    allows), otherwise exactly one unit moves.
+    """
+    if not can_pour(state, from_idx, to_idx, capacity):
+        return None
+    source = state[from_idx]
+    target = state[to_idx]
+    amount = min(top_run(source), capacity - len(target)) if pour_all else 1
+    moved = source[-amount:]
+    new_state = list(state)
+    new_state[from_idx] = source[:-amount]
+    new_state[to_idx] = target + moved
+    return tuple(new_state)
+
+
+def is_solved(state: PackedState, capacity: int = 4) -> bool:
+    for row in state:
+        if not row:
+            continue
+        if len(row) != capacity or row.count(row[0]) != capacity:
+            return False
+    return True
+
+
+def legal_pours(state: PackedState, capacity: int = 4) -> List[Tuple[int, int]]:
+    """Every legal (from, to) pour, in index order.
+
+    Targets are grouped by top colour in one pass, so each source only
+    visits the bottles it can actually pour into instead of every bottle.
+    """
+    empties: List[int] = []
+    open_by_top: Dict[int, List[int]] = {}
+    for index, row in enumerate(state):
+        if not row:
+            empties.append(index)
+        elif len(row) < capacity:
+            open_by_top.setdefault(row[-1], []).append(index)
+    moves = []
+    for from_idx, source in enumerate(state):
+        if not source:
+            continue
+        targets = open_by_top.get(source[-1], [])
+        if empties:
+            targets = sorted(targets + empties)
+        moves.extend((from_idx, to_idx) for to_idx in targets if to_idx != from_idx)
+    return moves
+
+
+def successors(state: PackedState, capacity: int = 4,
+               pour_all: bool = True) -> List[Tuple[Tuple[int, int], PackedState]]:
+    """Every legal pour with the state it leads to"""
+    runs: Dict[int, int] = {}
+    children = []
+    for from_idx, to_idx in legal_pours(state, capacity):
+        source = state[from_idx]
+        target = state[to_idx]
+        if pour_all:
+            run = runs.get(from_idx)
+            if run is None:
+                run = runs[from_idx] = top_run(source)
+            amount = min(run, capacity - len(target))
+        else:
+            amount = 1
+        child = list(state)
+        child[from_idx] = source[:-amount]
+        child[to_idx] = target + source[-amount:]
+        children.append(((from_idx, to_idx), tuple(child)))
+    return children
+
+
+def update_legal_pours(state: PackedState, previous: List[Tuple[int, int]],
+                       changed: Iterable[int], capacity: int = 4) -> List[Tuple[int, int]]:
+    """Legal pours after a move, from the legal pours before it.
+
+    Whether a pour is legal depends only on its two rows, so only pours
+    touching the ``changed`` rows are re-checked: O(n) instead of O(n²).
+    """
+    changed = set(changed)
+    moves = {move for move in previous if move[0] not in changed and move[1] not in changed}
+    for row in changed:
+        for other in range(len(state)):
+            if can_pour(state, row, other, capacity):
+                moves.add((row, other))
+            if can_pour(state, other, row, capacity):
+                moves.add((other, row))
+    return sorted(moves)
@@ -0,0 +1,99 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.game_engine import game_engine
+from app.services.level_generator import level_generator
+from app.services.level_store import level_store
+from app.services.packed_state import PackedState
+
+Move = Tuple[int, int]
+
+REPLAYS = metrics.counter("watersort_replays_total", "Replay submissions verified", ("result",))
+
+
+def count_replays(results: List[Dict[str, Any]]):
+    for result in results:
+        REPLAYS.inc("valid" if result["valid"] else "invalid")
+
+
+def replay(state: PackedState, moves: Sequence[Move], capacity: int = 4,
+           pour_all: bool = True) -> Tuple[PackedState, Optional[int]]:
+    """Apply moves in order; returns the last legal state and the index of
+    the first illegal move (None if every move was legal)"""
+    for index, (from_idx, to_idx) in enumerate(moves):
+        new_state = game_engine.apply_move(state, from_idx, to_idx, capacity, pour_all)
+        if new_state is None:
+            return state, index
+        state = new_state
+    return state, None
+
+
+def verify_level(level_id: int, moves: Sequence[Move], pour_all: bool = True,
+                 include_final: bool = False) -> Dict[str, Any]:
+    record = level_generator.lookup(level_id)
+    if record is None:
+        return {"level_id": level_id, "valid": False, "error": "Level not found"}
+    state, first_illegal = replay(level_store.palette.pack(record.bottles), moves,
+                                  record.max_capacity, pour_all)
+    result = {
+        "level_id": level_id,
+        "valid": first_illegal is None,
+        "first_illegal_move": first_illegal,
+        "move_count": len(moves),
+        "is_completed": first_illegal is None and game_engine.is_completed(state, record.max_capacity),
+    }
+    if include_final:
+        result["bottles"] = level_store.palette.unpack(state)
+    return result
+
+
+def verify_chunk(submissions: List[Tuple[int, List[Move], bool]]) -> List[Dict[str, Any]]:
+    """Process pool entry point: verify a slice of a bulk request"""
+    return [verify_level(level_id, moves, pour_all) for level_id, moves, pour_all in submissions]
+
+
+class ReplayVerifier:
+    """Verifies bulk submissions, fanning large batches out to a process pool.
+
+    Small batches run in a thread instead, because pickling them to a
+    worker costs more than replaying them; either way the event loop is
+    free while they run. The pool is created on first use.
+    """
+
+    def __init__(self):
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.workers = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            self.workers = settings.VERIFY_POOL_WORKERS or os.cpu_count() or 1
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self.pool
+
+    async def verify_bulk(self, submissions: List[Tuple[int, List[Move], bool]]) -> List[Dict[str, Any]]:
+        if len(submissions) < settings.VERIFY_POOL_MIN_BATCH:
+            results = await asyncio.to_thread(verify_chunk, submissions)
+        else:
+            pool = self._get_pool()
+            size = -(-len(submissions) // self.workers)
+            loop = asyncio.get_running_loop()
+            chunks = await asyncio.gather(*(
+                loop.run_in_executor(pool, verify_chunk, submissions[start:start + size])
+                for start in range(0, len(submissions), size)
+            ))
+            results = [result for chunk in chunks for result in chunk]
+        # Counted here rather than per move, since pool workers have their own metrics
+        count_replays(results)
+        return results
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+replay_verifier = ReplayVerifier()
@@ -0,0 +1,170 @@
+import secrets
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.game_engine import game_engine
+from app.services.leaderboard import leaderboard
+from app.services.level_store import LevelRecord
+from app.services.packed_state import PackedState
+
+Move = Tuple[int, int]
+
+
+class GameSession:
+    """One player's run through a level, kept server-side.
+
+    Every board reached is kept packed (rows are shared between
+    consecutive boards), so undo and redo just move along the history. Only
+    the last ``max_history`` moves are kept: older ones drop off the front
+    and can no longer be undone, but still count towards the move total.
+    """
+
+    def __init__(self, session_id: str, record: LevelRecord, pour_all: bool = True,
+                 player_name: Optional[str] = None, max_history: int = 500):
+        self.session_id = session_id
+        self.player_name = player_name
+        self.level_id = record.level_id
+        self.capacity = record.max_capacity
+        self.pour_all = pour_all
+        self.palette, state = game_engine.pack(record.bottles)
+        self.boards: Deque[PackedState] = deque([state], maxlen=max_history + 1)
+        self.moves: Deque[Move] = deque(maxlen=max_history)
+        # Moves on the current board, including those dropped from history
+        self.move_count = 0
+        # Moves undone since the last new move, most recent last
+        self.redo_moves: List[Move] = []
+        self.redo_boards: List[PackedState] = []
+        self.created_at = time.time()
+        self.last_activity = self.created_at
+
+    @property
+    def board(self) -> PackedState:
+        return self.boards[-1]
+
+    @property
+    def completed(self) -> bool:
+        return game_engine.is_completed(self.board, self.capacity)
+
+    def move(self, from_idx: int, to_idx: int) -> bool:
+        new_board = game_engine.play_move(self.board, from_idx, to_idx, "session",
+                                          self.capacity, self.pour_all)
+        if new_board is None:
+            return False
+        self.boards.append(new_board)
+        self.moves.append((from_idx, to_idx))
+        self.move_count += 1
+        self.redo_moves.clear()
+        self.redo_boards.clear()
+        # Only the standard rules rank: single-unit pours are another game
+        if self.player_name and self.pour_all and self.completed:
+            leaderboard.record_level_result(self.level_id, self.player_name, self.move_count)
+        return True
+
+    def undo(self) -> bool:
+        if not self.moves:
+            return False
+        self.redo_moves.append(self.moves.pop())
+        self.redo_boards.append(self.boards.pop())
+        self.move_count -= 1
+        return True
+
+    def redo(self) -> bool:
+        if not self.redo_moves:
+            return False
+        self.moves.append(self.redo_moves.pop())
+        self.boards.append(self.redo_boards.pop())
+        self.move_count += 1
+        return True
+
+    def get_state(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "level_id": self.level_id,
+            "player_name": self.player_name,
+            "bottles": self.palette.unpack(self.board),
+            "max_capacity": self.capacity,
+            "moves": self.move_count,
+            "can_undo": bool(self.moves),
+            "can_redo": bool(self.redo_moves),
+            "is_completed": self.completed,
+        }
+
+
+class SessionStore:
+    """Sessions by id, least recently used first.
+
+    Sessions idle for longer than ``ttl`` are dropped when they are next
+    looked up or when they reach the front of the LRU order; past
+    ``max_sessions`` the least recently used session is evicted.
+    """
+
+    def __init__(self, max_sessions: int, ttl: float, max_history: int = 500):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_history = max_history
+        self.sessions: "OrderedDict[str, GameSession]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.evicted: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def _expire(self, now: float):
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if now - oldest.last_activity <= self.ttl:
+                break
+            del self.sessions[oldest.session_id]
+            self.evicted["expired"] += 1
+
+    def create(self, record: LevelRecord, pour_all: bool = True,
+               player_name: Optional[str] = None) -> GameSession:
+        session = GameSession(secrets.token_urlsafe(12), record, pour_all, player_name, self.max_history)
+        with self.lock:
+            self._expire(session.created_at)
+            self.sessions[session.session_id] = session
+            self.created += 1
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evicted["capacity"] += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[GameSession]:
+        """The session, marked as just used, or None if unknown or expired"""
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_activity = now
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id: str) -> bool:
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def get_stats(self) -> Dict[str, float]:
+        with self.lock:
+            return {
+                "live": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+                "created": self.created,
+                "evicted": dict(self.evicted),
+            }
+
+
+session_store = SessionStore(settings.SESSION_MAX, settings.SESSION_TTL, settings.SESSION_MAX_HISTORY)
+
+metrics.gauge("watersort_sessions_live", "Singleplayer sessions held in memory",
+              lambda: len(session_store))
+metrics.collected_counter("watersort_sessions_evicted_total", "Singleplayer sessions evicted by reason",
+                          lambda: {(reason,): count for reason, count in session_store.evicted.items()},
+                          ("reason",))
@@ -0,0 +1,268 @@
+import heapq
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.level_store import SOLUTIONS_FILE, LevelRecord, level_store
+from app.services.packed_state import PackedState, pour, top_run
+
+Move = Tuple[int, int]
+
+
+class SolveResult:
+    def __init__(self, moves: Optional[List[Move]], optimal: bool, nodes_expanded: int,
+                 peak_table_size: int, elapsed_ms: float, weight: float, lower_bound: int,
+                 exhausted: bool = False):
+        self.moves = moves
+        self.optimal = optimal
+        self.nodes_expanded = nodes_expanded
+        self.peak_table_size = peak_table_size
+        self.elapsed_ms = elapsed_ms
+        self.weight = weight
+        self.lower_bound = lower_bound
+        # Every reachable state was searched, so an unsolved result is proof
+        # that the board cannot be solved
+        self.exhausted = exhausted
+
+    @property
+    def solved(self) -> bool:
+        return self.moves is not None
+
+    def to_dict(self) -> dict:
+        return {
+            'solved': self.solved,
+            'optimal': self.optimal,
+            'moves': [list(move) for move in self.moves] if self.moves is not None else None,
+            'move_count': len(self.moves) if self.moves is not None else None,
+            'nodes_expanded': self.nodes_expanded,
+            'peak_table_size': self.peak_table_size,
+            'elapsed_ms': round(self.elapsed_ms, 2),
+            'weight': self.weight,
+            'lower_bound': self.lower_bound,
+            'exhausted': self.exhausted,
+        }
+
+
+def canonical(state: PackedState) -> PackedState:
+    """Bottle-order independent key: boards that differ only by a permutation
+    of bottles (including identical and empty ones) share one entry"""
+    return tuple(sorted(state))
+
+
+def _row_runs(row: bytes) -> int:
+    runs = 1 if row else 0
+    for i in range(1, len(row)):
+        if row[i] != row[i - 1]:
+            runs += 1
+    return runs
+
+
+class _Heuristic:
+    """Colour runs beyond the fewest bottles each colour can end up in.
+
+    A finished board holds every colour in ceil(units / capacity) runs, and
+    a pour removes at most one run (the source's top run merging into the
+    target's), so this never overestimates the remaining moves and is 0 on
+    a finished board. Pours never change the colour counts on the board and
+    rows repeat heavily across states, so run counts are memoised per row.
+    """
+
+    def __init__(self, state: PackedState, capacity: int):
+        counts: Dict[int, int] = {}
+        for row in state:
+            for color_id in row:
+                counts[color_id] = counts.get(color_id, 0) + 1
+        self.min_runs = sum(-(-count // capacity) for count in counts.values())
+        self.runs: Dict[bytes, int] = {}
+
+    def __call__(self, state: PackedState) -> int:
+        runs = self.runs
+        total = 0
+        for row in state:
+            count = runs.get(row)
+            if count is None:
+                count = runs[row] = _row_runs(row)
+            total += count
+        return total - self.min_runs
+
+
+def heuristic(state: PackedState, capacity: int = 4) -> int:
+    return _Heuristic(state, capacity)(state)
+
+
+def is_goal(state: PackedState, capacity: int) -> bool:
+    for row in state:
+        if row and (len(row) != capacity or row.count(row[0]) != capacity):
+            return False
+    return True
+
+
+def legal_moves(state: PackedState, capacity: int) -> List[Move]:
+    """Pours worth searching, with symmetric and pointless pours pruned"""
+    moves = []
+    seen_sources = set()
+    for i, source in enumerate(state):
+        if not source or source in seen_sources:
+            continue
+        seen_sources.add(source)
+        run = top_run(source)
+        if run == len(source) == capacity:
+            # Already a finished bottle
+            continue
+        seen_targets = set()
+        for j, target in enumerate(state):
+            if i == j or target in seen_targets:
+                continue
+            if len(target) >= capacity:
+                continue
+            if target:
+                if target[-1] != source[-1]:
+                    continue
+            elif run == len(source):
+                # Moving a uniform bottle into an empty one changes nothing
+                continue
+            seen_targets.add(target)
+            moves.append((i, j))
+    return moves
+
+
+def solve(state: PackedState, capacity: int = 4, max_nodes: int = 200_000,
+          time_limit: float = 5.0, weight: float = 1.0) -> SolveResult:
+    """A* over canonicalised states (weighted when ``weight`` > 1).
+
+    The transposition table maps canonical states to their best known cost
+    and parent, so the search stops at ``max_nodes`` expansions or
+    ``time_limit`` seconds, whichever comes first.
+    """
+    started = time.perf_counter()
+    h = _Heuristic(state, capacity)
+    deadline = started + time_limit
+    start_key = canonical(state)
+    # key -> (g, parent key, move, actual state)
+    table: Dict[PackedState, Tuple[int, Optional[PackedState], Optional[Move], PackedState]] = {
+        start_key: (0, None, None, state)
+    }
+    counter = itertools.count()
+    frontier = [(weight * h(state), 0, next(counter), start_key)]
+    closed = set()
+    expanded = 0
+
+    def finish(moves: Optional[List[Move]], exhausted: bool = False) -> SolveResult:
+        return SolveResult(moves, moves is not None and weight == 1.0, expanded, len(table),
+                           (time.perf_counter() - started) * 1000, weight, h(state), exhausted)
+
+    while frontier:
+        _, g, _, key = heapq.heappop(frontier)
+        if key in closed:
+            continue
+        best_g, _, _, current = table[key]
+        if g > best_g:
+            continue
+        if is_goal(current, capacity):
+            return finish(_reconstruct(table, key))
+        closed.add(key)
+        expanded += 1
+        if expanded >= max_nodes or (expanded & 255 == 0 and time.perf_counter() > deadline):
+            return finish(None)
+        for move in legal_moves(current, capacity):
+            child = pour(current, move[0], move[1], capacity)
+            child_key = canonical(child)
+            if child_key in closed:
+                continue
+            known = table.get(child_key)
+            if known is not None and known[0] <= g + 1:
+                continue
+            table[child_key] = (g + 1, key, move, child)
+            heapq.heappush(frontier, (g + 1 + weight * h(child), g + 1, next(counter), child_key))
+    return finish(None, exhausted=True)
+
+
+def _reconstruct(table, key) -> List[Move]:
+    moves = []
+    while True:
+        _, parent, move, _ = table[key]
+        if parent is None:
+            break
+        moves.append(move)
+        key = parent
+    moves.reverse()
+    return moves
+
+
+class Solver:
+    """Solves boards within the configured node and time budget.
+
+    An exact A* pass runs first; when it runs out of budget a weighted pass
+    finds a short (but not provably optimal) solution instead. The most
+    recently used ``max_levels`` level solutions are cached per process, and
+    ``solutions.json`` holds the move counts and paths precomputed with
+    ``python -m app.services.solver``.
+    """
+
+    def __init__(self, max_levels: int = 1000):
+        self.max_levels = max_levels
+        self.level_solutions: "OrderedDict[int, SolveResult]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def solve(self, state: PackedState, capacity: int = 4,
+              max_nodes: Optional[int] = None) -> SolveResult:
+        max_nodes = max_nodes or settings.SOLVER_MAX_NODES
+        result = solve(state, capacity, max_nodes, settings.SOLVER_TIME_LIMIT)
+        if result.solved:
+            return result
+        fallback = solve(state, capacity, max_nodes * settings.SOLVER_FALLBACK_NODE_FACTOR,
+                         settings.SOLVER_TIME_LIMIT, weight=settings.SOLVER_FALLBACK_WEIGHT)
+        fallback.nodes_expanded += result.nodes_expanded
+        fallback.peak_table_size = max(fallback.peak_table_size, result.peak_table_size)
+        fallback.elapsed_ms += result.elapsed_ms
+        return fallback
+
+    def solve_level(self, record: LevelRecord) -> SolveResult:
+        with self.lock:
+            result = self.level_solutions.get(record.level_id)
+            if result is not None:
+                self.level_solutions.move_to_end(record.level_id)
+                return result
+        state = level_store.palette.pack(record.bottles)
+        result = self.solve(state, record.max_capacity)
+        with self.lock:
+            self.level_solutions[record.level_id] = result
+            while len(self.level_solutions) > self.max_levels:
+                self.level_solutions.popitem(last=False)
+        return result
+
+
+solver = Solver(settings.SOLVER_LEVEL_CACHE_SIZE)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Solve every level in levels.json")
+    parser.add_argument("--write", action="store_true", help="write solutions to solutions.json")
+    args = parser.parse_args()
+
+    solutions = {}
+    total_nodes = 0
+    peak_table = 0
+    started = time.perf_counter()
+    for level_id in level_store.level_ids:
+        result = solver.solve_level(level_store.get(level_id))
+        total_nodes += result.nodes_expanded
+        peak_table = max(peak_table, result.peak_table_size)
+        print(f"level {level_id:3d}: {len(result.moves) if result.solved else '-':>3} moves "
+              f"{'optimal' if result.optimal else 'bounded'} "
+              f"nodes={result.nodes_expanded} table={result.peak_table_size} {result.elapsed_ms:.0f}ms")
+        if result.solved:
+            solutions[str(level_id)] = {"moves": len(result.moves), "optimal": result.optimal,
+                                        "path": [list(move) for move in result.moves]}
+    elapsed = time.perf_counter() - started
+    print(f"solved {len(solutions)}/{len(level_store)} levels in {elapsed:.1f}s, "
+          f"{total_nodes} nodes expanded, peak table size {peak_table}")
+    if args.write:
+        with open(SOLUTIONS_FILE, 'w') as f:
+            json.dump(solutions, f, separators=(",", ":"))
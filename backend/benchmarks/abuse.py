@@ -0,0 +1,111 @@
+"""Admission control benchmark: player latency while other clients flood updates.
+
+Seats ``--players`` well-behaved players and ``--abusers`` flooding clients
+in one race room. The players report progress every ``--interval`` seconds,
+first alone and then while every abuser fires ``--abuse-rate``
+/multiplayer/update requests a second from its own IP without waiting for
+answers, each phase for ``--seconds``. Player latency is
+reported per phase, with admission control on and then switched off
+(unlimited buckets, no coalescing, no shedding) for comparison.
+
+    cd backend && python -m benchmarks.abuse --players 400 --abusers 10
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from app.core.admission import TokenBuckets, update_admission, update_coalescer
+from app.multiplayer.game_room import RACE, multiplayer_manager
+from app.services.level_store import level_store
+from benchmarks.suite import asgi_request, summarise
+
+UPDATE = "/api/v1/multiplayer/update"
+
+
+def disable_admission():
+    update_admission.limits = {kind: TokenBuckets(1e12, 1e12, buckets.max_keys)
+                               for kind, buckets in update_admission.limits.items()}
+    update_admission.shed_lag = 0
+    update_coalescer.window = 0
+
+
+async def phase(app, room_id: str, players: List[str], abusers: List[str], interval: float,
+                abuse_rate: float, seconds: float) -> Dict[str, Any]:
+    samples: List[float] = []
+    statuses: Dict[str, Dict[int, int]] = {"players": {}, "abusers": {}}
+    deadline = time.perf_counter() + seconds
+
+    def count(group: str, status: int):
+        statuses[group][status] = statuses[group].get(status, 0) + 1
+
+    async def player(index: int, player_id: str):
+        moves = 0
+        await asyncio.sleep(interval * index / len(players))
+        while time.perf_counter() < deadline:
+            moves += 1
+            started = time.perf_counter()
+            status, _ = await asgi_request(app, "POST", UPDATE, {
+                "room_id": room_id, "player_id": player_id, "moves": moves, "completed": False
+            }, client=f"10.0.{index // 250}.{index % 250}")
+            samples.append(time.perf_counter() - started)
+            count("players", status)
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    async def abuse(index: int, player_id: str, moves: int):
+        status, _ = await asgi_request(app, "POST", UPDATE, {
+            "room_id": room_id, "player_id": player_id, "moves": moves, "completed": False
+        }, client=f"10.1.{index // 250}.{index % 250}")
+        count("abusers", status)
+
+    async def abuser(index: int, player_id: str):
+        # Open loop: requests go out at abuse_rate whether or not earlier
+        # ones have been answered
+        sent = []
+        while time.perf_counter() < deadline:
+            sent.append(asyncio.create_task(abuse(index, player_id, len(sent) + 1)))
+            await asyncio.sleep(1 / abuse_rate)
+        await asyncio.gather(*sent)
+
+    await asyncio.gather(*(player(i, p) for i, p in enumerate(players)),
+                         *(abuser(i, p) for i, p in enumerate(abusers)))
+    return {"player_latency": summarise(samples), "statuses": statuses}
+
+
+async def run(players: int, abusers: int, interval: float, abuse_rate: float, seconds: float,
+              admission: bool) -> Dict[str, Any]:
+    from app.main import app
+
+    if not admission:
+        disable_admission()
+    async with app.router.lifespan_context(app):
+        seats = [(f"player{i}", f"player{i}") for i in range(players)]
+        seats += [(f"abuser{i}", f"abuser{i}") for i in range(abusers)]
+        room_id = await multiplayer_manager.create_room(1, tuple(seats), len(seats), RACE)
+        async with multiplayer_manager.update_room(room_id) as room:
+            room.start_game(level_store.get(1).bottles)
+        player_ids = [player_id for player_id, _ in seats[:players]]
+        abuser_ids = [player_id for player_id, _ in seats[players:]]
+        quiet = await phase(app, room_id, player_ids, [], interval, abuse_rate, seconds)
+        flooded = await phase(app, room_id, player_ids, abuser_ids, interval, abuse_rate, seconds)
+        return {"quiet": quiet, "flooded": flooded, "room_version": multiplayer_manager.get_room(room_id).version,
+                "admission": {**update_admission.get_stats(), "updates": update_coalescer.get_stats()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=400)
+    parser.add_argument("--abusers", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between a player's updates")
+    parser.add_argument("--abuse-rate", type=float, default=200.0, help="requests per second from each abuser")
+    parser.add_argument("--seconds", type=float, default=5.0, help="length of each phase")
+    parser.add_argument("--no-admission", action="store_true", help="switch admission control off")
+    args = parser.parse_args()
+    result = asyncio.run(run(args.players, args.abusers, args.interval, args.abuse_rate, args.seconds,
+                                 not args.no_admission))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
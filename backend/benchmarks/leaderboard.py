@@ -0,0 +1,86 @@
+"""Leaderboard benchmark: sustained write-behind throughput and query latency.
+
+Streams random level results through the write-behind queue into a fresh
+SQLite file until ``--rows`` have been written, then times rank and top-N
+queries against the filled tables.
+
+    cd backend && python -m benchmarks.leaderboard --rows 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict
+
+from app.services.leaderboard import Leaderboard
+from benchmarks.suite import summarise
+
+
+async def fill(board: Leaderboard, rows: int, levels: int, players: int, chunk: int) -> Dict[str, Any]:
+    board.start()
+    started = time.perf_counter()
+    sent = 0
+    while sent < rows:
+        # Back off while the queue is half full so nothing is dropped and the
+        # measured rate is the writer's
+        if len(board.pending) > board.max_pending // 2:
+            await asyncio.sleep(0.001)
+            continue
+        count = min(chunk, rows - sent)
+        for _ in range(count):
+            level_id = random.randint(1, levels)
+            board.record_level_result(level_id, f"player{random.randrange(players)}", random.randint(20, 60))
+        sent += count
+        await asyncio.sleep(0)
+    await board.stop()
+    elapsed = time.perf_counter() - started
+    return {"rows": rows, "seconds": round(elapsed, 2), "rows_per_sec": round(rows / elapsed),
+            "batches": board.batches, "dropped": board.dropped}
+
+
+def query(board: Leaderboard, count: int, limit: int) -> Dict[str, Any]:
+    """Rank lookups for stored results and top-N for their levels"""
+    stored = board._reader().execute(
+        "SELECT level_id, player FROM level_results ORDER BY RANDOM() LIMIT ?", (count,)
+    ).fetchall()
+    rank_samples = []
+    top_samples = []
+    for level_id, player in stored:
+        started = time.perf_counter()
+        board.rank(level_id, player)
+        rank_samples.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        board.top(level_id, limit)
+        top_samples.append(time.perf_counter() - started)
+    return {"queries": len(stored), "rank": summarise(rank_samples), f"top_{limit}": summarise(top_samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--levels", type=int, default=100)
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "leaderboard.db")
+        board = Leaderboard(path, 0.05, args.batch_size, args.batch_size * 20)
+        writes = asyncio.run(fill(board, args.rows, args.levels, args.players, args.batch_size))
+        stored = board._reader().execute("SELECT COUNT(*) FROM level_results").fetchone()[0]
+        reads = query(board, args.queries, args.limit)
+        print(json.dumps({
+            "writes": {**writes, "stored_results": stored, "db_bytes": os.path.getsize(path)},
+            "reads": reads,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Cold-start benchmark: time from a fresh interpreter to the first response.
+
+Every run is a new process that imports the app, runs its lifespan startup
+and serves GET /levels/{id} in-process. Runs with and without an existing
+level pack show the cost of rebuilding it from levels.json.
+
+    cd backend && python -m benchmarks.startup --runs 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+from app.services.level_store import PACK_FILE
+
+PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+from benchmarks.suite import asgi_request
+
+async def first_response():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        status, _ = await asgi_request(app, "GET", "/api/v1/levels/{level_id}")
+        return ready, status
+
+ready, status = asyncio.run(first_response())
+done = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - started) * 1000, "startup_ms": (ready - started) * 1000,
+                  "first_response_ms": (done - started) * 1000, "status": status}}))
+"""
+
+
+def probe(level_id: int) -> Dict[str, float]:
+    output = subprocess.run([sys.executable, "-c", PROBE.format(level_id=level_id)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarise(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    return {
+        key: {"median": round(statistics.median(run[key] for run in runs), 2),
+              "min": round(min(run[key] for run in runs), 2)}
+        for key in ("import_ms", "startup_ms", "first_response_ms")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--level", type=int, default=1)
+    args = parser.parse_args()
+
+    cold = []
+    for _ in range(args.runs):
+        PACK_FILE.unlink(missing_ok=True)
+        cold.append(probe(args.level))
+    warm = [probe(args.level) for _ in range(args.runs)]
+    print(json.dumps({
+        "runs": args.runs,
+        "without_pack": summarise(cold),
+        "with_pack": summarise(warm),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
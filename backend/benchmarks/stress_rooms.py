@@ -0,0 +1,137 @@
+"""Concurrency stress benchmark for multiplayer rooms.
+
+Fires thousands of concurrent joins, duplicated move submissions and
+next-level calls straight at the route handlers, with a store listener
+that yields on every event (standing in for socket sends), then checks:
+no overfilled rooms, no lost or doubly applied moves, a single winner per
+room and per-room events published in version order.
+
+    cd backend && python -m benchmarks.stress_rooms --players 4000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+from fastapi import HTTPException, Request
+
+from app.api.multiplayer_routes import (
+    JoinRoomRequest, MoveSubmission, join_multiplayer, load_next_level, submit_move
+)
+from benchmarks.abuse import disable_admission
+from app.core.config import settings
+from app.multiplayer.game_room import multiplayer_manager
+from app.services.level_store import level_store
+from app.services.solver import solver
+
+
+async def run(players: int, levels: int, duplicates: int, seed: int) -> dict:
+    random.seed(seed)
+    events = defaultdict(list)
+
+    async def record(room_id, event):
+        await asyncio.sleep(0)
+        if "version" in event:
+            events[room_id].append(event["version"])
+
+    multiplayer_manager.store.add_listener(record)
+    # Duplicate submissions are the point here, not something to rate limit
+    disable_admission()
+    request = Request({"type": "http", "client": ("127.0.0.1", 0)})
+    solutions = {level_id: solver.solve_level(level_store.get(level_id)).moves for level_id in range(1, levels + 1)}
+
+    # 1. Concurrent joins
+    started = time.perf_counter()
+    joins = await asyncio.gather(*(
+        join_multiplayer(JoinRoomRequest(player_name=f"p{i}", level_id=random.randint(1, levels)))
+        for i in range(players)
+    ))
+    join_seconds = time.perf_counter() - started
+
+    seats = defaultdict(list)
+    for joined in joins:
+        seats[joined["room_id"]].append(joined["player_id"])
+    rooms = {room_id: multiplayer_manager.get_room(room_id) for room_id in seats}
+    overfilled = [room_id for room_id, room in rooms.items() if len(room.players) > room.max_players]
+    unstarted_full = [room_id for room_id, room in rooms.items() if room.can_start() and not room.started]
+    assert not overfilled, f"overfilled rooms: {overfilled[:5]}"
+    assert not unstarted_full, f"full rooms that never started: {unstarted_full[:5]}"
+    assert sum(len(ids) for ids in seats.values()) == players
+
+    # 2. Every player replays its solution, each move submitted several times
+    async def play(room, player_id):
+        accepted = 0
+        for seq, (from_idx, to_idx) in enumerate(solutions[room.level_id], start=1):
+            move = MoveSubmission(room_id=room.room_id, player_id=player_id,
+                                  from_bottle=from_idx, to_bottle=to_idx, seq=seq)
+            results = await asyncio.gather(
+                *(submit_move(request, move) for _ in range(duplicates)), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, HTTPException):
+                    assert result.status_code == 409, result.detail
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    accepted += 1
+        return accepted
+
+    started_rooms = [room for room in rooms.values() if room.started]
+    started = time.perf_counter()
+    accepted = await asyncio.gather(*(
+        play(room, player.id) for room in started_rooms for player in room.players.values()
+    ))
+    move_seconds = time.perf_counter() - started
+    submitted_moves = sum(len(solutions[room.level_id]) * len(room.players) for room in started_rooms)
+
+    for room in started_rooms:
+        room = multiplayer_manager.get_room(room.room_id)
+        expected = len(solutions[room.level_id])
+        for player in room.players.values():
+            assert player.seq == expected, f"lost moves in {room.room_id}: {player.seq}/{expected}"
+            assert player.completed
+        assert room.winner in set(room.players), f"bad winner in {room.room_id}"
+    assert sum(accepted) == submitted_moves, f"accepted {sum(accepted)} of {submitted_moves} moves"
+
+    # 3. Concurrent next-level calls on the same room each advance it once
+    calls = 3
+    level_before = {room.room_id: room.level_id for room in started_rooms}
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        load_next_level(room.room_id) for room in started_rooms for _ in range(calls)
+    ), return_exceptions=True)
+    next_level_seconds = time.perf_counter() - started
+    for room_id, level_id in level_before.items():
+        room = multiplayer_manager.get_room(room_id)
+        assert room.level_id == min(level_id + calls, settings.MAX_LEVEL_ID), f"{room_id} at level {room.level_id}"
+        assert room.winner is None
+
+    out_of_order = [room_id for room_id, versions in events.items() if versions != sorted(versions)]
+    assert not out_of_order, f"events out of order in {out_of_order[:5]}"
+
+    return {
+        "players": players,
+        "rooms": len(rooms),
+        "started_rooms": len(started_rooms),
+        "joins_per_sec": round(players / join_seconds),
+        "move_submissions": submitted_moves * duplicates,
+        "move_submissions_per_sec": round(submitted_moves * duplicates / move_seconds),
+        "next_level_calls_per_sec": round(len(started_rooms) * calls / next_level_seconds),
+        "events": sum(len(versions) for versions in events.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=4000)
+    parser.add_argument("--levels", type=int, default=5)
+    parser.add_argument("--duplicates", type=int, default=2, help="copies of every move submitted at once")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.players, args.levels, args.duplicates, args.seed)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
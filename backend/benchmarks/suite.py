@@ -0,0 +1,278 @@
+"""Offline benchmark suite for the engine, level loading, API and solver.
+
+Runs micro-benchmarks of the engine functions, concurrent in-process load
+against the HTTP routes (no server or sockets, straight into the ASGI app)
+and solver timings over the stored levels, then writes one JSON document
+that can be compared against a run from another commit.
+
+    cd backend && python -m benchmarks.suite --output bench.json
+    cd backend && python -m benchmarks.suite --skip solver --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.level_store import LevelStore, level_store
+
+SECTIONS = ("engine", "api", "solver")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarise(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in microseconds"""
+    samples = sorted(samples)
+
+    def pct(p: float) -> float:
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1e6, 2)
+
+    return {
+        "mean_us": round(statistics.fmean(samples) * 1e6, 2),
+        "p50_us": pct(0.50),
+        "p95_us": pct(0.95),
+        "p99_us": pct(0.99),
+    }
+
+
+def bench(func: Callable[[], Any], seconds: float) -> Dict[str, float]:
+    """Call ``func`` repeatedly for about ``seconds``; per-call latency and rate"""
+    samples = []
+    clock = time.perf_counter
+    deadline = clock() + seconds
+    while True:
+        started = clock()
+        func()
+        finished = clock()
+        samples.append(finished - started)
+        if finished > deadline:
+            break
+    return {"calls": len(samples), "ops_per_sec": round(len(samples) / sum(samples)), **summarise(samples)}
+
+
+def run_engine(seconds: float) -> Dict[str, Any]:
+    from app import game_logic
+    from app.services.game_engine import game_engine
+
+    record = level_store.get(1)
+    bottles = record.bottles
+    named = record.named_bottles
+    state = level_store.palette.pack(bottles)
+    from_idx, to_idx = game_engine.legal_moves(state)[0]
+    solved = [[color] * record.max_capacity for color in {c for bottle in bottles for c in bottle}]
+
+    cases = {
+        "validate_move": lambda: game_engine.validate_move(bottles, from_idx, to_idx),
+        "apply_move_packed": lambda: game_engine.apply_move(state, from_idx, to_idx),
+        "pour_liquid": lambda: game_logic.pour_liquid(named, from_idx, to_idx),
+        "check_completion": lambda: game_logic.check_completion(named),
+        "check_completion_solved": lambda: game_engine.check_completion(solved),
+        "legal_moves": lambda: game_engine.legal_moves(state),
+        "successors": lambda: game_engine.successors(state),
+        "pack_unpack": lambda: level_store.palette.unpack(level_store.palette.pack(bottles)),
+        "load_levels": game_logic.load_levels,
+        "level_store_first_get": lambda: LevelStore().get(1),
+    }
+    return {name: bench(func, seconds) for name, func in cases.items()}
+
+
+async def asgi_request(app, method: str, path: str, body: Optional[dict] = None,
+                       client: str = "127.0.0.1") -> Tuple[int, bytes]:
+    """Drive one HTTP request through the ASGI app in-process"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode())],
+        "client": (client, 0), "server": ("bench", 80),
+    }
+    sent = False
+    status = 0
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)
+        sent = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def load(request: Callable[[int], Awaitable[Tuple[int, bytes]]],
+               requests: int, concurrency: int) -> Dict[str, Any]:
+    """Fire ``requests`` calls with at most ``concurrency`` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[float] = []
+    errors = 0
+
+    async def one(index: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            status, _ = await request(index)
+            samples.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {"requests": requests, "concurrency": concurrency, "errors": errors,
+            "requests_per_sec": round(requests / elapsed), **summarise(samples)}
+
+
+async def run_api(requests: int, concurrency: int) -> Dict[str, Any]:
+    from app.main import app
+    from app.services.game_engine import game_engine
+
+    async with app.router.lifespan_context(app):
+        levels = level_store.level_ids
+        bottles = level_store.get(1).bottles
+        state = level_store.palette.pack(bottles)
+        from_idx, to_idx = game_engine.legal_moves(state)[0]
+        results = {}
+
+        results["get_level"] = await load(lambda i: asgi_request(
+            app, "GET", f"/api/v1/levels/{levels[i % len(levels)]}"), requests, concurrency)
+        results["make_move"] = await load(lambda i: asgi_request(
+            app, "POST", "/api/v1/make-move",
+            {"bottles": bottles, "from_bottle": from_idx, "to_bottle": to_idx}), requests, concurrency)
+
+        joined = []
+
+        async def join(i: int):
+            status, body = await asgi_request(app, "POST", "/api/v1/multiplayer/join",
+                                              {"player_name": f"bench{i}", "level_id": 1})
+            if status < 400:
+                joined.append(json.loads(body))
+            return status, body
+
+        results["multiplayer_join"] = await load(join, requests, concurrency)
+
+        players = [(player["room_id"], player["player_id"]) for player in joined]
+        results["multiplayer_room_state"] = await load(lambda i: asgi_request(
+            app, "GET", f"/api/v1/multiplayer/room/{players[i % len(players)][0]}"), requests, concurrency)
+        # Every seated player submits its opening move once, each from its
+        # own client as admission control limits moves per IP
+        results["multiplayer_move"] = await load(lambda i: asgi_request(
+            app, "POST", "/api/v1/multiplayer/move",
+            {"room_id": players[i][0], "player_id": players[i][1],
+             "from": from_idx, "to": to_idx, "seq": 1},
+            client=f"10.0.{i // 250}.{i % 250}"), len(players), concurrency)
+    return results
+
+
+def run_solver(limit: Optional[int]) -> Dict[str, Any]:
+    from app.services.solver import Solver
+
+    solver = Solver()
+    level_ids = level_store.level_ids[:limit]
+    per_level = {}
+    started = time.perf_counter()
+    for level_id in level_ids:
+        result = solver.solve_level(level_store.get(level_id))
+        per_level[str(level_id)] = {
+            "ms": round(result.elapsed_ms, 2),
+            "nodes": result.nodes_expanded,
+            "moves": len(result.moves) if result.solved else None,
+            "optimal": result.optimal,
+        }
+    elapsed = time.perf_counter() - started
+    times = [level["ms"] for level in per_level.values()]
+    return {
+        "levels": len(level_ids),
+        "solved": sum(1 for level in per_level.values() if level["moves"] is not None),
+        "optimal": sum(1 for level in per_level.values() if level["optimal"]),
+        "total_s": round(elapsed, 2),
+        "mean_ms": round(statistics.fmean(times), 2),
+        "max_ms": max(times),
+        "nodes": sum(level["nodes"] for level in per_level.values()),
+        "per_level": per_level,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Lines describing metrics that moved by more than ``threshold``"""
+    lines = []
+    for section in SECTIONS:
+        for name, metrics in current.get(section, {}).items():
+            before = baseline.get(section, {}).get(name)
+            if not isinstance(metrics, dict) or not isinstance(before, dict):
+                continue
+            for key in ("p50_us", "p95_us", "mean_ms"):
+                if key in metrics and before.get(key):
+                    ratio = metrics[key] / before[key]
+                    if abs(ratio - 1) > threshold:
+                        label = "slower" if ratio > 1 else "faster"
+                        lines.append(f"{section}.{name}.{key}: {before[key]} -> {metrics[key]} "
+                                     f"({ratio:.2f}x, {label})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--skip", action="append", choices=SECTIONS, default=[])
+    parser.add_argument("--seconds", type=float, default=0.5, help="time per engine micro-benchmark")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per API endpoint")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--solver-levels", type=int, default=None, help="solve only the first N levels")
+    parser.add_argument("--output", help="write the JSON results here")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change worth reporting")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    if "engine" not in args.skip:
+        results["engine"] = run_engine(args.seconds)
+    if "api" not in args.skip:
+        results["api"] = asyncio.run(run_api(args.requests, args.concurrency))
+    if "solver" not in args.skip:
+        results["solver"] = run_solver(args.solver_levels)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changes = compare(results, baseline, args.threshold)
+        print(f"compared with {baseline.get('commit')}: {len(changes)} metrics changed by >{args.threshold:.0%}",
+              file=sys.stderr)
+        for line in changes:
+            print(f"  {line}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import pytest
+
+from app.services.packed_state import ColorPalette
+
+palette = ColorPalette(["a", "b"])
+
+
+@pytest.fixture
+def board():
+    """Packs bottles given as strings of colours, bottom first"""
+    def pack(*bottles):
+        return palette.pack([list(bottle) for bottle in bottles])
+    return pack
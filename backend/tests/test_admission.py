@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionControl, AdmissionRejected, Coalescer, LoopLagMonitor, TokenBuckets
+
+
+def admission(player_burst: float = 2.0, shed_lag: float = 0.0) -> AdmissionControl:
+    return AdmissionControl({
+        "player": TokenBuckets(1.0, player_burst, 100),
+        "ip": TokenBuckets(1.0, 100.0, 100),
+    }, LoopLagMonitor(1.0), shed_lag)
+
+
+def test_rejected_request_takes_no_tokens():
+    control = admission()
+    control.admit(player="p", ip="1.2.3.4")
+    control.admit(player="p", ip="1.2.3.4")
+    with pytest.raises(AdmissionRejected) as rejected:
+        control.admit(player="p", ip="1.2.3.4")
+
+    assert rejected.value.reason == "player rate limit"
+    assert rejected.value.retry_after_header == "1"
+    assert control.limits["ip"].tokens("1.2.3.4", float("inf")) == 100.0
+    assert 97.5 < control.limits["ip"].buckets["1.2.3.4"][0] < 98.5
+    assert control.rejected == {"player": 1}
+
+
+def test_keys_given_as_none_are_not_limited():
+    control = admission()
+    for _ in range(5):
+        control.admit(player=None, ip="1.2.3.4")
+    assert len(control.limits["player"]) == 0
+
+
+def test_lagging_loop_sheds_the_busiest_clients_first():
+    control = admission(player_burst=4.0, shed_lag=0.5)
+    for _ in range(3):
+        control.admit(player="busy", ip="busy")
+    control.lag_monitor.lag = 1.0
+
+    with pytest.raises(AdmissionRejected) as shed:
+        control.admit(player="busy", ip="busy")
+    assert shed.value.reason == "server busy"
+    control.admit(player="quiet", ip="quiet")
+
+
+def test_updates_within_the_window_are_applied_once():
+    async def run():
+        coalescer = Coalescer(0.05, 100)
+        applied = []
+
+        async def apply(values):
+            applied.append(values)
+            return values
+
+        first = await coalescer.submit("p", 1, apply, lambda earlier, later: later)
+        burst = await asyncio.gather(*(coalescer.submit("p", value, apply, lambda earlier, later: later)
+                                       for value in (2, 3, 4)))
+        return first, burst, applied, coalescer.get_stats()
+
+    first, burst, applied, stats = asyncio.run(run())
+    assert first == 1
+    assert burst == [4, 4, 4]
+    assert applied == [1, 4]
+    assert stats["applied"] == 2 and stats["coalesced"] == 2
@@ -0,0 +1,23 @@
+from app.services.game_engine import game_engine
+
+
+def test_solved_board_is_not_a_dead_end(board):
+    assert game_engine.dead_end(board("aaaa", "bbbb", ""), 4) == (False, "solved")
+
+
+def test_solvable_board_is_not_a_dead_end(board):
+    assert game_engine.dead_end(board("aaab", "aaaa", "bbba", ""), 4) == (False, "solvable")
+
+
+def test_board_one_pour_from_solved_is_not_a_dead_end(board):
+    # Every pour finishes the board, and the finished board's only pour
+    # undoes it
+    assert game_engine.dead_end(board("aaa", "a"), 4) == (False, "solvable")
+
+
+def test_board_without_moves_is_a_dead_end(board):
+    assert game_engine.dead_end(board("abab", "baba"), 4) == (True, "no_moves")
+
+
+def test_board_with_moves_but_no_solution_is_a_dead_end(board):
+    assert game_engine.dead_end(board("abba", "abba", ""), 4) == (True, "exhausted")
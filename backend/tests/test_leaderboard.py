@@ -0,0 +1,41 @@
+from app.services.leaderboard import Leaderboard
+
+
+def build_leaderboard(tmp_path, results) -> Leaderboard:
+    board = Leaderboard(str(tmp_path / "leaderboard.db"), 1.0, 100, 100)
+    for level_id, player, moves in results:
+        board.record_level_result(level_id, player, moves)
+    board.write(board.take_batch())
+    return board
+
+
+def test_best_result_per_player_is_kept(tmp_path):
+    board = build_leaderboard(tmp_path, [(1, "ann", 30), (1, "ann", 25), (1, "ann", 40)])
+    board.record_level_result(1, "ann", 35)
+    board.write(board.take_batch())
+
+    assert [(entry["player"], entry["moves"]) for entry in board.top(1)] == [("ann", 25)]
+    assert board.rank(1, "ann")["players"] == 1
+
+
+def test_equal_move_counts_share_a_rank(tmp_path):
+    board = build_leaderboard(tmp_path, [
+        (1, "ann", 20), (1, "bob", 25), (1, "cat", 20), (1, "dan", 30), (2, "eve", 10),
+    ])
+
+    assert [(entry["rank"], entry["player"]) for entry in board.top(1)] == [
+        (1, "ann"), (1, "cat"), (3, "bob"), (4, "dan")
+    ]
+    bob = board.rank(1, "bob")
+    assert (bob["rank"], bob["players"], bob["moves"]) == (3, 4, 25)
+    assert board.rank(1, "eve") is None
+
+
+def test_improving_a_result_moves_the_player_up(tmp_path):
+    board = build_leaderboard(tmp_path, [(1, "ann", 20), (1, "bob", 25)])
+    board.record_level_result(1, "bob", 15)
+    board.write(board.take_batch())
+
+    assert board.rank(1, "bob")["rank"] == 1
+    assert board.rank(1, "ann")["rank"] == 2
+    assert board.rank(1, "ann")["players"] == 2
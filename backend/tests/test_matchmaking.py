@@ -0,0 +1,51 @@
+import asyncio
+
+from app.multiplayer.game_room import MultiplayerManager
+from app.multiplayer.matchmaking import Matchmaker
+from app.multiplayer.room_store import MemoryRoomStore
+
+
+def matchmaker() -> Matchmaker:
+    return Matchmaker(MultiplayerManager(MemoryRoomStore(), 100, None))
+
+
+def test_two_players_on_a_level_share_a_started_room():
+    async def run():
+        queue = matchmaker()
+        return queue, await asyncio.gather(queue.match("ann", 1), queue.match("bob", 1))
+
+    queue, ((first, ann), (second, bob)) = asyncio.run(run())
+    assert first is second
+    assert set(first.players) == {ann, bob}
+    assert first.started
+    assert queue.queue_depth() == 0
+    assert queue.get_stats()["matches"] == 1
+
+
+def test_players_pair_by_band_but_not_across_skill_bands():
+    async def run():
+        queue = matchmaker()
+        ann = asyncio.create_task(queue.match("ann", 1, skill=1500, by_band=True, timeout=1))
+        await asyncio.sleep(0)
+        bob = await queue.match("bob", 2, skill=100, by_band=True, timeout=0.01)
+        cat = await queue.match("cat", 3, skill=1520, by_band=True, timeout=1)
+        return await ann, bob, cat
+
+    (room, _), (unmatched, _), (cat_room, cat) = asyncio.run(run())
+    assert unmatched is None
+    assert room is cat_room
+    assert cat in room.players
+    # Band matches play the waiting player's level
+    assert room.level_id == 1
+
+
+def test_unmatched_player_times_out_and_leaves_the_queue():
+    async def run():
+        queue = matchmaker()
+        return queue, await queue.match("ann", 1, timeout=0.01)
+
+    queue, (room, player_id) = asyncio.run(run())
+    assert room is None
+    assert player_id
+    assert queue.queue_depth() == 0
+    assert queue.timeouts == 1
@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.admission import update_admission
+from app.main import app
+from app.multiplayer.game_room import GameRoom
+
+client = TestClient(app)
+
+
+def create_race() -> tuple:
+    race = client.post("/api/v1/multiplayer/race", json={"player_name": "host", "level_id": 1}).json()
+    return race["room_id"], race["player_id"]
+
+
+def room_players(room_id: str) -> list:
+    return client.get(f"/api/v1/multiplayer/room/{room_id}").json()["players"]
+
+
+def test_update_rejects_moves_that_are_not_a_count():
+    room_id, player_id = create_race()
+    for moves in ["abc", 3.5, [1], True, -1, 2 ** 70]:
+        response = client.post("/api/v1/multiplayer/update",
+                               json={"room_id": room_id, "player_id": player_id, "moves": moves})
+        assert response.status_code == 400, moves
+
+    players = room_players(room_id)
+    assert [(player["id"], player["moves"]) for player in players] == [(player_id, 0)]
+
+
+def test_failed_ranking_keeps_the_old_standing():
+    room = GameRoom("r", 1, 4)
+    room.add_player("p", "ann")
+    player = room.get_player("p")
+    player.moves = "abc"
+    with pytest.raises(TypeError):
+        room._rank(player)
+    assert [entry["id"] for entry in room.ranked_players()] == ["p"]
+
+
+def test_update_reports_moves_while_waiting():
+    room_id, player_id = create_race()
+    response = client.post("/api/v1/multiplayer/update",
+                           json={"room_id": room_id, "player_id": player_id, "moves": 7})
+    assert response.status_code == 200
+    assert room_players(room_id)[0]["moves"] == 7
+
+
+def test_non_members_spend_only_their_own_tokens():
+    room_id, _ = create_race()
+    for body in ({"room_id": room_id, "player_id": "someone-else", "moves": 1},
+                 {"room_id": "no-such-room", "player_id": "someone-else", "moves": 1}):
+        response = client.post("/api/v1/multiplayer/update", json=body)
+        assert response.status_code == 404
+        move = client.post("/api/v1/multiplayer/move", json={**body, "from": 0, "to": 1, "seq": 1})
+        assert move.status_code == 404
+
+    assert room_id not in update_admission.limits["room"].buckets
+    assert not any(key[0] == "someone-else" for key in update_admission.limits["player"].buckets)
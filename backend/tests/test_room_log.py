@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from app.multiplayer.game_room import RACE, GameRoom, MultiplayerManager
+from app.multiplayer.room_log import RoomLog
+from app.multiplayer.room_store import MemoryRoomStore
+from app.services.game_engine import game_engine
+
+
+def build_manager(directory) -> MultiplayerManager:
+    return MultiplayerManager(MemoryRoomStore(), 100, RoomLog(str(directory), 3600, 3600, snapshot_chunk=2))
+
+
+async def play_once(manager: MultiplayerManager, room_id: str):
+    """The next legal pour for each player, submitted as the client would"""
+    async with manager.update_room(room_id) as room:
+        for player in room.players.values():
+            if not player.completed:
+                from_idx, to_idx = game_engine.legal_moves(player.board, room.capacity)[0]
+                room.apply_move(player.id, from_idx, to_idx, player.seq + 1)
+
+
+def states(manager: MultiplayerManager) -> dict:
+    return {room.room_id: room.get_state() for room in manager.store.rooms.values()}
+
+
+def test_recovery_matches_live_rooms_across_a_chunked_snapshot(tmp_path):
+    async def run():
+        manager = build_manager(tmp_path)
+        await manager.start()
+        room_ids = [await manager.create_room(1, ((f"a{i}", "a"), (f"b{i}", "b"))) for i in range(7)]
+        race_ids = [await manager.create_room(1, ((f"host{i}", "host"),), 4, RACE) for i in range(3)]
+        for room_id in room_ids:
+            await play_once(manager, room_id)
+
+        # Rooms change while the snapshot is still pickling them a chunk at
+        # a time; a join replayed onto a room that already has it would seat
+        # the player twice
+        snapshot = asyncio.create_task(manager.log.snapshot())
+        await asyncio.sleep(0)
+        assert manager.log.unsaved
+        for room_id in room_ids:
+            await play_once(manager, room_id)
+        for room_id in race_ids:
+            async with manager.update_room(room_id) as room:
+                room.add_player(f"guest-{room_id}", "guest")
+        await snapshot
+        await play_once(manager, room_ids[0])
+        await manager.remove_room(room_ids[1], "test")
+        await manager.log.flush()
+        # Crash: no shutdown snapshot
+        manager.log.task.cancel()
+
+        recovered = build_manager(tmp_path)
+        assert await recovered.recover() == len(room_ids) + len(race_ids) - 1
+        assert states(recovered) == states(manager)
+
+    asyncio.run(run())
+
+
+def test_unloggable_change_is_not_applied():
+    room = GameRoom("r", 1, 4)
+    room.add_player("p", "ann")
+    before = (room.get_state(), list(room.standings), list(room.events))
+
+    with pytest.raises(ValueError):
+        room.update_player_move("p", 2 ** 70)
+    with pytest.raises(ValueError):
+        room.add_player("q", "x" * 70000)
+
+    assert (room.get_state(), list(room.standings), list(room.events)) == before
@@ -0,0 +1,56 @@
+from app.services.leaderboard import leaderboard
+from app.services.level_store import LevelRecord
+from app.services.sessions import GameSession
+
+# Pouring the top of bottle 0 into bottle 2 and back is always legal
+RECORD = LevelRecord(1, [["a", "b", "a", "b"], ["b", "a", "b", "a"], [], []], None)
+SOLVED_IN_ONE = LevelRecord(1, [["a", "a", "a"], ["a"], ["b", "b", "b", "b"]], None)
+
+
+def test_undo_and_redo_walk_the_history():
+    session = GameSession("s", RECORD)
+    start = session.board
+    assert session.move(0, 2)
+    after_one = session.board
+    assert session.move(1, 3)
+
+    assert session.undo()
+    assert session.board == after_one
+    assert session.undo()
+    assert session.board == start
+    assert not session.undo()
+    assert session.move_count == 0
+
+    assert session.redo()
+    assert session.board == after_one
+    assert session.move_count == 1
+
+
+def test_new_move_clears_redo():
+    session = GameSession("s", RECORD)
+    session.move(0, 2)
+    session.undo()
+    assert session.move(1, 2)
+    assert not session.redo()
+
+
+def test_undo_reaches_back_max_history_moves():
+    session = GameSession("s", RECORD, max_history=2)
+    for from_idx, to_idx in [(0, 2), (1, 3), (2, 1)]:
+        assert session.move(from_idx, to_idx)
+    assert session.move_count == 3
+    assert session.undo() and session.undo()
+    assert not session.undo()
+    assert session.move_count == 1
+
+
+def test_only_whole_run_pours_reach_the_leaderboard():
+    leaderboard.pending.clear()
+    single = GameSession("s", SOLVED_IN_ONE, pour_all=False, player_name="ann")
+    assert single.move(1, 0) and single.completed
+    assert not leaderboard.pending
+
+    standard = GameSession("s", SOLVED_IN_ONE, player_name="ann")
+    assert standard.move(1, 0) and standard.completed
+    assert [item[1:4] for item in leaderboard.pending] == [(1, "ann", 1)]
+    leaderboard.pending.clear()
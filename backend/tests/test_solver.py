@@ -0,0 +1,36 @@
+from app.services.packed_state import pour
+from app.services.solver import heuristic, is_goal, solve
+
+
+def replay(state, moves, capacity=4):
+    for from_idx, to_idx in moves:
+        state = pour(state, from_idx, to_idx, capacity)
+        assert state is not None
+    return state
+
+
+def test_solved_board_with_repeated_colour(board):
+    state = board("aaaa", "aaaa", "")
+    assert heuristic(state) == 0
+    result = solve(state)
+    assert result.solved
+    assert result.moves == []
+    assert not result.exhausted
+
+
+def test_solvable_board_with_repeated_colour(board):
+    state = board("aaab", "aaaa", "bbba", "")
+    result = solve(state)
+    assert result.solved
+    assert result.optimal
+    assert not result.exhausted
+    assert is_goal(replay(state, result.moves), 4)
+    assert heuristic(state) <= len(result.moves)
+
+
+def test_unsolvable_board_is_exhausted(board):
+    # Both bottles full with nowhere to pour
+    state = board("abab", "baba")
+    result = solve(state)
+    assert not result.solved
+    assert result.exhausted
@@ -0,0 +1,47 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.core.wire import MSGPACK, wants_msgpack
+from app.main import app
+
+# Optional: without it the API only speaks JSON
+msgpack = pytest.importorskip("msgpack")
+
+client = TestClient(app)
+
+
+def request_accepting(accept: str) -> Request:
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+
+def test_msgpack_is_negotiated_from_accept():
+    assert wants_msgpack(request_accepting("application/msgpack"))
+    assert wants_msgpack(request_accepting("application/json, application/x-msgpack;q=0.5"))
+    assert not wants_msgpack(request_accepting("application/msgpack;q=0"))
+    assert not wants_msgpack(request_accepting("application/json"))
+    assert not wants_msgpack(request_accepting("*/*"))
+
+
+def test_level_is_json_unless_msgpack_is_accepted():
+    as_json = client.get("/api/v1/levels/1")
+    packed = client.get("/api/v1/levels/1", headers={"Accept": MSGPACK})
+
+    assert as_json.headers["content-type"] == "application/json"
+    assert packed.headers["content-type"] == MSGPACK
+    assert "Accept" in packed.headers["vary"]
+    assert packed.headers["etag"] != as_json.headers["etag"]
+    level = msgpack.unpackb(packed.content, raw=False)
+    rows = [[level["palette"][color - 1] for color in row] for row in level["bottles"]]
+    assert rows == as_json.json()["bottles"]
+
+
+def test_msgpack_request_body_is_validated_like_json():
+    body = {"bottles": [["red", "blue"], ["blue"], []], "from_bottle": 0, "to_bottle": 1}
+    move = client.post("/api/v1/make-move", content=msgpack.packb(body), headers={"Content-Type": MSGPACK})
+    assert move.status_code == 200
+    assert move.json()["bottles"] == [["red"], ["blue", "blue"], []]
+
+    invalid = client.post("/api/v1/make-move", content=msgpack.packb({"bottles": []}),
+                          headers={"Content-Type": MSGPACK})
+    assert invalid.status_code == 422
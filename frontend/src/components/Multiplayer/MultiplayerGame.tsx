@@ -153,26 +153,6 @@ export default function MultiplayerGame({ roomData, onExit }: MultiplayerGamePro
     }, 2000);
   };
 
-  const checkIfComplete = (newBottles: string[][]): boolean => {
-    let completedBottles = 0;
-    let emptyBottles = 0;
-    
-    for (const bottle of newBottles) {
-      if (bottle.length === 0) {
-        emptyBottles++;
-        continue;
-      }
-      
-      if (bottle.length === 4 && bottle.every(color => color === bottle[0])) {
-        completedBottles++;
-      } else {
-        return false;
-      }
-    }
-    
-    return completedBottles > 0 && (completedBottles + emptyBottles === newBottles.length);
-  };
-
   const handleBottleClick = async (bottleIdx: number) => {
     if (!gameReady || winner) return;
 
@@ -238,15 +218,14 @@ export default function MultiplayerGame({ roomData, onExit }: MultiplayerGamePro
       soundManager.play("success");
     }
 
-    const isCompleted = checkIfComplete(newBottles);
-
-    // Send ONLY completion status and moves, NOT bottles!
+    // The server replays the pour on its own board and decides completion
     try {
-      await axios.post(`${API_URL}/api/v1/multiplayer/update`, {
+      await axios.post(`${API_URL}/api/v1/multiplayer/move`, {
         room_id: roomId,
         player_id: playerId,
-        moves: newMoves,
-        completed: isCompleted
+        from: selectedBottle,
+        to: bottleIdx,
+        seq: newMoves
       }, {
         headers: {
           'Content-Type': 'application/json'
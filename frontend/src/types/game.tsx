@@ -2,7 +2,7 @@ export interface Level {
   level_id: number;
   bottles: string[][];
   max_capacity: number;
-  optimal_moves: number;
+  optimal_moves: number | null;
 }
 
 export interface GameState {